@@ -2,41 +2,140 @@
     Versions:     python v. 3.x
 
     File used to insert variables into template files for security purposes.
+    Optionally expands a template scenario into one scenario per project region (-matrix), each with its own
+    EBEndpoint, so taskcat deploys every region in parallel.
 """
 
 import argparse
+import copy
 import os
+import re
 import sys
+import tempfile
 import yaml
 
+# use the libyaml bindings when available, they parse and emit many times faster
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# Elastic Beanstalk CNAME prefix rules
+ENDPOINT_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9-]{2,61}[A-Za-z0-9]$')
+
+
+def load(filename):
+    """Load a taskcat config
+
+        :param filename: name of yaml file
+        :return: config as dict
+    """
+    with open(filename, 'r') as f:
+        return yaml.load(f, Loader=Loader)
+
+
+def save(filename, doc):
+    """Write a taskcat config atomically, so an interrupted write never leaves a partial file
+
+        :param filename: name of yaml file
+        :param doc: config as dict
+    """
+    folder = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix='.' + os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yaml.dump(doc, f, Dumper=Dumper, default_flow_style=False, sort_keys=False)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def set_creds(doc, user, passw):
+    """Set the username and password of every test scenario
+
+            :param doc: config as dict
+            :param user: username as String
+            :param passw: password as String
+    """
+    for scenario in doc['tests'].values():
+        scenario['parameters']['RStudioUserList'] = user + "," + passw
+
 
 def insert_creds(filename, user, passw):
-    """Enter username and password then submit to log in, if sign in successful test cohort creation
+    """Set the username and password of every test scenario in a taskcat config file
 
             :param filename: name of yaml file to be altered
             :param user: username as String
             :param passw: password as String
     """
-
     try:
-        with open(filename, 'r') as f:
-            doc = yaml.load(f, Loader=yaml.FullLoader)
-
-            # alter credentials for each test scenario
-            scenarios = []
-            for scenario in doc['tests']:
-                scenarios.append(scenario)
-            for i in range (0, len(scenarios)):
-                doc['tests'][scenarios[i]]['parameters']['RStudioUserList'] = user + "," + passw
-
-            # overwrite previous file
-            os.remove(filename)
-            with open(filename, 'w+') as f:
-                yaml.dump(doc, f)
+        doc = load(filename)
     except FileNotFoundError:
         print("File \'" + filename + "\' could not be found. Upcoming tests may fail.")
         exit(-1)
 
+    set_creds(doc, user, passw)
+    save(filename, doc)
+
+
+def expand_matrix(doc, template=None, regions=None):
+    """Replace the test scenarios with one copy of a template scenario per region
+
+        :param doc: config as dict
+        :param template: name of scenario to copy [default: first scenario]
+        :param regions: regions to deploy [default: project regions]
+        :return: dict of scenario name to scenario
+    """
+    template = template or next(iter(doc['tests']))
+    regions = regions or doc['project']['regions']
+    base = doc['tests'][template]
+    endpoint = base['parameters']['EBEndpoint']
+
+    tests = {}
+    for region in regions:
+        scenario = copy.deepcopy(base)
+        scenario['parameters']['EBEndpoint'] = endpoint + "-" + region
+        scenario['regions'] = [region]
+        tests[template + "-" + region] = scenario
+
+    doc['tests'] = tests
+    return tests
+
+
+def validate(doc):
+    """Check every scenario generated by expand_matrix() in one pass
+
+        :param doc: config as dict
+        :return: list of error Strings, empty if valid
+    """
+    errors = []
+    project_regions = set(doc['project'].get('regions', []))
+    endpoints = {}
+
+    for name, scenario in doc['tests'].items():
+        parameters = scenario.get('parameters', {})
+        endpoint = parameters.get('EBEndpoint')
+        regions = scenario.get('regions', [])
+
+        if not endpoint:
+            errors.append(name + ": EBEndpoint is missing")
+        elif not ENDPOINT_PATTERN.match(str(endpoint)):
+            errors.append(name + ": EBEndpoint \'" + str(endpoint) + "\' must be 4-63 letters, numbers or hyphens, "
+                          "not starting or ending with a hyphen")
+        if not regions:
+            errors.append(name + ": no regions")
+        for region in regions:
+            if project_regions and region not in project_regions:
+                errors.append(name + ": region " + region + " is not a project region")
+            # an endpoint name only needs to be unique within a region
+            if endpoint and (endpoint, region) in endpoints:
+                errors.append(name + ": EBEndpoint \'" + str(endpoint) + "\' in " + region + " is also used by " +
+                              endpoints[(endpoint, region)])
+            endpoints[(endpoint, region)] = name
+        if 'template' not in scenario:
+            errors.append(name + ": template is missing")
+
+    return errors
+
 
 def parse_args():
     """Parse arguments for running test
@@ -48,13 +147,36 @@ def parse_args():
     parser.add_argument("filename", type=str, help="name of template file to be altered")
     parser.add_argument("user", type=str, help="username for accessing resources")
     parser.add_argument("passw", type=str, help="password for accessing resources")
+    parser.add_argument("-matrix", action="store_true", help="replace the test scenarios with one copy of the "
+                        "template scenario per region, each with EBEndpoint <EBEndpoint>-<region>")
+    parser.add_argument("-template", type=str, help="scenario copied by -matrix (str) [default: first scenario]",
+                        default=None)
+    parser.add_argument("-regions", type=str, help="comma separated regions for -matrix (str) [default: project "
+                        "regions]", default=None)
 
     return parser.parse_args()
 
 
 def main(args):
     args = parse_args()
-    insert_creds(args.filename, args.user, args.passw)
+
+    try:
+        doc = load(args.filename)
+    except FileNotFoundError:
+        print("File \'" + args.filename + "\' could not be found. Upcoming tests may fail.")
+        exit(-1)
+
+    # only the scenarios -matrix generates are checked, other configs are passed on to taskcat as they are
+    if args.matrix:
+        regions = [r.strip() for r in args.regions.split(",") if r.strip()] if args.regions else None
+        print(str(len(expand_matrix(doc, args.template, regions))) + " test scenarios generated")
+        errors = validate(doc)
+        if errors:
+            print("Invalid test scenarios in \'" + args.filename + "\':\n  " + "\n  ".join(errors))
+            exit(-1)
+    set_creds(doc, args.user, args.passw)
+
+    save(args.filename, doc)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+""" Versions:     python v. 3.x
+
+    ATLAS WebAPI client session, used by tests.py and load_test.py.
+    A session signs in once and holds the session cookies and bearer token in memory, signing in again only when
+    the token is about to expire or a request is refused. The cohort definition is read from disk once per process
+    and each cohort payload is built from it in memory.
+"""
+
+import base64
+import copy
+import json
+import os
+import threading
+import time
+import http_interact as http
+from datetime import datetime
+
+COHORT_FILE = 'cohort.json'
+# token lifetime assumed when the token does not carry its own expiry
+TOKEN_TTL = 600
+# sign in again this many seconds before the token expires
+EXPIRY_MARGIN = 30
+
+COHORT_LOCK = threading.Lock()
+COHORT_TEMPLATE = {}
+
+
+def new_session(link, user, passw, cookies=None, ttl=TOKEN_TTL):
+    """Create a signed out session for an ATLAS deployment
+
+        :param link: url for ATLAS page as String
+        :param user: username as String
+        :param passw: password as String
+        :param cookies: optional cookie jar dict shared with the caller
+        :param ttl: seconds a token is assumed valid when it has no expiry
+        :return: session dict
+    """
+    session = {'link': link,
+               'user': user,
+               'passw': passw,
+               'cookies': {} if cookies is None else cookies,
+               'token': None,
+               'expires': 0,
+               'ttl': ttl,
+               'logins': 0,
+               'lock': threading.Lock()
+               }
+
+    return session
+
+
+def token_expiry(token):
+    """Read the expiry time of a JWT bearer token
+
+        :param token: bearer token as String
+        :return: expiry in seconds since the epoch, None if the token is not a JWT with an expiry
+    """
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def login(session):
+    """Sign in to ATLAS WebAPI, storing the session cookies and bearer token
+
+        :param session: session dict
+        :return: http response dict for the sign in request
+    """
+    fields = {'rememberMe': 'true', 'login': session['user'], 'password': session['passw']}
+    resp = http.fetch(*http.form_post(session['link'] + "/WebAPI/user/login/db", fields))
+    session['logins'] += 1
+
+    http.get_cookies(resp, session['cookies'])
+    token = http.get_header(resp, 'Bearer')
+    if resp['status'] == 200 and token:
+        session['token'] = token
+        session['expires'] = token_expiry(token) or time.time() + session['ttl']
+    else:
+        session['token'] = None
+        session['expires'] = 0
+
+    return resp
+
+
+def auth_headers(session):
+    """Headers authenticating a request, signing in first if the token is missing or about to expire
+
+        :param session: session dict
+        :return: dict of headers
+    """
+    with session['lock']:
+        if session['token'] is None or time.time() >= session['expires'] - EXPIRY_MARGIN:
+            login(session)
+        token = session['token']
+
+    return {'Authorization': 'Bearer ' + str(token), 'Cookie': http.cookie_header(session['cookies'])}
+
+
+def request(session, method, path, body=None, headers=None):
+    """Send an authenticated request to WebAPI, signing in again once if the token was refused
+
+        :param session: session dict
+        :param method: http method as String
+        :param path: path under the ATLAS url, e.g. /WebAPI/cohortdefinition
+        :param body: optional request body
+        :param headers: optional extra headers
+        :return: http response dict
+    """
+    resp = http.fetch(method, session['link'] + path, body, dict(auth_headers(session), **(headers or {})))
+    if resp['status'] == 401:
+        with session['lock']:
+            session['token'] = None
+        resp = http.fetch(method, session['link'] + path, body, dict(auth_headers(session), **(headers or {})))
+
+    return resp
+
+
+def cohort_template(filename=COHORT_FILE):
+    """Read the cohort definition once per process
+
+        :param filename: cohort definition file
+        :return: cohort definition dict, shared and not to be modified
+        :raises EnvironmentError: if the file is empty
+    """
+    with COHORT_LOCK:
+        if filename not in COHORT_TEMPLATE:
+            # ensure file isn't empty
+            if os.path.getsize(filename) == 0:
+                raise EnvironmentError("Empty cohort definition file.. cannot create cohort")
+            with open(filename, 'r') as f:
+                COHORT_TEMPLATE[filename] = json.load(f)
+
+        return COHORT_TEMPLATE[filename]
+
+
+def cohort_payload(user, filename=COHORT_FILE):
+    """Build a uniquely named cohort definition in memory
+
+        :param user: username creating the cohort as String
+        :param filename: cohort definition file
+        :return: cohort definition dict and the template's cohort name
+    """
+    cohort = copy.deepcopy(cohort_template(filename))
+    dt_string = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    name = cohort['name']
+    cohort['name'] = name + " " + dt_string
+    cohort['createdBy'] = user
+    cohort['createdDate'] = dt_string
+    cohort['modifiedBy'] = user
+    cohort['modifiedDate'] = dt_string
+
+    return cohort, name
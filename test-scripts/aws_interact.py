@@ -7,59 +7,223 @@
 
 import boto3
 import base64
+import random
+import threading
+import time
+import tracing
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# clients are thread safe and reused for every call, keyed by (service, region)
+CLIENTS = {}
+CLIENTS_LOCK = threading.Lock()
+MAX_POOL_CONNECTIONS = 32
+
+# secret values cached in memory, keyed by (region, name), so concurrent region workers share one fetch
+SECRET_TTL = 300
+SECRETS = {}
+SECRETS_LOCK = threading.Lock()
+SECRET_FETCH_LOCKS = {}
+# most secrets Secrets Manager returns from one BatchGetSecretValue request
+BATCH_SECRETS = 20
+THROTTLING_ERRORS = ('ThrottlingException', 'TooManyRequestsException', 'RequestLimitExceeded', 'Throttling')
+
+
+def boto3_client(service, region_name=None):
+    """Create a boto3 client with a connection pool sized for concurrent workers
+
+        :param service: name of AWS service, e.g. s3
+        :param region_name: optional region for client, default region if not given
+        :return: boto3 client
+    """
+    return boto3.session.Session().client(
+        service_name=service,
+        region_name=region_name,
+        config=Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+    )
+
+
+# replaced by local_aws.install() to run against in memory stand-ins
+CLIENT_FACTORY = boto3_client
+
+
+def get_client(service, region_name=None):
+    """Get shared client for a service, creating it on first use
+
+        :param service: name of AWS service, e.g. s3
+        :param region_name: optional region for client, default region if not given
+        :return: boto3 client
+    """
+    key = (service, region_name)
+    with CLIENTS_LOCK:
+        if key not in CLIENTS:
+            CLIENTS[key] = CLIENT_FACTORY(service, region_name)
+        return CLIENTS[key]
+
 
 def get_secret(secret_name, region_name):
-    """Upload a file to an S3 bucket
+    """Get the value of a secret from Secrets Manager, cached for SECRET_TTL seconds
 
         :param secret_name: name of secret to be retrieved
         :param region_name: name of region where secret is stored
         :return: secret payload
     """
+    return get_secrets([secret_name], region_name)[secret_name]
 
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(
-        service_name='secretsmanager',
-        region_name=region_name
-    )
-    secret = ""
 
-    try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=secret_name
-        )
-    except ClientError as e:
-        print(str(e))
-        exit(-1)
-    else:
-        # Decrypts secret using the associated KMS CMK.
-        # Depending on whether the secret is a string or binary, one of these fields will be populated.
-        if 'SecretString' in get_secret_value_response:
-            secret = get_secret_value_response['SecretString']
-        else:
-            secret = base64.b64decode(get_secret_value_response['SecretBinary'])
+@tracing.traced('aws')
+def get_secrets(secret_names, region_name, ttl=None):
+    """Get the values of several secrets, fetching any not cached in batched requests
+
+        :param secret_names: names or ARNs of secrets to be retrieved
+        :param region_name: name of region where secrets are stored
+        :param ttl: seconds values are cached for [default: SECRET_TTL]
+        :return: dict of secret name to secret payload
+        :raises ClientError: if a secret cannot be retrieved, after retrying throttled requests
+    """
+    ttl = SECRET_TTL if ttl is None else ttl
+
+    with SECRETS_LOCK:
+        lock = SECRET_FETCH_LOCKS.setdefault(region_name, threading.Lock())
+
+    # workers for the same region wait on one fetch instead of each calling Secrets Manager
+    with lock:
+        now = time.time()
+        values = {}
+        missing = []
+        for name in secret_names:
+            cached = SECRETS.get((region_name, name))
+            if cached is not None and cached[0] > now:
+                values[name] = cached[1]
+            elif name not in missing:
+                missing.append(name)
+
+        if missing:
+            fetched = fetch_secrets(get_client('secretsmanager', region_name), missing)
+            with SECRETS_LOCK:
+                for name, value in fetched.items():
+                    SECRETS[(region_name, name)] = (now + ttl, value)
+            values.update(fetched)
+
+    return values
+
 
-    return secret
+def fetch_secrets(client, secret_names):
+    """Fetch secret values, up to BATCH_SECRETS per request, falling back to one request per secret
 
+        :param client: Secrets Manager client
+        :param secret_names: names or ARNs of secrets to be retrieved
+        :return: dict of requested name or ARN to secret payload
+        :raises ClientError: if a secret cannot be retrieved
+    """
+    if not hasattr(client, 'batch_get_secret_value'):
+        return {name: secret_value(with_retry(client.get_secret_value, SecretId=name)) for name in secret_names}
+
+    values = {}
+    for i in range(0, len(secret_names), BATCH_SECRETS):
+        wanted = secret_names[i:i + BATCH_SECRETS]
+        kwargs = {'SecretIdList': wanted}
+        while True:
+            resp = with_retry(client.batch_get_secret_value, **kwargs)
+            for entry in resp.get('SecretValues', []):
+                for secret_id in requested_ids(entry, wanted):
+                    values[secret_id] = secret_value(entry)
+            if resp.get('Errors'):
+                error = resp['Errors'][0]
+                raise ClientError({'Error': {'Code': error.get('ErrorCode'),
+                                             'Message': str(error.get('SecretId')) + ": " + str(error.get('Message'))}},
+                                  'BatchGetSecretValue')
+            if not resp.get('NextToken'):
+                break
+            kwargs['NextToken'] = resp['NextToken']
+
+    missing = [secret_id for secret_id in secret_names if secret_id not in values]
+    if missing:
+        raise ClientError({'Error': {'Code': 'ResourceNotFoundException',
+                                     'Message': ", ".join(missing) + ": not returned"}}, 'BatchGetSecretValue')
+
+    return values
+
+
+def requested_ids(entry, secret_ids):
+    """Match a secret returned by a batch request back to the ids it was requested by
+
+        :param entry: secret value dict with Name and ARN
+        :param secret_ids: names, ARNs or partial ARNs (without the random suffix) requested
+        :return: list of requested ids naming the secret
+    """
+    return [secret_id for secret_id in secret_ids
+            if secret_id in (entry['Name'], entry['ARN']) or entry['ARN'].startswith(secret_id + '-')]
+
+
+def secret_value(response):
+    """Read the payload of a secret value response
+
+        :param response: secret value dict from Secrets Manager
+        :return: secret payload
+    """
+    # Decrypts secret using the associated KMS CMK.
+    # Depending on whether the secret is a string or binary, one of these fields will be populated.
+    if 'SecretString' in response:
+        return response['SecretString']
+
+    return base64.b64decode(response['SecretBinary'])
+
+
+def with_retry(call, attempts=5, base=0.5, cap=8, **kwargs):
+    """Call an AWS API, retrying throttled requests with full jitter exponential backoff
+
+        :param call: client method
+        :param attempts: max number of calls
+        :param base: seconds of backoff before the first retry
+        :param cap: max seconds of backoff
+        :return: response of call
+        :raises ClientError: if the call fails for another reason, or is still throttled after all attempts
+    """
+    for attempt in range(attempts):
+        try:
+            return call(**kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in THROTTLING_ERRORS or attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
 
-def upload_file(file_name, bucket, object_name=None):
+
+@tracing.traced('aws')
+def upload_file(file_name, bucket, object_name=None, public=True):
     """Upload a file to an S3 bucket
 
         :param file_name: File to upload
         :param bucket: Bucket name to upload to
         :param object_name: Object to upload
-        :return: True if file was uploaded, else False
+        :param public: whether the object is readable from the public dashboard
+        :raises ClientError: if the upload failed, so the caller (e.g. one region's worker) can record it
     """
 
     if object_name is None:
         object_name = file_name
 
     # Upload the file
+    s3_client = get_client('s3')
+    s3_client.upload_file(file_name, bucket, object_name, ExtraArgs={'ACL': 'public-read'} if public else None)
+
+
+@tracing.traced('aws')
+def download_file(bucket, object_name, file_name):
+    """Download an object from an S3 bucket if it exists
+
+        :param bucket: Bucket name to download from
+        :param object_name: Object to download
+        :param file_name: File to write object to
+        :return: True if object was downloaded, False if it does not exist
+        :raises ClientError: if the download failed for any other reason
+    """
     try:
-        s3_client = boto3.client('s3')
-        s3_client.upload_file(file_name, bucket, object_name, ExtraArgs={'ACL': 'public-read'})
+        s3_client = get_client('s3')
+        s3_client.download_file(bucket, object_name, file_name)
     except ClientError as e:
-        print(str(e))
-        exit(-1)
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return False
+        raise
+
+    return True
@@ -0,0 +1,360 @@
+""" Versions:     python v. 3.x
+
+    Benchmarks of the test harness itself, run offline against local_stack.py and the local_aws.py stand-ins.
+    With no latency injected, the times measured are the harness's own overhead: per sub-test, per region tested
+    concurrently, per result upload and per dashboard build, so changes to tests.py, web_interact.py and
+    get_test_results.py can be compared before and after without a deployed stack or an AWS account. The pipeline
+    suite compares the build time of deploying, testing and cleaning up regions phase by phase and per region.
+
+    usage: python3 bench.py -suite=<all|tests|browser|regions|uploads|results|pipeline> -repeat=<n> -regions=<n>
+                            -latency=<ms> -deploy=<s> -pipeline-regions=<n> -pipeline-workers=<n>
+                            -pipeline-latency=<ms> -out=<file>
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import local_aws
+import local_stack
+import scheduler
+import stats
+import test_objects as tob
+from concurrent.futures import ThreadPoolExecutor
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER = 'bench'
+PASSW = 'bench-password'
+BUCKET = 'bench-results'
+ENDPOINT = 'bench'
+
+
+def timed(call, *args):
+    """Call a function and measure it
+
+        :return: result of call and milliseconds taken
+    """
+    start = time.perf_counter()
+    result = call(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def region_name(suite, i):
+    """Name a stand-in region, unique per suite so each suite starts from an empty deployment"""
+    return suite + "-" + str(i + 1)
+
+
+def atlas_region(region, deadline=None):
+    """Test ATLAS sign in and cohort creation for one region as tests.py does, without a browser
+
+        :param region: region name
+        :param deadline: optional readiness deadline
+        :return: dict of results recorded and failures
+    """
+    import tests
+
+    run = tests.new_run(ENDPOINT, region, USER, PASSW, BUCKET, deadline)
+    link = tob.key_url("ATLAS", ENDPOINT, region)["OutputValue"]
+    tests.open_log(run, "odshi-on-aws/")
+    try:
+        nodes = [scheduler.new_node("ATLAS ready", lambda: tests.wait_ready(run, link))] if deadline else []
+        scheduler.run_graph(nodes + tests.atlas_nodes(run, link, "ATLAS", [node['name'] for node in nodes]))
+    finally:
+        summary = tests.upload_to_s3(run, run['filename'], "odshi-on-aws/" + run['filename'])
+
+    return summary
+
+
+def bench_tests(repeat):
+    """Harness time per sub-test for the http tested product
+
+        :param repeat: number of regions tested one after another
+        :return: report dict
+    """
+    per_region = []
+    per_test = []
+    for i in range(repeat):
+        _, elapsed = timed(atlas_region, region_name("tests", i))
+        per_region.append(elapsed)
+        with open("test_output_" + region_name("tests", i) + ".json") as f:
+            per_test.extend(test['elapsed (ms)'] for test in json.load(f)["Page Access Info"]
+                            if test['elapsed (ms)'] is not None)
+
+    return {'sub-test (ms)': stats.summarize(per_test), 'region incl. result upload (ms)': stats.summarize(per_region)}
+
+
+def bench_browser(repeat):
+    """Harness time per sub-test for browser tested products, skipped if Chrome cannot be started
+
+        :param repeat: number of regions tested one after another
+        :return: report dict
+    """
+    import driver_pool as dp
+    import tests
+
+    try:
+        pool, launch = timed(dp.new_pool, 1)
+    except Exception as e:
+        return {'skipped': "browser unavailable: " + str(e).strip().split("\n")[0]}
+
+    per_region = []
+    per_test = []
+    try:
+        for i in range(repeat):
+            run = tests.new_run(ENDPOINT, region_name("browser", i), USER, PASSW, BUCKET)
+            _, elapsed = timed(tests.test_pages, run, tests.build_outputs(ENDPOINT, region_name("browser", i)), pool)
+            per_region.append(elapsed)
+            with open(run['filename']) as f:
+                per_test.extend(test['elapsed (ms)'] for test in json.load(f)["Page Access Info"]
+                                if test['elapsed (ms)'] is not None)
+    finally:
+        dp.close_pool(pool)
+
+    return {'browser launch (ms)': launch,
+            'sub-test (ms)': stats.summarize(per_test),
+            'region incl. result upload (ms)': stats.summarize(per_region)}
+
+
+def bench_regions(regions, workers, stack):
+    """Wall time to test many regions concurrently, each waiting for its endpoint to become ready
+
+        :param regions: number of regions
+        :param workers: regions tested at once
+        :param stack: local stack dict, restarted as not ready so readiness polling is included
+        :return: report dict
+    """
+    stack['started'] = time.monotonic()
+    deadline = time.monotonic() + 60
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda i: timed(atlas_region, region_name("regions", i), deadline), range(regions)))
+    wall = (time.perf_counter() - start) * 1000
+
+    return {'regions': regions,
+            'workers': workers,
+            'ready after (ms)': stack['ready after'] * 1000,
+            'wall (ms)': wall,
+            'region (ms)': stats.summarize([elapsed for _, elapsed in results]),
+            'failures': sum(summary['failures'] for summary, _ in results)}
+
+
+def bench_uploads(repeat, s3):
+    """Time per result upload, per streamed result and per dashboard sync
+
+        :param repeat: number of uploads
+        :param s3: LocalS3 installed for aws_interact
+        :return: report dict
+    """
+    import aws_interact as aws
+    import result_log as rl
+    import uploader
+
+    with open("result.json", "w") as f:
+        json.dump({"Page Access Info": [tob.new_test("ATLAS", "sign in attempt").to_dict()] * 20}, f)
+    uploads = [timed(aws.upload_file, "result.json", BUCKET, "bench/result.json")[1] for _ in range(repeat)]
+
+    log = rl.new_log("stream.jsonl", BUCKET, "bench/stream/", flush_records=200)
+    test = tob.success(tob.new_test("RStudio", "load sign in"))
+    start = time.perf_counter()
+    for _ in range(repeat * 100):
+        rl.write(log, test)
+    rl.close(log)
+    streamed = (time.perf_counter() - start) * 1000 / (repeat * 100)
+
+    os.makedirs("outputs", exist_ok=True)
+    for i in range(repeat):
+        shutil.copyfile("result.json", os.path.join("outputs", "result_" + str(i) + ".json"))
+    _, first = timed(uploader.sync, s3, "outputs", BUCKET, "dashboard/")
+    _, unchanged = timed(uploader.sync, s3, "outputs", BUCKET, "dashboard/")
+
+    return {'result upload (ms)': stats.summarize(uploads),
+            'streamed result (ms)': streamed,
+            'dashboard sync of ' + str(repeat) + ' files (ms)': first,
+            'unchanged dashboard sync (ms)': unchanged}
+
+
+def bench_results(regions, runs):
+    """Time of each get_test_results.py phase over repeated runs, so the regression gate has a baseline
+
+        :param regions: number of regions with results
+        :param runs: number of runs
+        :return: report dict
+    """
+    import get_test_results as gtr
+    import history
+
+    os.makedirs("taskcat_outputs", exist_ok=True)
+    rows = "".join('<tr><td>scenario</td><td>' + region_name("results", i) + '</td><td>stack-' + str(i) + '</td><td>'
+                   'CREATE_COMPLETE</td><td></td></tr>' for i in range(regions))
+    with open(gtr.DASHBOARD, "w") as f:
+        f.write('<html><body><table><thread><tr><th>Test</th></tr></thread>' + rows + '</table></body></html>')
+
+    argv = sys.argv
+    sys.argv = ["get_test_results.py", ",".join(region_name("results", i) for i in range(regions)), "bench",
+                "arn:local", BUCKET, "-offline", "-stub-notifications", "notifications.jsonl"]
+    try:
+        args = gtr.parse_args()
+    finally:
+        sys.argv = argv
+    phases = {}
+
+    for run in range(runs):
+        for i in range(regions):
+            tests = [tob.success(tob.new_test(product, name)) for product in ("RStudio", "Jupyter", "ATLAS")
+                     for name in ("get page attempt", "sign in attempt")]
+            for test in tests:
+                test.extra.append({'http response time (ms)': 100.0 + run + i})
+            with open("test_output_" + region_name("results", i) + ".json", "w") as f:
+                json.dump({"Page Access Info": [test.to_dict() for test in tests]}, f)
+
+        results, ms = timed(gtr.load_results, args.regions.split(","), args.results)
+        phases.setdefault('load results', []).append(ms)
+        with open(gtr.DASHBOARD) as fp:
+            page = fp.read()
+        stacks, ms = timed(gtr.index_stacks, page, results.keys())
+        phases.setdefault('index stacks', []).append(ms)
+        gates, ms = timed(gtr.run_gate, results, args)
+        phases.setdefault('regression gate', []).append(ms)
+        with open(gtr.COMBINED_DASHBOARD, "w") as out:
+            _, ms = timed(gtr.write_dashboard, page, results, stacks, args.folder, args.result_bucket, out, gates)
+        phases.setdefault('write dashboard', []).append(ms)
+        _, ms = timed(history.record, args.history, "bench-" + str(run), results)
+        phases.setdefault('record history', []).append(ms)
+        _, ms = timed(gtr.notify_failures, results, args, gates)
+        phases.setdefault('notify', []).append(ms)
+
+    return {phase: stats.summarize(values) for phase, values in phases.items()}
+
+
+def bench_pipeline(regions, workers, cfn, deploy, latency):
+    """Wall time to deploy, test and clean up many regions, one phase after another and pipelined per region
+
+        Stacks take from deploy / regions to deploy seconds to create, so pipelining lets the first regions be tested
+        and deleted while the last are still deploying.
+
+        :param regions: number of regions
+        :param workers: regions tested at once
+        :param cfn: LocalCloudFormation installed for aws_interact
+        :param deploy: seconds the slowest stack takes to create
+        :param latency: ms of latency the stand-ins were given for the suite, reported with the result
+        :return: report dict
+    """
+    import pipeline_watch as pw
+
+    def test(region, stack):
+        return atlas_region(region)['failures'] == 0
+
+    def deploy_stacks(suite):
+        names = [region_name(suite, i) for i in range(regions)]
+        for i, region in enumerate(names):
+            cfn.add_stack(region, "tCaT-bench-" + region, {"ATLASURL": tob.key_url("ATLAS", ENDPOINT, region)},
+                          project=suite, create_seconds=deploy * (i + 1) / regions)
+        return pw.new_watch(suite, poll=0.05), names
+
+    # taskcat, then tests.py, then clean up, each waiting for every region to finish the phase before
+    watch, names = deploy_stacks("barrier")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, len(names))) as pool:
+        stacks = list(pool.map(lambda region: pw.wait_for_stack(watch, region), names))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        passed = list(pool.map(test, names, stacks))
+    with ThreadPoolExecutor(max_workers=max(1, len(names))) as pool:
+        deleted = list(pool.map(lambda region, stack: pw.delete_stack(watch, region, stack['StackId']), names, stacks))
+    barrier = (time.perf_counter() - start) * 1000
+
+    watch, names = deploy_stacks("pipeline")
+    start = time.perf_counter()
+    report = pw.watch_regions(watch, names, test, workers)
+    pipelined = (time.perf_counter() - start) * 1000
+
+    slowest = report[names[-1]]
+    return {'regions': regions,
+            'workers': workers,
+            'latency (ms)': latency,
+            'slowest deploy (ms)': deploy * 1000,
+            'delete (ms)': cfn.delete_seconds * 1000,
+            'phased wall (ms)': barrier,
+            'pipelined wall (ms)': pipelined,
+            'slowest region (ms)': (slowest['deploy (s)'] + slowest['test (s)'] + slowest['delete (s)']) * 1000,
+            'failures': sum(1 for ok, status in zip(passed, deleted) if not ok or status != 'DELETE_COMPLETE') +
+            sum(1 for entry in report.values() if entry['status'] != 'PASSED')}
+
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-suite", type=str, help="benchmarks to run (str) from set {\"all\", \"tests\", \"browser\", "
+                        "\"regions\", \"uploads\", \"results\", \"pipeline\"} [default: all]", default="all")
+    parser.add_argument("-repeat", type=int, help="repetitions per benchmark (int) [default: 10]", default=10)
+    parser.add_argument("-regions", type=int, help="regions for the regions and results benchmarks (int) "
+                        "[default: 14]", default=14)
+    parser.add_argument("-workers", type=int, help="regions tested at once (int) [default: 4]", default=4)
+    parser.add_argument("-latency", type=float, help="ms injected into every stack and AWS response (float) "
+                        "[default: 0, measuring harness overhead only]", default=0)
+    parser.add_argument("-deploy", type=float, help="seconds the slowest stack takes to create for the pipeline "
+                        "benchmark (float) [default: 2]", default=2)
+    parser.add_argument("-pipeline-regions", type=int, help="regions for the pipeline benchmark (int) [default: 8]",
+                        default=8)
+    parser.add_argument("-pipeline-workers", type=int, help="regions tested at once for the pipeline benchmark (int) "
+                        "[default: 2]", default=2)
+    parser.add_argument("-pipeline-latency", type=float, help="ms injected into every stack and AWS response for "
+                        "the pipeline benchmark (float) [default: 100]", default=100)
+    parser.add_argument("-out", type=str, help="also write the report to this file (str)", default=None)
+    args = parser.parse_args()
+
+    suites = ["tests", "browser", "regions", "uploads", "results", "pipeline"] if args.suite == "all" else [args.suite]
+    out = os.path.abspath(args.out) if args.out else None
+    latency = args.latency / 1000
+
+    stack = local_stack.new_stack(USER, PASSW, latency=latency, generate_seconds=0.1)
+    server = local_stack.start(stack)
+    tob.URL_TEMPLATE = local_stack.url_template(server)
+    s3 = local_aws.LocalS3(latency=latency, setup=0)
+    cfn = local_aws.LocalCloudFormation(latency=latency, delete_seconds=args.deploy / 4)
+    local_aws.install(s3=s3, cloudformation=cfn)
+
+    # results are written to the working directory, as in CodeBuild
+    cwd = os.getcwd()
+    folder = tempfile.mkdtemp()
+    shutil.copyfile(os.path.join(REPO, 'cohort.json'), os.path.join(folder, 'cohort.json'))
+    os.chdir(folder)
+
+    report = {'latency (ms)': args.latency}
+    try:
+        for suite in suites:
+            if suite == "tests":
+                report[suite] = bench_tests(args.repeat)
+            elif suite == "browser":
+                report[suite] = bench_browser(args.repeat)
+            elif suite == "regions":
+                stack['ready after'] = 1.0
+                report[suite] = bench_regions(args.regions, args.workers, stack)
+                stack['ready after'] = 0
+            elif suite == "uploads":
+                report[suite] = bench_uploads(args.repeat, s3)
+            elif suite == "results":
+                report[suite] = bench_results(args.regions, args.repeat)
+            elif suite == "pipeline":
+                # tests take as long as their round trips, which is what deployments of other regions overlap with
+                stack['latency'] = s3.latency = cfn.latency = args.pipeline_latency / 1000
+                report[suite] = bench_pipeline(args.pipeline_regions, args.pipeline_workers, cfn, args.deploy,
+                                               args.pipeline_latency)
+                stack['latency'] = s3.latency = cfn.latency = latency
+        report['stack requests'] = stack['requests']
+        report['s3 requests'] = s3.calls
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder)
+        server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if out:
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
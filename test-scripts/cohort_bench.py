@@ -0,0 +1,215 @@
+""" Versions:     python v. 3.x
+
+    ATLAS WebAPI throughput benchmark, used by tests.py (-test=cohort).
+    Variants of the cohort.json definition are created concurrently through one signed in session, then generation
+    is started for each and its status polled with backoff until complete, and finally every definition created is
+    deleted. Create and generate latency percentiles and create throughput are reported per region.
+"""
+
+import json
+import random
+import threading
+import time
+import atlas
+import aws_interact as aws
+import stats
+import test_objects as tob
+from concurrent.futures import ThreadPoolExecutor
+
+# generation states reported by /cohortdefinition/{id}/info that will not change again
+DONE_STATES = ('COMPLETE', 'FAILED')
+
+
+def pick_source(session, source_key=None):
+    """Choose the CDM source cohorts are generated against
+
+        :param session: signed in ATLAS session dict
+        :param source_key: optional source key to use
+        :return: source key as String, None if no source has both CDM and Results daimons
+        :raises EnvironmentError: if the sources could not be listed
+    """
+    if source_key:
+        return source_key
+
+    resp = atlas.request(session, 'GET', "/WebAPI/source/sources")
+    if resp['status'] != 200:
+        raise EnvironmentError("listing sources returned " + str(resp['status']))
+    # generation reads the CDM and writes to the results schema, so only a source with both daimons will do
+    for source in json.loads(resp['body'].decode('utf-8')):
+        daimons = set(daimon.get('daimonType') for daimon in source.get('daimons', []))
+        if {'CDM', 'Results'} <= daimons:
+            return source['sourceKey']
+
+    return None
+
+
+def wait_for_generation(session, cohort_id, deadline, base=1, cap=15):
+    """Poll a cohort's generation status with equal jitter exponential backoff
+
+        :param session: signed in ATLAS session dict
+        :param cohort_id: id of cohort definition
+        :param deadline: time.monotonic() time to stop polling
+        :param base: seconds before the first poll
+        :param cap: max seconds between polls
+        :return: final status String, or None if still running at the deadline
+    """
+    attempt = 0
+    while True:
+        resp = atlas.request(session, 'GET', "/WebAPI/cohortdefinition/" + str(cohort_id) + "/info")
+        if resp['status'] == 200:
+            for info in json.loads(resp['body'].decode('utf-8')):
+                if info.get('status') in DONE_STATES:
+                    return info['status'] if info.get('isValid', True) else 'FAILED'
+
+        delay = min(cap, base * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if time.monotonic() + delay > deadline:
+            return None
+        time.sleep(delay)
+        attempt += 1
+
+
+def new_measures():
+    """Create empty measurements shared by all benchmark workers
+
+        :return: measures dict
+    """
+    return {'lock': threading.Lock(), 'create': [], 'generate': [], 'errors': []}
+
+
+def note(measures, key, value):
+    """Record a latency or error
+
+        :param measures: measures dict
+        :param key: "create", "generate" or "errors"
+        :param value: latency in milliseconds or error String
+    """
+    with measures['lock']:
+        measures[key].append(value)
+
+
+def create_cohort(session, index, measures):
+    """Create one uniquely named variant of the cohort definition
+
+        :param session: signed in ATLAS session dict
+        :param index: number of variant, making its name unique
+        :param measures: measures dict, shared by all workers
+        :return: id of cohort definition created, None on failure
+    """
+    cohort, _ = atlas.cohort_payload(session['user'])
+    cohort['name'] += " bench " + str(index) + " " + format(random.getrandbits(32), '08x')
+
+    start = time.perf_counter()
+    resp = atlas.request(session, 'POST', "/WebAPI/cohortdefinition", json.dumps(cohort),
+                         {'Content-Type': 'application/json'})
+    elapsed = (time.perf_counter() - start) * 1000
+    try:
+        cohort_id = json.loads(resp['body'].decode('utf-8'))['id'] if resp['status'] == 200 else None
+    except (ValueError, KeyError, TypeError):
+        cohort_id = None
+
+    if cohort_id is None:
+        note(measures, 'errors', "create returned " + str(resp['status']))
+    else:
+        note(measures, 'create', elapsed)
+    return cohort_id
+
+
+def generate_cohort(session, cohort_id, source_key, timeout, measures):
+    """Start generating a cohort and wait for it to complete
+
+        :param session: signed in ATLAS session dict
+        :param cohort_id: id of cohort definition
+        :param source_key: source to generate against
+        :param timeout: max seconds to wait for generation
+        :param measures: measures dict, shared by all workers
+    """
+    start = time.perf_counter()
+    resp = atlas.request(session, 'GET', "/WebAPI/cohortdefinition/" + str(cohort_id) + "/generate/" + source_key)
+    if resp['status'] != 200:
+        note(measures, 'errors', "generate returned " + str(resp['status']))
+        return
+
+    try:
+        status = wait_for_generation(session, cohort_id, time.monotonic() + timeout)
+    except (ValueError, TypeError) as e:
+        status = "status unreadable: " + str(e)
+    if status == 'COMPLETE':
+        note(measures, 'generate', (time.perf_counter() - start) * 1000)
+    else:
+        note(measures, 'errors', "generation " + (status or "timed out"))
+
+
+def delete_cohort(session, cohort_id, measures):
+    """Delete a cohort definition created by the benchmark
+
+        :param session: signed in ATLAS session dict
+        :param cohort_id: id of cohort definition
+        :param measures: measures dict, shared by all workers
+    """
+    resp = atlas.request(session, 'DELETE', "/WebAPI/cohortdefinition/" + str(cohort_id))
+    if resp['status'] not in (200, 204):
+        note(measures, 'errors', "delete returned " + str(resp['status']))
+
+
+def run_bench(run, link, cohorts, concurrency, prefix, source_key=None, timeout=600):
+    """Benchmark cohort creation and generation against one region and upload the report to S3
+
+        :param run: run state for region being tested
+        :param link: url for ATLAS page as String
+        :param cohorts: number of cohort variants created
+        :param concurrency: variants in flight at once
+        :param prefix: S3 folder test results are uploaded to
+        :param source_key: optional source to generate against, the first source with CDM and Results daimons by default
+        :param timeout: max seconds to wait for each generation
+        :return: benchmark report dict
+    """
+    session = atlas.new_session(link, run['user'], run['passw'], run['cookies'])
+    measures = new_measures()
+    source = None
+    duration = 0
+
+    if atlas.login(session)['status'] != 200:
+        note(measures, 'errors', "sign in failed")
+    else:
+        try:
+            source = pick_source(session, source_key)
+        except EnvironmentError as e:
+            note(measures, 'errors', "generation skipped, " + str(e))
+        else:
+            if source is None:
+                note(measures, 'errors', "generation skipped, no source has both CDM and Results daimons")
+        # phases run one after another so create throughput is not diluted by generation time
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            start = time.perf_counter()
+            ids = [cohort_id for cohort_id in pool.map(lambda i: create_cohort(session, i, measures), range(cohorts))
+                   if cohort_id is not None]
+            duration = time.perf_counter() - start
+            try:
+                if source is not None:
+                    list(pool.map(lambda cohort_id: generate_cohort(session, cohort_id, source, timeout, measures),
+                                  ids))
+            finally:
+                list(pool.map(lambda cohort_id: delete_cohort(session, cohort_id, measures), ids))
+
+    result = {'cohorts': cohorts,
+              'concurrency': concurrency,
+              'source': source,
+              'create duration (s)': duration,
+              'create throughput (definitions/s)': len(measures['create']) / duration if duration else None,
+              'create latency (ms)': stats.summarize(measures['create']) if measures['create'] else None,
+              'generate latency (ms)': stats.summarize(measures['generate']) if measures['generate'] else None,
+              'sign ins': session['logins'],
+              'errors': len(measures['errors']),
+              'error samples': sorted(set(measures['errors']))[:10]
+              }
+
+    if measures['errors']:
+        run['failure'] = True
+
+    filename = "cohort_output_" + run['region'] + ".json"
+    with open(filename, "w+") as write_file:
+        json.dump({'Cohort Benchmark': result}, write_file)
+    aws.upload_file(filename, run['bucket'], prefix + filename)
+
+    return result
@@ -0,0 +1,188 @@
+""" Versions:     python v. 3.x
+
+    Finds the urls under test from the outputs of the stacks taskcat deployed, used by tests.py with -discover.
+    The root stacks of a taskcat project are listed in every region at once, and their outputs are cached for the run
+    keyed by stack ID, so workers testing the same stack share one DescribeStacks call instead of each making their
+    own. Page urls then come from what the stack really exposes (custom domains and certificates included) rather
+    than being built from the endpoint name.
+"""
+
+import threading
+import tracing
+import aws_interact as aws
+from concurrent.futures import ThreadPoolExecutor
+
+# tag taskcat puts on every stack it launches
+PROJECT_TAG = 'taskcat-project-name'
+COMPLETE = ('CREATE_COMPLETE', 'UPDATE_COMPLETE', 'UPDATE_ROLLBACK_COMPLETE')
+
+# products tested, matched against output keys so e.g. "RStudioURL" is tested as RStudio
+PRODUCTS = ('RStudio', 'Jupyter', 'ATLAS', 'REDCap')
+
+# stacks described so far, keyed by stack ID, and the project stacks found in each region
+STACKS = {}
+REGIONS = {}
+STACKS_LOCK = threading.Lock()
+FETCH_LOCKS = {}
+
+
+def fetch_lock(key):
+    """Get the lock serialising fetches of one stack or region listing
+
+        :param key: stack ID, or (region, project) tuple
+        :return: threading.Lock
+    """
+    with STACKS_LOCK:
+        return FETCH_LOCKS.setdefault(key, threading.Lock())
+
+
+def remember(stack):
+    """Cache a described stack, unless it is still being deployed and its outputs may change
+
+        :param stack: stack dict as returned by DescribeStacks
+    """
+    if stack['StackStatus'] in COMPLETE:
+        with STACKS_LOCK:
+            STACKS[stack['StackId']] = stack
+
+
+def stack_tags(stack):
+    """
+        :param stack: stack dict as returned by DescribeStacks
+        :return: dict of tag key to value
+    """
+    return {tag['Key']: tag['Value'] for tag in stack.get('Tags', [])}
+
+
+def stack_parameters(stack):
+    """
+        :param stack: stack dict as returned by DescribeStacks
+        :return: dict of parameter key to value
+    """
+    return {p['ParameterKey']: p.get('ParameterValue') for p in stack.get('Parameters', [])}
+
+
+def project_stacks(region, project):
+    """List the root stacks of a taskcat project in a region whatever their status, caching those deployed
+
+        :param region: region to search as String
+        :param project: taskcat project name as String
+        :return: list of stack dicts
+    """
+    stacks = []
+    with tracing.span("describe stacks " + region, 'aws', project=project):
+        client = aws.get_client('cloudformation', region)
+        for page in client.get_paginator('describe_stacks').paginate():
+            for stack in page['Stacks']:
+                # nested stacks carry the project tag too, but outputs are read from their parent
+                if stack_tags(stack).get(PROJECT_TAG) == project and 'ParentId' not in stack:
+                    remember(stack)
+                    stacks.append(stack)
+
+    return stacks
+
+
+def region_stacks(region, project, refresh=False):
+    """List the deployed root stacks of a taskcat project in a region
+
+        :param region: region to search as String
+        :param project: taskcat project name as String
+        :param refresh: list the stacks again instead of answering from the cache
+        :return: list of stack dicts
+    """
+    with fetch_lock((region, project)):
+        if refresh or (region, project) not in REGIONS:
+            found = [s['StackId'] for s in project_stacks(region, project) if s['StackStatus'] in COMPLETE]
+            with STACKS_LOCK:
+                REGIONS[(region, project)] = found
+
+    with STACKS_LOCK:
+        return [STACKS[stack_id] for stack_id in REGIONS[(region, project)]]
+
+
+def stack_outputs(stack_id, region):
+    """Get the outputs of a stack, describing it only if no worker has already done so
+
+        :param stack_id: stack ID or name as String
+        :param region: region stack is deployed in as String
+        :return: list of output dicts with OutputKey and OutputValue
+    """
+    with fetch_lock(stack_id):
+        with STACKS_LOCK:
+            stack = STACKS.get(stack_id)
+        if stack is None:
+            with tracing.span("describe stack " + region, 'aws', stack=stack_id):
+                stack = aws.get_client('cloudformation', region).describe_stacks(StackName=stack_id)['Stacks'][0]
+            remember(stack)
+
+    return stack.get('Outputs', [])
+
+
+def select_stack(stacks, endpoint=None):
+    """Pick the stack under test when a region holds several stacks of the project
+
+        :param stacks: list of stack dicts
+        :param endpoint: optional EBEndpoint parameter the stack was deployed with
+        :return: stack dict, None if stacks is empty
+    """
+    if endpoint is not None:
+        matching = [s for s in stacks if stack_parameters(s).get('EBEndpoint') == endpoint]
+        stacks = matching or stacks
+
+    # the most recent deployment is the one the pipeline just made
+    return max(stacks, key=lambda s: s['CreationTime'], default=None)
+
+
+def discover(regions, project, endpoints=None, workers=8):
+    """Find the stack under test in every region concurrently
+
+        :param regions: list of regions as Strings
+        :param project: taskcat project name as String
+        :param endpoints: optional dict of region to expected EBEndpoint parameter
+        :param workers: max regions searched at once
+        :return: dict of region to stack dict, None for regions with no deployed stack
+    """
+    endpoints = endpoints or {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(regions)))) as pool:
+        found = {region: pool.submit(region_stacks, region, project) for region in regions}
+        return {region: select_stack(future.result(), endpoints.get(region)) for region, future in found.items()}
+
+
+def page_outputs(outputs):
+    """Build the pages to test from stack outputs
+
+        Outputs that are not urls are left out, as are deployment logs. Keys naming a product are shortened to the
+        product so its page and sign in checks apply, keeping the first url output of each product.
+
+        :param outputs: list of output dicts with OutputKey and OutputValue
+        :return: list of output dicts in the form test_objects.key_url() builds them
+    """
+    pages = []
+    seen = set()
+    for output in outputs:
+        key = output['OutputKey']
+        value = output.get('OutputValue') or ''
+        if "Deployment" in key or not value.startswith(('http://', 'https://')):
+            continue
+
+        key = next((p for p in PRODUCTS if p.lower() in key.lower()), key)
+        if key not in seen:
+            seen.add(key)
+            pages.append({"OutputKey": key, "OutputValue": value})
+
+    return pages
+
+
+def product_output(outputs, product):
+    """Find the page of one product
+
+        :param outputs: list of output dicts from page_outputs()
+        :param product: product name as String
+        :return: output dict
+        :raises LookupError: if the stack has no url output for product
+    """
+    for output in outputs:
+        if output["OutputKey"] == product:
+            return output
+
+    raise LookupError("Stack has no " + product + " url output")
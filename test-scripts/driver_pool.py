@@ -0,0 +1,208 @@
+""" Versions:     python v. 3.x
+
+    Pool of headless Chrome drivers, used by tests.py.
+    A few drivers are launched up front and more only when every one is in use, up to a limit, and they are lent out
+    to tests with cookies and storage cleared when they are returned so each test starts from an isolated context.
+
+    usage: python3 driver_pool.py -launches=<count>   (reports cold and warm browser start up times)
+"""
+
+import argparse
+import json
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+import tracing
+import web_interact as wi
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from selenium.common.exceptions import WebDriverException
+
+
+@tracing.traced('browser')
+def new_pool(size, limit=None):
+    """Launch drivers concurrently and hold them ready for use
+
+        :param size: number of browsers to launch up front
+        :param limit: max browsers the pool holds, launching more than size only while every browser is in use
+               [default: size]
+        :return: pool dict
+        :raises WebDriverException: if a browser fails to launch, after quitting those that did
+    """
+    pool = {'idle': queue.Queue(),
+            'drivers': [],
+            'size': size,
+            'limit': max(size, limit or 0),
+            'lock': threading.Lock()
+            }
+
+    with ThreadPoolExecutor(max_workers=max(1, size)) as launcher:
+        futures = [launcher.submit(wi.chrome_driver) for _ in range(size)]
+    errors = []
+    for future in futures:
+        try:
+            pool['drivers'].append(future.result())
+        except Exception as e:
+            errors.append(e)
+
+    if errors:
+        close_pool(pool)
+        raise WebDriverException("Failed to launch " + str(len(errors)) + " of " + str(size) + " browsers: " +
+                                 str(errors[0]).strip())
+    for driver in pool['drivers']:
+        pool['idle'].put(driver)
+
+    return pool
+
+
+@tracing.traced('browser')
+def acquire(pool, timeout=None):
+    """Take an idle driver from the pool, launching another if all are in use and the pool is below its limit,
+       otherwise waiting until one is returned
+
+        :param pool: driver pool dict
+        :param timeout: optional seconds to wait for a driver
+        :return: webdriver for Chrome page
+    """
+    try:
+        return pool['idle'].get_nowait()
+    except queue.Empty:
+        pass
+
+    with pool['lock']:
+        grow = pool['size'] < pool['limit']
+        if grow:
+            pool['size'] += 1
+    if not grow:
+        return pool['idle'].get(timeout=timeout)
+
+    try:
+        driver = wi.chrome_driver()
+    except Exception:
+        with pool['lock']:
+            pool['size'] -= 1
+        raise
+    with pool['lock']:
+        pool['drivers'].append(driver)
+
+    return driver
+
+
+def release(pool, driver):
+    """Clear browser state and return driver to the pool, dropping it if the browser has died so that a new one is
+       launched the next time every browser is in use
+
+        :param pool: driver pool dict
+        :param driver: webdriver previously acquired from pool
+    """
+    try:
+        reset(driver)
+    except WebDriverException as e:
+        print("Dropping unresponsive driver (" + str(e) + ")")
+        with pool['lock']:
+            pool['drivers'].remove(driver)
+            pool['size'] -= 1
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+        return
+
+    pool['idle'].put(driver)
+
+
+@tracing.traced('browser')
+def reset(driver):
+    """Clear cookies and storage so the next test using the driver starts from a clean context
+
+        :param driver: webdriver for Chrome page
+    """
+    try:
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+    except WebDriverException:
+        # pages without storage access (e.g. about:blank) have nothing to clear
+        pass
+    driver.delete_all_cookies()
+    driver.get("about:blank")
+    wi.drain_log(driver)
+
+
+@contextmanager
+def borrowed(pool):
+    """Lend a driver from the pool for the duration of a with block
+
+        :param pool: driver pool dict
+    """
+    driver = acquire(pool)
+    try:
+        yield driver
+    finally:
+        release(pool, driver)
+
+
+def close_pool(pool):
+    """Quit every browser launched by the pool
+
+        :param pool: driver pool dict
+    """
+    with pool['lock']:
+        drivers, pool['drivers'] = pool['drivers'], []
+        pool['limit'] = 0
+    for driver in drivers:
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+
+def benchmark(launches):
+    """Measure cold and warm browser start up times
+
+        Cold includes resolving the driver binary with no cached path, warm launches reuse the cached binary, and
+        pooled is the time to borrow an already running browser.
+
+        :param launches: number of warm launches to sample
+        :return: dict of timings in milliseconds
+    """
+    if os.path.exists(wi.DRIVER_CACHE):
+        os.remove(wi.DRIVER_CACHE)
+
+    start = time.perf_counter()
+    wi.chrome_driver().quit()
+    cold = (time.perf_counter() - start) * 1000
+
+    warm = []
+    for _ in range(launches):
+        start = time.perf_counter()
+        wi.chrome_driver().quit()
+        warm.append((time.perf_counter() - start) * 1000)
+
+    pool = new_pool(1)
+    pooled = []
+    for _ in range(launches):
+        start = time.perf_counter()
+        with borrowed(pool):
+            pass
+        pooled.append((time.perf_counter() - start) * 1000)
+    close_pool(pool)
+
+    return {'cold launch (ms)': cold,
+            'warm launch median (ms)': statistics.median(warm),
+            'warm launch max (ms)': max(warm),
+            'pooled acquire median (ms)': statistics.median(pooled)
+            }
+
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-launches", type=int, help="number of warm launches to sample (int) [default: 5]", default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark(args.launches), indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
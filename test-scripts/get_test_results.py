@@ -1,65 +1,311 @@
 # This script parses the generated json test results and
 # injects them into the taskcat generated html dashboard
-# and publishes messages to the SNS topic when an error is found
+# and publishes a summary to the SNS topic when errors are found
+#
+# usage: python3 get_test_results.py <regions> <folder> <topic_arn> <result_bucket> -results=<dir>
+#
+# <regions> may be a single region, a comma separated list of regions, or "ALL" for every
+# test_output_<region>.json found in the results directory. Every result file is loaded once, the
+# taskcat dashboard is scanned once to find the stack for each region, and the combined dashboard
+# is streamed out row by row rather than built up as a document tree.
+#
+# -trace=<file> records the time taken by each step in Chrome trace format (see tracing.py) and uploads
+# the file to the result bucket folder next to the result files.
 
-import boto3
-import sys
-import re
-from bs4 import BeautifulSoup
+import argparse
+import glob
+import html
 import json
+import os
+import sys
+import aws_interact as aws
+import history
+import notify
+import regression
+import tracing
+from html.parser import HTMLParser
+
+DASHBOARD = 'taskcat_outputs/index.html'
+COMBINED_DASHBOARD = 'taskcat_outputs/index2.html'
+# failures already notified, carried between scheduled runs so unchanged failures are not re-sent
+NOTIFY_STATE = 'notification_state.json'
+NOTIFY_STATE_KEY = 'notifications/state.json'
+HISTORY_KEY = 'history/results.csv.gz'
+
+ROW = ('<tr><td class="test-info"><h3>{name}</h3></td>'
+       '<td class="test-left">{region}</td>'
+       '<td class="test-left">{stack}</td>'
+       '<td class="{result_class}">{result}</td>'
+       '<td class="test-left"><a href="{logs}">View Logs</a></td></tr>\n')
+
+
+class StackIndexer(HTMLParser):
+    """Single pass over the taskcat dashboard mapping each tested region to its stack name"""
+
+    def __init__(self, regions):
+        super().__init__()
+        self.regions = set(regions)
+        self.stacks = {}
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self.row = []
+        elif tag == 'td' and self.row is not None:
+            self.cell = []
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'td' and self.cell is not None:
+            self.row.append(''.join(self.cell).strip())
+            self.cell = None
+        elif tag == 'tr' and self.row is not None:
+            # taskcat rows are test name, region, stack name, result, logs
+            if len(self.row) > 2 and self.row[1] in self.regions:
+                self.stacks.setdefault(self.row[1], self.row[2])
+            self.row = None
+
+
+@tracing.traced()
+def load_results(regions, results_dir):
+    """Load the test results for every region once
+
+        :param regions: list of regions, or ["ALL"] for every result file found
+        :param results_dir: directory holding test_output_<region>.json files
+        :return: dict of region to (result file path, list of test dicts)
+    """
+    if regions == ['ALL']:
+        paths = sorted(glob.glob(os.path.join(results_dir, 'test_output_*.json')))
+        regions = [os.path.basename(p)[len('test_output_'):-len('.json')] for p in paths]
+
+    results = {}
+    for region in regions:
+        path = os.path.join(results_dir, 'test_output_' + region + '.json')
+        with open(path) as f:
+            results[region] = (path, json.load(f)["Page Access Info"])
+
+    return results
+
+
+@tracing.traced()
+def index_stacks(page, regions):
+    """Find the stack name deployed to each region in the taskcat dashboard
+
+        :param page: taskcat dashboard html as String
+        :param regions: regions to find stacks for
+        :return: dict of region to stack name
+    """
+    indexer = StackIndexer(regions)
+    indexer.feed(page)
+    indexer.close()
+
+    return indexer.stacks
+
+
+@tracing.traced()
+def write_dashboard(page, results, stacks, folder, result_bucket, out, gates=None):
+    """Stream the taskcat dashboard with a row added for every test result
+
+        :param page: taskcat dashboard html as String
+        :param results: dict of region to (result file path, list of test dicts)
+        :param stacks: dict of region to stack name
+        :param folder: folder in the result bucket holding the result files
+        :param result_bucket: name of S3 bucket holding the dashboard
+        :param out: writable file for the combined dashboard
+        :param gates: optional dict of region to regression gate result dict
+    """
+    gates = gates or {}
+    # rows are added to the end of the dashboard's table header, as taskcat names it
+    insert = page.find('</thread>')
+    if insert < 0:
+        insert = page.find('</table>')
+    if insert < 0:
+        insert = len(page)
+
+    out.write(page[:insert])
+    for region, (path, tests) in results.items():
+        logs = "https://" + result_bucket + ".s3.amazonaws.com/" + folder + "/" + os.path.basename(path)
+        for test in tests:
+            success = test["status"] == "SUCCESS"
+            result = test["status"]
+            if notify.retried(test):
+                result += " (" + notify.RETRIED.lower() + ", " + str(test["attempts"]) + " attempts)"
+            out.write(ROW.format(name=html.escape(test["tag"] + ": " + test["test"]),
+                                 region=html.escape(region),
+                                 stack=html.escape(stacks.get(region, 'UNKNOWN')),
+                                 result_class="test-green" if success else "test-red",
+                                 result=html.escape(result),
+                                 logs=html.escape(logs)))
+        if region in gates:
+            write_gate(out, region, stacks.get(region, 'UNKNOWN'), gates[region], logs)
+    out.write(page[insert:])
+
+
+def write_gate(out, region, stack, gate, logs):
+    """Write dashboard rows for a region's regression gate verdict and each breached measurement
+
+        :param out: writable file for the combined dashboard
+        :param region: region tested
+        :param stack: stack name deployed to region
+        :param gate: regression gate result dict
+        :param logs: url to the region's result file
+    """
+    rows = [("Performance regression gate", gate['verdict'])]
+    for check in gate['checks']:
+        if check['breached']:
+            rows.append(("{0}: {1} {2} {3:+.0f} ms ({4:.0f} vs baseline {5:.0f})".format(
+                check['tag'], check['test'], check['metric'], check['delta'], check['current'], check['baseline']),
+                gate['verdict']))
+
+    for name, result in rows:
+        out.write(ROW.format(name=html.escape(name),
+                             region=html.escape(region),
+                             stack=html.escape(stack),
+                             result_class="test-green" if result == "PASS" else "test-red",
+                             result=html.escape(result),
+                             logs=html.escape(logs)))
+
+
+@tracing.traced()
+def run_gate(results, args):
+    """Run the regression gate for each region and record the verdict and deltas in the region's result file
+
+        :param results: dict of region to (result file path, list of test dicts)
+        :param args: parsed command line arguments
+        :return: dict of region to regression gate result dict
+    """
+    base = regression.baseline(args.history, args.gate_runs, args.gate_percentile)
+    checks = regression.gate(results, base, args.gate_threshold, args.gate_min_delta)
+
+    gates = {}
+    for region, (path, _) in results.items():
+        gates[region] = {'verdict': regression.verdict(checks[region], args.gate),
+                         'mode': args.gate,
+                         'threshold': args.gate_threshold,
+                         'baseline percentile': args.gate_percentile,
+                         'checks': checks[region]
+                         }
+
+        with open(path) as f:
+            output = json.load(f)
+        output['Regression Gate'] = gates[region]
+        with open(path, "w") as f:
+            json.dump(output, f)
+        if not args.offline:
+            aws.upload_file(path, args.result_bucket, args.folder + "/" + os.path.basename(path))
+
+    return gates
+
+
+@tracing.traced()
+def notify_failures(results, args, gates=None):
+    """Send one deduplicated summary of every failed test and performance regression in the run
+
+        :param results: dict of region to (result file path, list of test dicts)
+        :param args: parsed command line arguments
+        :param gates: optional dict of region to regression gate result dict
+    """
+    gates = gates or {}
+    results = {region: (path, tests + regression.as_failures(gates[region]['checks']) if region in gates else tests)
+               for region, (path, tests) in results.items()}
+
+    if args.stub_notifications:
+        publish = notify.stub_publisher(args.stub_notifications)
+    else:
+        publish = notify.sns_publisher(args.topic_arn)
+
+    state = {}
+    if os.path.exists(NOTIFY_STATE):
+        with open(NOTIFY_STATE) as f:
+            state = json.load(f)
+
+    dashboard = "https://" + args.result_bucket + ".s3.amazonaws.com/index2.html"
+    state = notify.notify_run(results, publish, state, args.dedup_hours * 3600, dashboard)
+
+    with open(NOTIFY_STATE, "w") as f:
+        json.dump(state, f)
+
+
+def parse_args():
+    """Parse arguments for building dashboard
+
+        :return: parser for args
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("regions", type=str, help="region, comma separated regions, or \"ALL\" (str)")
+    parser.add_argument("folder", type=str, help="folder in result bucket holding result files (str)")
+    parser.add_argument("topic_arn", type=str, help="ARN of SNS topic notified of failures (str)")
+    parser.add_argument("result_bucket", type=str, help="name of S3 bucket holding the dashboard (str)")
+    parser.add_argument("-results", type=str, help="directory holding test_output_<region>.json files (str) "
+                        "[default: .]", default=".")
+    parser.add_argument("-dedup-hours", type=float, help="hours an unchanged failure is not re-notified (float) "
+                        "[default: 192, covering the weekly schedule]", default=192)
+    parser.add_argument("-stub-notifications", type=str, help="append notifications to this local file instead of "
+                        "publishing to SNS (str)", default=None)
+    parser.add_argument("-history", type=str, help="local copy of the results history store (str) [default: "
+                        "history.csv.gz]", default="history.csv.gz")
+    parser.add_argument("-gate", type=str, help="action on a performance regression (str) from set {\"off\", "
+                        "\"warn\", \"fail\"} [default: warn]", default="warn")
+    parser.add_argument("-gate-threshold", type=float, help="ratio of current to baseline timing counted as a "
+                        "regression (float) [default: 1.5]", default=1.5)
+    parser.add_argument("-gate-min-delta", type=float, help="smallest slow down in ms counted as a regression "
+                        "(float) [default: 100]", default=100)
+    parser.add_argument("-gate-runs", type=int, help="previous runs in the baseline (int) [default: 10]", default=10)
+    parser.add_argument("-gate-percentile", type=float, help="percentile of previous runs used as the baseline "
+                        "(float) [default: 90]", default=90)
+    parser.add_argument("-offline", action="store_true", help="keep history and notification state local instead of "
+                        "syncing them with the result bucket")
+    parser.add_argument("-trace", type=str, help="write timing spans to this Chrome trace file and upload it to the "
+                        "result bucket folder (str)", default=None)
+
+    return parser.parse_args()
+
+
+def main(args):
+    args = parse_args()
+    regions = [r.strip() for r in args.regions.split(",") if r.strip()]
+    if args.trace:
+        tracing.enable()
+
+    results = load_results(regions, args.results)
+
+    if not args.offline:
+        aws.download_file(args.result_bucket, HISTORY_KEY, args.history)
+        aws.download_file(args.result_bucket, NOTIFY_STATE_KEY, NOTIFY_STATE)
+
+    with open(DASHBOARD) as fp:
+        page = fp.read()
+    stacks = index_stacks(page, results.keys())
+    print(stacks)
+
+    # baseline is taken from previous runs only, so the gate runs before this run is added to history
+    gates = run_gate(results, args) if args.gate != "off" else {}
+
+    with open(COMBINED_DASHBOARD, "w") as out:
+        write_dashboard(page, results, stacks, args.folder, args.result_bucket, out, gates)
+
+    with tracing.span("record_history"):
+        print(str(history.record(args.history, history.run_id(), results)) + " measurements added to history")
+    notify_failures(results, args, gates)
+
+    if not args.offline:
+        aws.upload_file(args.history, args.result_bucket, HISTORY_KEY, public=False)
+        aws.upload_file(NOTIFY_STATE, args.result_bucket, NOTIFY_STATE_KEY, public=False)
+
+    if args.trace:
+        print(str(tracing.write(args.trace)) + " spans written to " + args.trace)
+        if not args.offline:
+            aws.upload_file(args.trace, args.result_bucket, args.folder + "/" + os.path.basename(args.trace))
+
+    if any(gate['verdict'] == "FAIL" for gate in gates.values()):
+        print("Performance regression gate FAILED")
+        exit(-1)
+
 
-region = sys.argv[1]
-folder = sys.argv[2]
-topic_arn = sys.argv[3]
-result_bucket = sys.argv[4]
-
-test_log_file = 'test-scripts/test_output_' + region + '.json'
-
-with open('taskcat_outputs/index.html') as fp:
-	soup = BeautifulSoup(fp, 'html.parser')
-	stack_name = soup.find('td', text = re.compile(region)).parent.contents[5].string.strip()
-	print(stack_name)
-
-	with open(test_log_file) as f:
-		test_results = json.load(f)
-		for test in test_results["Page Access Info"]:
-			test_name = test["tag"] + ": " + test["test"]
-			test_results = test["status"]
-			# create tags to append to dashboard
-			new_row = soup.new_tag("tr")
-			new_test_name = soup.new_tag("td", attrs={"class": "test-info"})
-			new_h3_text = soup.new_tag("h3")
-			new_h3_text.string = test_name
-			new_test_name.append(new_h3_text)
-			new_region = soup.new_tag("td", attrs={"class": "test-left"})
-			new_region.string = region
-			new_stack = soup.new_tag("td", attrs={"class": "test-left"})
-			new_stack.string = stack_name
-			new_test_result = None
-			if(test_results == "SUCCESS"):
-				new_test_result = soup.new_tag("td", attrs={"class": "test-green"})
-			else:
-				# Send an error message if a failure is found
-				new_test_result = soup.new_tag("td", attrs={"class": "test-red"})
-				print("FAILURE found")
-				client = boto3.client('sns')
-				response = client.publish(
-					TopicArn = topic_arn,
-					Message = test["message"] + "\n Extra information: \n" + json.dumps(test["extra"]) + "\n Dashboard: \n https://" + result_bucket +".s3.amazonaws.com/index2.html" ,
-					Subject = 'Clouformation Testing Pipeline Internal Test Failure'
-				)
-			new_test_result.string = test_results
-			new_logs = soup.new_tag("td", attrs={"class": "test-left"})
-			new_link = soup.new_tag("a", href = "https://" + result_bucket + ".s3.amazonaws.com/" + folder + "/" + test_log_file)
-			new_link.string = "View Logs"
-			new_logs.append(new_link)
-
-			new_row.append(new_test_name)
-			new_row.append(new_region)
-			new_row.append(new_stack)
-			new_row.append(new_test_result)
-			new_row.append(new_logs)
-			soup.thread.append(new_row)
-
-		with open("./taskcat_outputs/index2.html", "w") as file:
-			file.write(str(soup))
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,132 @@
+""" Versions:     python v. 3.x
+
+    Append-only store of test measurements across pipeline runs, used by get_test_results.py.
+    Each run appends one row per (region, product, sub-test, metric) as a new gzip member of a single CSV file, so the
+    store stays compact, existing data is never rewritten, and the file can be synced whole to the results bucket.
+
+    usage: python3 history.py <file> <region> <tag> <test> <metric> -last=<runs>   (prints the trend for a metric)
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import sys
+from collections import OrderedDict
+from datetime import datetime
+
+COLUMNS = ['run', 'time', 'region', 'tag', 'test', 'metric', 'value']
+
+# numeric response fields recorded for every sub-test
+RESPONSE_METRICS = ['http status', 'http response time (ms)', 'front end response time (ms)',
+                    'back end response time (ms)']
+
+
+def run_id():
+    """Identify the current pipeline run
+
+        :return: CodeBuild build id, or the current UTC time outside CodeBuild
+    """
+    return os.environ.get('CODEBUILD_BUILD_ID', datetime.utcnow().strftime("%Y%m%dT%H%M%SZ"))
+
+
+def metrics(test):
+    """Extract numeric measurements from a sub-test result
+
+        :param test: test result dict
+        :return: dict of metric name to number
+    """
+    values = {'status': 1 if test['status'] == 'SUCCESS' else 0}
+    if isinstance(test.get('elapsed (ms)'), (int, float)):
+        values['elapsed (ms)'] = test['elapsed (ms)']
+
+    for extra in test['extra']:
+        for name in RESPONSE_METRICS:
+            if isinstance(extra.get(name), (int, float)):
+                values[name] = extra[name]
+        for name, stats in extra.get('page timing', {}).items():
+            values['page timing ' + name] = stats['median']
+
+    return values
+
+
+def record(path, run, results, when=None):
+    """Append every measurement from a run to the store
+
+        :param path: store file
+        :param run: run id as String
+        :param results: dict of region to (result file path, list of test dicts)
+        :param when: optional time of run as ISO 8601 String
+        :return: number of rows appended
+    """
+    when = when or datetime.utcnow().isoformat() + "Z"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    rows = 0
+    for region, (_, tests) in results.items():
+        for test in tests:
+            for metric, value in metrics(test).items():
+                writer.writerow([run, when, region, test['tag'], test['test'], metric, value])
+                rows += 1
+
+    # each run is written as its own gzip member, which gzip readers treat as one continuous stream
+    with gzip.open(path, 'at', newline='') as f:
+        f.write(buffer.getvalue())
+
+    return rows
+
+
+def rows(path):
+    """Stream every row in the store in the order written
+
+        :param path: store file
+        :return: generator of row dicts with numeric values
+    """
+    if not os.path.exists(path):
+        return
+
+    with gzip.open(path, 'rt', newline='') as f:
+        for row in csv.reader(f):
+            entry = dict(zip(COLUMNS, row))
+            entry['value'] = float(entry['value'])
+            yield entry
+
+
+def trend(path, region, tag, test, metric, last=10):
+    """Values of one metric over the most recent runs that recorded it
+
+        :param path: store file
+        :param region: region tested
+        :param tag: product tag, e.g. ATLAS
+        :param test: sub-test name, e.g. sign in attempt
+        :param metric: metric name, e.g. back end response time (ms)
+        :param last: number of runs to return
+        :return: list of (run, time, value) tuples, oldest first
+    """
+    series = OrderedDict()
+    for row in rows(path):
+        if (row['region'], row['tag'], row['test'], row['metric']) == (region, tag, test, metric):
+            series.pop(row['run'], None)
+            series[row['run']] = (row['run'], row['time'], row['value'])
+
+    return list(series.values())[-last:]
+
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", type=str, help="history store file (str)")
+    parser.add_argument("region", type=str, help="region tested (str)")
+    parser.add_argument("tag", type=str, help="product tag, e.g. ATLAS (str)")
+    parser.add_argument("test", type=str, help="sub-test name, e.g. \"sign in attempt\" (str)")
+    parser.add_argument("metric", type=str, help="metric name, e.g. \"back end response time (ms)\" (str)")
+    parser.add_argument("-last", type=int, help="number of most recent runs (int) [default: 10]", default=10)
+    args = parser.parse_args()
+
+    for run, when, value in trend(args.file, args.region, args.tag, args.test, args.metric, args.last):
+        print(when + "  " + run + "  " + str(value))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,235 @@
+""" Versions:     python v. 3.x
+
+    In-process HTTP client used by tests.py and test_objects.py in place of curl subprocesses.
+    Connections are kept alive and pooled per host, and every request returns a response dict holding a numeric status
+    code and timing rather than scraped terminal text. Requests are blocking http.client calls; several can be made at
+    once with fetch_all(), each on a thread of a pool of fixed size, so concurrency is bounded by MAX_CONCURRENCY.
+"""
+
+import http.client
+import random
+import threading
+import time
+import tracing
+from http.cookies import SimpleCookie
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+TIMEOUT = 30
+
+# idle keep-alive connections keyed by (scheme, host:port), shared by every region
+POOL = {}
+POOL_LOCK = threading.Lock()
+
+# threads fetch_all() runs requests on, shared by every region, each holding one request in flight
+MAX_CONCURRENCY = 16
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='http')
+
+# a request on a reused connection is only sent again if it is safe to repeat and the server closed the idle
+# connection before answering, never after a timeout, where the server may still be processing it
+IDEMPOTENT = ('GET', 'HEAD')
+STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+def new_response(url, status=None, headers=None, body=b'', elapsed=None, error=None):
+    """Create response information dict
+
+        :param url: url requested as String
+        :param status: http status code as int, None if no response was received
+        :param headers: list of (name, value) header tuples
+        :param body: response body as bytes
+        :param elapsed: time taken for the request in milliseconds
+        :param error: description of connection error as String, if any
+        :return: response dict
+    """
+    resp = {'url': url,
+            'status': status,
+            'headers': headers or [],
+            'body': body,
+            'time (ms)': elapsed,
+            'error': error
+            }
+
+    return resp
+
+
+def get_header(resp, name):
+    """Find first header value in response with given name
+
+        :param resp: response dict
+        :param name: header name, case insensitive
+        :return: header value as String, None if not present
+    """
+    for key, value in resp['headers']:
+        if key.lower() == name.lower():
+            return value
+
+    return None
+
+
+def get_cookies(resp, jar=None):
+    """Collect cookies set by a response
+
+        :param resp: response dict
+        :param jar: optional dict of cookies to update
+        :return: dict of cookie names to values
+    """
+    jar = {} if jar is None else jar
+
+    for key, value in resp['headers']:
+        if key.lower() == 'set-cookie':
+            cookie = SimpleCookie()
+            cookie.load(value)
+            for name, morsel in cookie.items():
+                jar[name] = morsel.value
+
+    return jar
+
+
+def cookie_header(jar):
+    """Format cookie jar as Cookie request header value
+
+        :param jar: dict of cookie names to values
+        :return: header value as String
+    """
+    return "; ".join(name + "=" + value for name, value in jar.items())
+
+
+def _checkout(scheme, netloc):
+    """Take an idle connection for host from the pool, or open a new one
+
+        :return: connection and whether it was reused
+    """
+    with POOL_LOCK:
+        idle = POOL.get((scheme, netloc))
+        if idle:
+            return idle.pop(), True
+
+    if scheme == 'https':
+        return http.client.HTTPSConnection(netloc, timeout=TIMEOUT), False
+    return http.client.HTTPConnection(netloc, timeout=TIMEOUT), False
+
+
+def _checkin(scheme, netloc, conn):
+    with POOL_LOCK:
+        POOL.setdefault((scheme, netloc), []).append(conn)
+
+
+def close_all():
+    """Close every idle pooled connection"""
+    with POOL_LOCK:
+        for conns in POOL.values():
+            for conn in conns:
+                conn.close()
+        POOL.clear()
+
+
+def fetch(method, url, body=None, headers=None):
+    """Perform a single request on a pooled keep-alive connection, blocking until complete
+
+        :param method: http method as String
+        :param url: url being requested as String
+        :param body: optional request body as String or bytes
+        :param headers: optional dict of request headers
+        :return: response dict
+    """
+    with tracing.span(method, 'http', url=url):
+        parts = urlsplit(url)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        start = time.perf_counter()
+        while True:
+            conn, reused = _checkout(parts.scheme, parts.netloc)
+            resp = None
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                # a kept-alive connection may have been closed by the server while idle, retry on a fresh one
+                if reused and resp is None and method in IDEMPOTENT and isinstance(e, STALE_ERRORS):
+                    continue
+                return new_response(url, elapsed=(time.perf_counter() - start) * 1000, error=str(e))
+            break
+
+        elapsed = (time.perf_counter() - start) * 1000
+
+        if resp.will_close:
+            conn.close()
+        else:
+            _checkin(parts.scheme, parts.netloc, conn)
+
+        return new_response(url, resp.status, resp.getheaders(), data, elapsed)
+
+
+def fetch_all(calls):
+    """Perform several requests concurrently on the shared request threads
+
+        :param calls: list of (method, url, body, headers) tuples
+        :return: list of response dicts in the same order as calls
+    """
+    return list(EXECUTOR.map(lambda call: fetch(*call), calls))
+
+
+def form_post(url, fields, headers=None):
+    """Build a url encoded form POST call for use with fetch or fetch_all
+
+        :param url: url form is posted to as String
+        :param fields: dict of form field names to values
+        :param headers: optional dict of additional request headers
+        :return: (method, url, body, headers) tuple
+    """
+    all_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    all_headers.update(headers or {})
+
+    return 'POST', url, urlencode(fields), all_headers
+
+
+def status(url):
+    """Retrieve http response from page directly
+
+        :param url: url for page being tested as String
+        :return: response dict
+    """
+    return fetch('GET', url)
+
+
+def healthy(resp):
+    """Check whether a response shows the endpoint is up and serving pages
+
+        :param resp: response dict
+        :return: True if a non-error status was received
+    """
+    return resp['status'] is not None and resp['status'] < 400
+
+
+@tracing.traced('http')
+def wait_for_ready(url, deadline, base=2, cap=30):
+    """Poll endpoint with exponential backoff and jitter until it responds healthy or the deadline passes
+
+        :param url: url for endpoint being polled as String
+        :param deadline: time.monotonic() value after which polling stops
+        :param base: initial delay between polls in seconds
+        :param cap: maximum delay between polls in seconds
+        :return: seconds taken to become ready (None if never ready) and the last response dict
+    """
+    start = time.monotonic()
+    attempt = 0
+
+    while True:
+        resp = status(url)
+        if healthy(resp):
+            return time.monotonic() - start, resp
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None, resp
+
+        # half fixed, half random delay keeps endpoints across regions from being polled in lock step
+        delay = min(cap, base * 2 ** attempt)
+        time.sleep(min(remaining, delay / 2 + random.uniform(0, delay / 2)))
+        attempt += 1
@@ -0,0 +1,204 @@
+""" Versions:     python v. 3.x
+
+    Browserless sign in checks, used by tests.py and load_test.py with -probe=http.
+    Login pages are fetched and parsed as plain HTML, the sign in form is filled in with its hidden fields (CSRF and
+    xsrf tokens included) and posted with the cookies the page set, redirects are followed by hand so each hop is
+    recorded, and the title of the page finally returned is checked as the browser test checks it. Products whose
+    sign in only works with JavaScript running are still tested in Chrome.
+"""
+
+import http_interact as http
+from html.parser import HTMLParser
+from urllib.parse import urlencode, urljoin
+
+# RStudio encrypts the credentials in the browser before posting them, so it cannot be signed into without JavaScript
+BROWSER_ONLY = ('RStudio',)
+
+MAX_REDIRECTS = 10
+REDIRECTS = (301, 302, 303, 307, 308)
+
+# cookies echoed back as a header on form posts by frameworks using double submit CSRF protection
+XSRF_COOKIES = {'_xsrf': 'X-XSRFToken',
+                'XSRF-TOKEN': 'X-XSRF-TOKEN',
+                'csrftoken': 'X-CSRFToken'
+                }
+
+
+class PageParser(HTMLParser):
+    """Collects the title and forms of a page"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ''
+        self.forms = []
+        self.in_title = False
+        self.form = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'title':
+            self.in_title = True
+        elif tag == 'form':
+            self.form = {'action': attrs.get('action') or '',
+                         'method': (attrs.get('method') or 'get').upper(),
+                         'inputs': []
+                         }
+            self.forms.append(self.form)
+        elif tag in ('input', 'button') and self.form is not None and attrs.get('name'):
+            kind = attrs.get('type') or ('submit' if tag == 'button' else 'text')
+            self.form['inputs'].append({'name': attrs['name'],
+                                        'type': kind.lower(),
+                                        'value': attrs.get('value') or '',
+                                        'checked': 'checked' in attrs
+                                        })
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self.in_title = False
+        elif tag == 'form':
+            self.form = None
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+
+
+def new_probe():
+    """Create the state of one browserless visitor, kept across the page and sign in checks of a product
+
+        :return: probe dict
+    """
+    return {'jar': {}, 'url': None, 'page': None}
+
+
+def navigate(probe, method, url, body=None, headers=None):
+    """Request a page with the probe's cookies, following redirects and parsing the page finally returned
+
+        :param probe: probe dict
+        :param method: http method as String
+        :param url: url requested as String
+        :param body: optional request body as String
+        :param headers: optional dict of request headers
+        :return: response dict of the final page, with its title, the redirects followed and the total time taken
+    """
+    redirects = []
+    elapsed = 0
+
+    for _ in range(MAX_REDIRECTS + 1):
+        all_headers = dict(headers or {})
+        if probe['jar']:
+            all_headers['Cookie'] = http.cookie_header(probe['jar'])
+
+        resp = http.fetch(method, url, body, all_headers)
+        elapsed += resp['time (ms)'] or 0
+        http.get_cookies(resp, probe['jar'])
+
+        location = http.get_header(resp, 'Location')
+        if resp['status'] not in REDIRECTS or location is None:
+            break
+        redirects.append({'url': url, 'http status': resp['status']})
+        url = urljoin(url, location)
+        # only 307 and 308 repeat the original method and body
+        if resp['status'] not in (307, 308):
+            method, body, headers = 'GET', None, None
+
+    page = PageParser()
+    page.feed((resp['body'] or b'').decode('utf-8', 'replace'))
+    page.close()
+
+    probe['url'] = url
+    probe['page'] = page
+    resp['title'] = page.title.strip()
+    resp['redirects'] = redirects
+    resp['time (ms)'] = elapsed
+
+    return resp
+
+
+def sign_in_form(page):
+    """Find the form with a password field
+
+        :param page: parsed page
+        :return: form dict, None if the page has no sign in form
+    """
+    if page is None:
+        return None
+
+    for form in page.forms:
+        if any(field['type'] == 'password' for field in form['inputs']):
+            return form
+
+    return None
+
+
+def form_fields(form, jar, user, passw):
+    """Fill in a sign in form as a browser submitting it would
+
+        :param form: form dict
+        :param jar: dict of cookies set so far
+        :param user: username as String
+        :param passw: password as String
+        :return: dict of field names to values
+    """
+    fields = {}
+    user_set = False
+    submit_set = False
+
+    for field in form['inputs']:
+        kind = field['type']
+        if kind == 'password':
+            fields[field['name']] = passw
+        elif kind in ('text', 'email') and not user_set:
+            fields[field['name']] = user
+            user_set = True
+        elif kind in ('submit', 'image'):
+            # only the button clicked is sent
+            if not submit_set:
+                fields[field['name']] = field['value']
+                submit_set = True
+        elif kind in ('checkbox', 'radio'):
+            if field['checked']:
+                fields[field['name']] = field['value'] or 'on'
+        elif kind != 'button':
+            # a token field left empty for script to copy from its cookie is filled the same way
+            fields[field['name']] = field['value'] or jar.get(field['name'], '')
+
+    return fields
+
+
+def sign_in(probe, link, user, passw, title):
+    """Fill in and post the sign in form, then check the title of the page signed into
+
+        The sign in page is fetched first unless the probe is already on a page with a sign in form.
+
+        :param probe: probe dict
+        :param link: url of sign in page as String
+        :param user: username as String
+        :param passw: password as String
+        :param title: page title expected upon successful sign in
+        :return: status and message String tuple, and the response dict of the last page requested
+    """
+    form = sign_in_form(probe['page'])
+    if form is None:
+        resp = navigate(probe, 'GET', link)
+        form = sign_in_form(probe['page'])
+        if form is None:
+            return ('FAILURE', 'Unable to access page elements'), resp
+
+    fields = form_fields(form, probe['jar'], user, passw)
+    headers = {header: probe['jar'][cookie] for cookie, header in XSRF_COOKIES.items() if cookie in probe['jar']}
+    action = urljoin(probe['url'], form['action'])
+
+    if form['method'] == 'GET':
+        resp = navigate(probe, 'GET', action + ('&' if '?' in action else '?') + urlencode(fields), None, headers)
+    else:
+        resp = navigate(probe, *http.form_post(action, fields, headers))
+
+    if resp['status'] is None:
+        return ('FAILURE', 'Sign in attempt could not connect'), resp
+    if resp['status'] < 400 and resp['title'] == title:
+        return ('SUCCESS', 'Sign in complete'), resp
+    if "Sign In" in resp['title'] or "invalid user" in (resp['body'] or b'').decode('utf-8', 'replace').lower():
+        return ('FAILURE', 'Incorrect username or password'), resp
+
+    return ('FAILURE', 'Sign in attempt failed'), resp
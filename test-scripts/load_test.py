@@ -0,0 +1,213 @@
+""" Versions:     python v. 3.x
+
+    Concurrent sign in load test for RStudio, Jupyter, ATLAS and REDCap, used by tests.py (-test=load).
+    Virtual users are started gradually over a ramp up period and each repeats the sign in flow for every product,
+    recording throughput, error rate and a latency histogram per endpoint.
+"""
+
+import json
+import random
+import threading
+import time
+import atlas
+import aws_interact as aws
+import driver_pool as dp
+import history
+import http_probe as hp
+import result_log as rl
+import test_objects as tob
+import web_interact as wi
+from concurrent.futures import ThreadPoolExecutor
+from selenium.common.exceptions import WebDriverException
+from stats import summarize
+
+# upper bounds of latency histogram buckets in milliseconds
+BUCKETS = [100, 250, 500, 1000, 2500, 5000, 10000, 20000, 60000]
+
+# latencies kept per endpoint for percentiles, a uniform sample once more requests are made, so memory stays flat
+RESERVOIR = 2048
+
+
+def new_stats():
+    """Create empty measurements for a single endpoint
+
+        :return: endpoint stats dict
+    """
+    stats = {'lock': threading.Lock(),
+             'requests': 0,
+             'errors': 0,
+             'sample': [],
+             'min': None,
+             'max': None,
+             'histogram': [0] * (len(BUCKETS) + 1)
+             }
+
+    return stats
+
+
+def record(stats, elapsed, ok):
+    """Record the outcome of a single sign in
+
+        :param stats: endpoint stats dict
+        :param elapsed: time taken in milliseconds
+        :param ok: True if the sign in succeeded
+    """
+    bucket = len(BUCKETS)
+    for i, bound in enumerate(BUCKETS):
+        if elapsed <= bound:
+            bucket = i
+            break
+
+    with stats['lock']:
+        stats['requests'] += 1
+        stats['errors'] += 0 if ok else 1
+        stats['histogram'][bucket] += 1
+        stats['min'] = elapsed if stats['min'] is None else min(stats['min'], elapsed)
+        stats['max'] = elapsed if stats['max'] is None else max(stats['max'], elapsed)
+        # reservoir sampling: every request so far is equally likely to be in the sample
+        if len(stats['sample']) < RESERVOIR:
+            stats['sample'].append(elapsed)
+        else:
+            slot = random.randrange(stats['requests'])
+            if slot < RESERVOIR:
+                stats['sample'][slot] = elapsed
+
+
+def report(stats, duration):
+    """Summarize endpoint measurements
+
+        :param stats: endpoint stats dict
+        :param duration: wall clock length of the load test in seconds
+        :return: dict of throughput, error rate, latency percentiles and histogram
+    """
+    labels = ["<=" + str(bound) for bound in BUCKETS] + [">" + str(BUCKETS[-1])]
+    requests = stats['requests']
+    latency = None
+    if requests:
+        # median and p95 are estimated from the sample, min and max are exact
+        latency = summarize(stats['sample'])
+        latency.update({'min': stats['min'], 'max': stats['max']})
+
+    return {'requests': requests,
+            'errors': stats['errors'],
+            'error rate': stats['errors'] / requests if requests else None,
+            'throughput (req/s)': requests / duration if duration else None,
+            'latency (ms)': latency,
+            'histogram (ms)': dict(zip(labels, stats['histogram']))
+            }
+
+
+def form_sign_in(run, pool, link, key):
+    """Load the page and sign in through its login form, in a browser unless probing over http
+
+        :return: True if sign in succeeded
+    """
+    btn_path, title = wi.login_form(key)
+
+    if run['probe'] == "http" and not any(product in key for product in hp.BROWSER_ONLY):
+        (sts, _), _ = hp.sign_in(hp.new_probe(), link, run['user'], run['passw'], title)
+        return sts == 'SUCCESS'
+
+    with dp.borrowed(pool) as driver:
+        try:
+            driver.get(link)
+            sts, _ = wi.log_in(driver, run['user'], run['passw'], link, btn_path, title)
+        except WebDriverException as e:
+            print("Virtual user error on " + link + ": " + str(e))
+            return False
+
+    return sts == 'SUCCESS'
+
+
+def atlas_sign_in(run, link):
+    """Sign in to ATLAS WebAPI over http
+
+        :return: True if sign in succeeded
+    """
+    resp = atlas.login(atlas.new_session(link, run['user'], run['passw']))
+
+    return resp['status'] == 200
+
+
+def virtual_user(run, pool, outputs, stats, delay, iterations, log=None):
+    """Wait for ramp up delay then repeat the sign in flow for every endpoint
+
+        :param run: run state for region being tested
+        :param pool: driver pool used for browser sign ins
+        :param outputs: list of urls and keys as dicts for endpoints under load
+        :param stats: dict of endpoint key to stats dict
+        :param delay: seconds to wait before starting
+        :param iterations: number of times to repeat the flow
+        :param log: optional result log each sign in is streamed to
+    """
+    time.sleep(delay)
+
+    for _ in range(iterations):
+        for output in outputs:
+            link = output["OutputValue"]
+            key = output["OutputKey"]
+
+            start = time.perf_counter()
+            if "ATLAS" in key:
+                ok = atlas_sign_in(run, link)
+            else:
+                ok = form_sign_in(run, pool, link, key)
+            elapsed = (time.perf_counter() - start) * 1000
+            record(stats[key], elapsed, ok)
+
+            if log is not None:
+                test = tob.new_test(key, 'load sign in')
+                test = tob.success(test, 'Sign in complete') if ok else tob.fail(test, 'Sign in failed')
+                test.elapsed = elapsed
+                rl.write(log, test)
+
+
+def run_load(run, outputs, pool, users, ramp, iterations, prefix):
+    """Drive concurrent virtual users against every endpoint and upload the report to S3
+
+        :param run: run state for region being tested
+        :param outputs: list of urls and keys as dicts for endpoints under load
+        :param pool: driver pool used for browser sign ins, growing up to one browser per user
+        :param users: number of concurrent virtual users
+        :param ramp: seconds over which virtual users are started
+        :param iterations: sign in flows per virtual user
+        :param prefix: S3 folder test results are uploaded to
+        :return: load test report dict
+    """
+    outputs = [output for output in outputs
+               if wi.login_form(output["OutputKey"]) is not None or "ATLAS" in output["OutputKey"]]
+    stats = {output["OutputKey"]: new_stats() for output in outputs}
+
+    # every sign in is streamed to the result bucket as it completes rather than held in memory
+    name = "load_output_" + run['region']
+    log = rl.new_log(name + ".jsonl", run['bucket'], prefix + "stream/" + history.run_id() + "/" + name + "-")
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, users)) as vus:
+            futures = [vus.submit(virtual_user, run, pool, outputs, stats, ramp * i / users, iterations, log)
+                       for i in range(users)]
+            for future in futures:
+                future.result()
+    finally:
+        streamed = rl.close(log)
+    duration = time.perf_counter() - start
+
+    result = {'users': users,
+              'ramp up (s)': ramp,
+              'iterations': iterations,
+              'duration (s)': duration,
+              'endpoints': {key: report(endpoint, duration) for key, endpoint in stats.items()},
+              'sign in records': streamed['records'],
+              'sign in log parts': streamed['parts']
+              }
+
+    if any(endpoint['errors'] for endpoint in stats.values()):
+        run['failure'] = True
+
+    filename = name + ".json"
+    with open(filename, "w+") as write_file:
+        json.dump({'Load Test': result}, write_file)
+    aws.upload_file(filename, run['bucket'], prefix + filename)
+
+    return result
@@ -0,0 +1,440 @@
+""" Versions:     python v. 3.x
+
+    In memory stand-ins for the AWS clients used by the test scripts (S3, SNS, Secrets Manager and CloudFormation),
+    for benchmarks and local runs without an AWS account. Calls are answered from memory after a simulated network
+    round trip, so the relative cost of requests, transfer size and connection reuse can be measured without the
+    noise of a real endpoint. install() makes aws_interact.get_client() return them.
+"""
+
+import base64
+import bisect
+import hashlib
+import io
+import threading
+import time
+import aws_interact as aws
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+
+def not_found(operation, key):
+    """Build the error S3 returns for a missing object
+
+        :param operation: name of operation called
+        :param key: object key requested
+        :return: ClientError
+    """
+    return ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'The specified key does not exist: ' + key}},
+                       operation)
+
+
+class LocalS3:
+    """S3 client answering from memory with simulated latency, per connection bandwidth and connection pool"""
+
+    def __init__(self, latency=0.02, bandwidth=None, setup=0.05, max_pool_connections=10):
+        """
+            :param latency: seconds of round trip added to every request
+            :param bandwidth: bytes per second sent over one connection, unlimited if None
+            :param setup: seconds taken to create a new client, see client()
+            :param max_pool_connections: requests in flight at once, as the client's connection pool
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.setup = setup
+        self.objects = {}
+        # noncurrent versions and delete markers of a versioned bucket, the current version of each key is in objects
+        self.versions = {}
+        # sorted (bucket, key, version id) of every version ever added, deleted entries are skipped when listing
+        self.index = None
+        self.lock = threading.Lock()
+        self.pool = threading.BoundedSemaphore(max_pool_connections)
+        self.calls = {}
+        self.bytes_sent = 0
+
+    def client(self):
+        """Simulate creating a new client against this store, paying the setup cost again
+
+            :return: this store
+        """
+        time.sleep(self.setup)
+        return self
+
+    def _request(self, operation, size=0):
+        with self.pool:
+            time.sleep(self.latency + (size / self.bandwidth if self.bandwidth else 0))
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            self.bytes_sent += size
+
+    def _store(self, bucket, key, body, extra=None, config=None):
+        threshold = getattr(config, 'multipart_threshold', None)
+        part_size = getattr(config, 'multipart_chunksize', None)
+
+        if threshold and len(body) >= threshold:
+            # multipart objects are sent part by part and tagged as S3 does: md5 of part digests plus part count
+            parts = [body[i:i + part_size] for i in range(0, len(body), part_size)]
+            for part in parts:
+                self._request('UploadPart', len(part))
+            digest = hashlib.md5(b''.join(hashlib.md5(part).digest() for part in parts)).hexdigest()
+            etag = '"' + digest + '-' + str(len(parts)) + '"'
+        else:
+            self._request('PutObject', len(body))
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+
+        with self.lock:
+            if (bucket, key) not in self.objects:
+                self.index = None
+            self.objects[(bucket, key)] = {'Body': body, 'ETag': etag, 'Extra': dict(extra or {})}
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        self._store(Bucket, Key, Body if isinstance(Body, bytes) else Body.read(), kwargs)
+        return {'ETag': self.objects[(Bucket, Key)]['ETag']}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None, Callback=None):
+        self._store(Bucket, Key, Fileobj.read(), ExtraArgs, Config)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None, Callback=None):
+        with open(Filename, 'rb') as f:
+            self.upload_fileobj(f, Bucket, Key, ExtraArgs, Config)
+
+    def head_object(self, Bucket, Key):
+        self._request('HeadObject')
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        obj = self.objects[(Bucket, Key)]
+        return dict(obj['Extra'], ETag=obj['ETag'], ContentLength=len(obj['Body']))
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            self._request('GetObject')
+            raise not_found('GetObject', Key)
+        obj = self.objects[(Bucket, Key)]
+        self._request('GetObject', len(obj['Body']))
+        return dict(obj['Extra'], ETag=obj['ETag'], ContentLength=len(obj['Body']), Body=io.BytesIO(obj['Body']))
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Config=None, Callback=None):
+        with open(Filename, 'wb') as f:
+            f.write(self.get_object(Bucket, Key)['Body'].read())
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, **kwargs):
+        self._request('ListObjectsV2')
+        with self.lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+
+        resp = {'KeyCount': len(page),
+                'IsTruncated': start + MaxKeys < len(keys),
+                'Contents': [{'Key': key,
+                              'ETag': self.objects[(Bucket, key)]['ETag'],
+                              'Size': len(self.objects[(Bucket, key)]['Body'])} for key in page]
+                }
+        if resp['IsTruncated']:
+            resp['NextContinuationToken'] = str(start + MaxKeys)
+        return resp
+
+    def seed(self, Bucket, keys, versions=0, delete_marker=False):
+        """Fill a bucket with empty objects without simulating requests, for benchmarks with many keys
+
+            :param Bucket: bucket name
+            :param keys: list of keys
+            :param versions: noncurrent versions added for each key, as a versioned bucket keeps
+            :param delete_marker: also add a delete marker for each key
+        """
+        with self.lock:
+            self.index = None
+            for key in keys:
+                self.objects[(Bucket, key)] = {'Body': b'', 'ETag': '"' + hashlib.md5(b'').hexdigest() + '"',
+                                               'Extra': {}}
+                for version in range(versions):
+                    self.versions[(Bucket, key, 'v' + format(version, '06d'))] = {'DeleteMarker': False}
+                if delete_marker:
+                    self.versions[(Bucket, key, 'marker')] = {'DeleteMarker': True}
+
+    def list_object_versions(self, Bucket, Prefix='', KeyMarker='', VersionIdMarker='', MaxKeys=1000, **kwargs):
+        self._request('ListObjectVersions')
+        with self.lock:
+            if self.index is None:
+                self.index = sorted([(bucket, key, 'null') for bucket, key in self.objects] +
+                                    list(self.versions))
+            index = self.index
+            if KeyMarker and VersionIdMarker:
+                start = bisect.bisect_right(index, (Bucket, KeyMarker, VersionIdMarker))
+            else:
+                # without a version marker listing starts after every version of the key marker
+                start = bisect.bisect_left(index, (Bucket, KeyMarker + '\0' if KeyMarker else Prefix, ''))
+
+            resp = {'Versions': [], 'DeleteMarkers': [], 'IsTruncated': False}
+            found = 0
+            for i in range(start, len(index)):
+                bucket, key, version = index[i]
+                if bucket != Bucket or not key.startswith(Prefix):
+                    break
+                if found == MaxKeys:
+                    resp.update(IsTruncated=True, NextKeyMarker=last[0], NextVersionIdMarker=last[1])
+                    break
+                if version == 'null' and (bucket, key) in self.objects:
+                    resp['Versions'].append({'Key': key, 'VersionId': version, 'IsLatest': True})
+                elif (bucket, key, version) in self.versions:
+                    entry = {'Key': key, 'VersionId': version, 'IsLatest': False}
+                    resp['DeleteMarkers' if self.versions[(bucket, key, version)]['DeleteMarker'] else
+                         'Versions'].append(entry)
+                else:
+                    continue
+                found += 1
+                last = (key, version)
+
+        return resp
+
+    def delete_object(self, Bucket, Key, VersionId=None):
+        self._request('DeleteObject')
+        with self.lock:
+            if VersionId in (None, 'null'):
+                self.objects.pop((Bucket, Key), None)
+            else:
+                self.versions.pop((Bucket, Key, VersionId), None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        if len(Delete['Objects']) > 1000:
+            raise ClientError({'Error': {'Code': 'MalformedXML', 'Message': 'More than 1000 keys in one request'}},
+                              'DeleteObjects')
+        self._request('DeleteObjects')
+        with self.lock:
+            for obj in Delete['Objects']:
+                if obj.get('VersionId') in (None, 'null'):
+                    self.objects.pop((Bucket, obj['Key']), None)
+                else:
+                    self.versions.pop((Bucket, obj['Key'], obj['VersionId']), None)
+
+        # deleting a missing key or version succeeds, as in S3
+        resp = {'Errors': []}
+        if not Delete.get('Quiet'):
+            resp['Deleted'] = [dict(obj) for obj in Delete['Objects']]
+        return resp
+
+    def get_paginator(self, operation):
+        if operation == 'list_object_versions':
+            return LocalPaginator(self.list_object_versions, {'NextKeyMarker': 'KeyMarker',
+                                                              'NextVersionIdMarker': 'VersionIdMarker'})
+        return LocalPaginator(getattr(self, operation))
+
+
+class LocalPaginator:
+    """Paginator over a local list operation, following continuation tokens or markers as boto3 does"""
+
+    def __init__(self, operation, tokens=None):
+        """
+            :param operation: list method
+            :param tokens: dict of response field to the request parameter it is passed back as
+        """
+        self.operation = operation
+        self.tokens = tokens or {'NextContinuationToken': 'ContinuationToken'}
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self.operation(**kwargs)
+            yield page
+            if not page.get('IsTruncated'):
+                return
+            for field, param in self.tokens.items():
+                kwargs[param] = page[field]
+
+
+class LocalSNS:
+    """SNS client keeping published messages in memory"""
+
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def publish(self, TopicArn, Message, Subject=None, **kwargs):
+        time.sleep(self.latency)
+        with self.lock:
+            self.messages.append({'TopicArn': TopicArn, 'Subject': Subject, 'Message': Message})
+            return {'MessageId': str(len(self.messages))}
+
+
+class LocalSecretsManager:
+    """Secrets Manager client answering from a dict of secret name to String or bytes value"""
+
+    def __init__(self, secrets=None, latency=0.02):
+        self.latency = latency
+        self.secrets = dict(secrets or {})
+        self.calls = 0
+
+    def _arn(self, name):
+        # real ARNs end in a random suffix, so a partial ARN without it also names the secret
+        return 'arn:aws:secretsmanager:local:000000000000:secret:' + name + '-AbCdEf'
+
+    def _find(self, secret_id):
+        for name in self.secrets:
+            arn = self._arn(name)
+            if secret_id in (name, arn) or arn.startswith(secret_id + '-'):
+                return name
+        return None
+
+    def _entry(self, name):
+        value = self.secrets[name]
+        entry = {'Name': name, 'ARN': self._arn(name)}
+        if isinstance(value, bytes):
+            entry['SecretBinary'] = base64.b64encode(value)
+        else:
+            entry['SecretString'] = value
+        return entry
+
+    def get_secret_value(self, SecretId):
+        time.sleep(self.latency)
+        self.calls += 1
+        name = self._find(SecretId)
+        if name is None:
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': SecretId + ' not found'}},
+                              'GetSecretValue')
+        return self._entry(name)
+
+    def batch_get_secret_value(self, SecretIdList, NextToken=None):
+        time.sleep(self.latency)
+        self.calls += 1
+        found = {secret_id: self._find(secret_id) for secret_id in SecretIdList}
+        names = [name for name in self.secrets if name in found.values()]
+        return {'SecretValues': [self._entry(name) for name in names],
+                'Errors': [{'SecretId': secret_id, 'ErrorCode': 'ResourceNotFoundException',
+                            'Message': secret_id + ' not found'}
+                           for secret_id, name in found.items() if name is None]
+                }
+
+
+class LocalCloudFormation:
+    """CloudFormation client describing stacks held in memory for every region, whose status changes over time"""
+
+    def __init__(self, latency=0.02, delete_seconds=0.0):
+        """
+            :param latency: seconds of round trip per request
+            :param delete_seconds: seconds a stack takes to delete
+        """
+        self.latency = latency
+        self.delete_seconds = delete_seconds
+        self.stacks = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def add_stack(self, region, name, outputs, project=None, parameters=None, status='CREATE_COMPLETE',
+                  parent=None, create_seconds=0.0):
+        """Deploy a stack
+
+            :param region: region deployed to
+            :param name: stack name
+            :param outputs: dict of output key to value
+            :param project: optional taskcat project the stack is tagged with
+            :param parameters: optional dict of parameter key to value
+            :param status: status the stack is left in once created, e.g. ROLLBACK_COMPLETE
+            :param parent: optional stack ID of parent, for nested stacks
+            :param create_seconds: seconds the stack stays in CREATE_IN_PROGRESS
+            :return: stack ID as String
+        """
+        now = time.monotonic()
+        stack_id = 'arn:aws:cloudformation:' + region + ':000000000000:stack/' + name + '/' + format(len(self.stacks))
+        stack = {'StackId': stack_id,
+                 'StackName': name,
+                 'CreationTime': datetime.now(timezone.utc),
+                 'Parameters': [{'ParameterKey': k, 'ParameterValue': v} for k, v in (parameters or {}).items()],
+                 'Outputs': [{'OutputKey': k, 'OutputValue': v} for k, v in outputs.items()],
+                 'Tags': [{'Key': 'taskcat-project-name', 'Value': project}] if project else []
+                 }
+        if parent:
+            stack['ParentId'] = parent
+        with self.lock:
+            self.stacks[stack_id] = {'region': region,
+                                     'stack': stack,
+                                     'changes': [(now, 'CREATE_IN_PROGRESS'), (now + create_seconds, status)]
+                                     }
+
+        return stack_id
+
+    def status(self, stack_id):
+        """
+            :param stack_id: stack ID
+            :return: status of stack now as String
+        """
+        now = time.monotonic()
+        with self.lock:
+            return [status for at, status in self.stacks[stack_id]['changes'] if at <= now][-1]
+
+    def in_region(self, region_name):
+        return LocalCloudFormationRegion(self, region_name)
+
+
+class LocalCloudFormationRegion:
+    """Client of LocalCloudFormation for one region"""
+
+    def __init__(self, cloudformation, region):
+        self.cloudformation = cloudformation
+        self.region = region
+
+    def _find(self, StackName):
+        cfn = self.cloudformation
+        for stack_id, entry in cfn.stacks.items():
+            if entry['region'] == self.region and StackName in (stack_id, entry['stack']['StackName']):
+                return stack_id
+        raise ClientError({'Error': {'Code': 'ValidationError',
+                                     'Message': 'Stack with id ' + StackName + ' does not exist'}}, 'DescribeStacks')
+
+    def describe_stacks(self, StackName=None, NextToken=None):
+        cfn = self.cloudformation
+        time.sleep(cfn.latency)
+        with cfn.lock:
+            cfn.calls += 1
+            ids = [self._find(StackName)] if StackName else [i for i, e in cfn.stacks.items()
+                                                             if e['region'] == self.region]
+        stacks = []
+        for stack_id in ids:
+            status = cfn.status(stack_id)
+            stack = dict(cfn.stacks[stack_id]['stack'], StackStatus=status)
+            # outputs are only set once a stack is created, and deleted stacks are only described by ID
+            if not status.endswith('_COMPLETE') or status.startswith(('DELETE', 'ROLLBACK')):
+                stack.pop('Outputs')
+            if StackName or status != 'DELETE_COMPLETE':
+                stacks.append(stack)
+        return {'Stacks': stacks}
+
+    def delete_stack(self, StackName):
+        cfn = self.cloudformation
+        time.sleep(cfn.latency)
+        now = time.monotonic()
+        with cfn.lock:
+            cfn.calls += 1
+            changes = cfn.stacks[self._find(StackName)]['changes']
+            changes[:] = [c for c in changes if c[0] <= now] + [(now, 'DELETE_IN_PROGRESS'),
+                                                                  (now + cfn.delete_seconds, 'DELETE_COMPLETE')]
+        return {}
+
+    def get_paginator(self, operation):
+        return LocalPaginator(getattr(self, operation), {'NextToken': 'NextToken'})
+
+
+def install(s3=None, sns=None, secrets=None, cloudformation=None):
+    """Route aws_interact clients to stand-ins, for every region
+
+        :param s3: optional LocalS3 [default: new LocalS3 without latency]
+        :param sns: optional LocalSNS [default: new LocalSNS without latency]
+        :param secrets: optional LocalSecretsManager [default: new, empty LocalSecretsManager without latency]
+        :param cloudformation: optional LocalCloudFormation [default: new LocalCloudFormation without stacks]
+        :return: dict of service name to stand-in
+    """
+    clients = {'s3': s3 or LocalS3(latency=0, setup=0),
+               'sns': sns or LocalSNS(latency=0),
+               'secretsmanager': secrets or LocalSecretsManager(latency=0),
+               'cloudformation': cloudformation or LocalCloudFormation(latency=0)
+               }
+
+    def factory(service, region_name=None):
+        if service == 'cloudformation':
+            return clients[service].in_region(region_name)
+        return clients[service]
+
+    with aws.CLIENTS_LOCK:
+        aws.CLIENTS.clear()
+        aws.CLIENT_FACTORY = factory
+
+    return clients
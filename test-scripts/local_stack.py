@@ -0,0 +1,313 @@
+""" Versions:     python v. 3.x
+
+    Local stand-in for a deployed OHDSI or REDCap stack, used by bench.py and for running tests.py offline.
+    One HTTP server mimics the RStudio, Jupyter and REDCap sign in pages and the ATLAS page and WebAPI (sign in,
+    cohort definitions, generation and sources) closely enough for the test scripts, with configurable latency,
+    failure rate and start up delay. Products are told apart by the first label of the endpoint in the url path,
+    as built by tests.py -url-template, e.g. http://127.0.0.1:8000/rstudio.<endpoint>/<region>.
+
+    usage: python3 local_stack.py -port=<port> -latency=<ms> -jitter=<ms> -fail-rate=<0-1> -ready-after=<s>
+           then: python3 tests.py <endpoint> <region> <user> <passw> <bucket> -url-template=<printed template>
+"""
+
+import argparse
+import base64
+import html
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# sign in page title, submit button and title once signed in, as expected by web_interact.LOGIN_FORMS
+PRODUCTS = {'RStudio': ("RStudio Sign In", '<button type="submit">Sign In</button>', "RStudio"),
+            'Jupyter': ("Jupyter Sign In", '<input type="submit" id="login_submit" value="Sign In">', "JupyterLab"),
+            'REDCap': ("REDCap Sign In", '<button id="login_btn">Log In</button>', "REDCap"),
+            'ATLAS': ("ATLAS", '', "ATLAS")
+            }
+# CSRF token field of each login form, checked against the cookie of the same name. RStudio's page leaves the field
+# empty for script to copy from the cookie
+CSRF_FIELDS = {'RStudio': 'rs-csrf-token', 'Jupyter': '_xsrf', 'REDCap': 'redcap_csrf_token'}
+LOGIN_PAGE = ('<html><head><title>{title}</title></head><body>{error}'
+              '<form method="post" action="{base}/login">'
+              '<input name="{csrf}" type="hidden" value="{token}">'
+              '<input name="username" type="text"><input name="password" type="password">{button}'
+              '</form>{script}</body></html>')
+# copies the CSRF cookie into the empty token field on submit, as RStudio's sign in page does
+COPY_TOKEN = ('<script>document.forms[0].onsubmit = function () {{ var m = document.cookie.match(/{csrf}=([^;]*)/); '
+              'document.forms[0].elements["{csrf}"].value = m ? m[1] : ""; }};</script>')
+PAGE = '<html><head><title>{title}</title></head><body><h1>{title}</h1></body></html>'
+
+
+def new_stack(user='user', passw='password', latency=0.0, jitter=0.0, fail_rate=0.0, ready_after=0.0,
+              bare='ATLAS', generate_seconds=2.0, token_ttl=600):
+    """Create the configuration and state of a local stack
+
+        :param user: accepted username
+        :param passw: accepted password
+        :param latency: seconds added to every response
+        :param jitter: max random seconds added on top of latency
+        :param fail_rate: fraction of requests answered with 503
+        :param ready_after: seconds after start during which every request is answered with 503
+        :param bare: product served at an endpoint without a product label, "ATLAS" or "REDCap"
+        :param generate_seconds: seconds a cohort generation takes
+        :param token_ttl: seconds an ATLAS bearer token is valid
+        :return: stack dict
+    """
+    stack = {'user': user,
+             'passw': passw,
+             'latency': latency,
+             'jitter': jitter,
+             'fail rate': fail_rate,
+             'ready after': ready_after,
+             'bare': bare,
+             'generate seconds': generate_seconds,
+             'token ttl': token_ttl,
+             'started': time.monotonic(),
+             'lock': threading.Lock(),
+             'sessions': set(),
+             'tokens': {},
+             'cohorts': {},
+             'generations': {},
+             'next id': 1,
+             'requests': 0
+             }
+
+    return stack
+
+
+def start(stack, port=0):
+    """Serve a stack in a background thread
+
+        :param stack: stack dict
+        :param port: port to listen on, any free port if 0
+        :return: server, stopped with server.shutdown()
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StackHandler)
+    server.daemon_threads = True
+    server.stack = stack
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def url_template(server):
+    """Url template for tests.py -url-template that reaches products on a server
+
+        :param server: server returned by start()
+        :return: template String with {endpoint} and {region} fields
+    """
+    return "http://127.0.0.1:" + str(server.server_address[1]) + "/{endpoint}/{region}"
+
+
+def new_token(stack):
+    """Issue a JWT shaped bearer token with an expiry
+
+        :param stack: stack dict
+        :return: token String
+    """
+    expires = time.time() + stack['token ttl']
+    claims = base64.urlsafe_b64encode(json.dumps({'sub': stack['user'], 'exp': expires}).encode('utf-8'))
+    token = "local." + claims.decode('ascii').rstrip('=') + "." + format(random.getrandbits(64), '016x')
+    with stack['lock']:
+        stack['tokens'][token] = expires
+
+    return token
+
+
+class StackHandler(BaseHTTPRequestHandler):
+    """Routes requests to the product named by the endpoint in the path: /<endpoint>/<region>/<rest>"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b'', content_type='text/html', headers=()):
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self, method):
+        stack = self.server.stack
+        with stack['lock']:
+            stack['requests'] += 1
+
+        time.sleep(stack['latency'] + random.uniform(0, stack['jitter']))
+        if time.monotonic() - stack['started'] < stack['ready after'] or random.random() < stack['fail rate']:
+            self.send(503, "Service Unavailable")
+            return
+
+        parts = self.path.split('?')[0].split('/')
+        if len(parts) < 3:
+            self.send(404, "Not Found")
+            return
+        base = "/".join(parts[:3])
+        rest = "/" + "/".join(parts[3:]) if len(parts) > 3 else "/"
+        label = parts[1].split('.')[0].lower()
+        product = {'rstudio': 'RStudio', 'jupyter': 'Jupyter'}.get(label, stack['bare'])
+
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if product == 'ATLAS' and rest.startswith('/WebAPI/'):
+            self.webapi(stack, method, base, rest[len('/WebAPI'):], body)
+        else:
+            self.page(stack, product, method, base, rest, body)
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_POST(self):
+        self.route('POST')
+
+    def do_DELETE(self):
+        self.route('DELETE')
+
+    def page(self, stack, product, method, base, rest, body):
+        home = PRODUCTS[product][2]
+
+        if product == 'ATLAS' or (rest == '/home' and self.signed_in(stack)):
+            self.send(200, PAGE.format(title=home))
+        elif method == 'POST' and rest == '/login':
+            form = parse_qs(body.decode('utf-8'))
+            csrf = CSRF_FIELDS[product]
+            if not form.get(csrf) or form[csrf] != [self.cookie(csrf)]:
+                self.send(403, "Forbidden, CSRF token missing or incorrect")
+            elif form.get('username') == [stack['user']] and form.get('password') == [stack['passw']]:
+                session = format(random.getrandbits(64), '016x')
+                with stack['lock']:
+                    stack['sessions'].add(session)
+                self.send(302, headers=[('Location', base + '/home'), ('Set-Cookie', 'session=' + session +
+                                                                        '; Path=/')])
+            else:
+                self.login_page(product, base, "<p>Invalid user or password</p>")
+        else:
+            self.login_page(product, base, "")
+
+    def login_page(self, product, base, error):
+        title, button, _ = PRODUCTS[product]
+        csrf = CSRF_FIELDS[product]
+        token = self.cookie(csrf) or format(random.getrandbits(64), '016x')
+        script = COPY_TOKEN.format(csrf=csrf) if product == 'RStudio' else ''
+        page = LOGIN_PAGE.format(title=title, error=error, base=html.escape(base), button=button, csrf=csrf,
+                                 token='' if product == 'RStudio' else token, script=script)
+        self.send(200, page, headers=[('Set-Cookie', csrf + '=' + token + '; Path=/')])
+
+    def cookie(self, name):
+        for c in (self.headers.get('Cookie') or '').split(';'):
+            if c.strip().startswith(name + '='):
+                return c.strip()[len(name) + 1:]
+        return None
+
+    def signed_in(self, stack):
+        return self.cookie('session') in stack['sessions']
+
+    def authorized(self, stack):
+        token = (self.headers.get('Authorization') or '')[len('Bearer '):]
+        return stack['tokens'].get(token, 0) > time.time()
+
+    def webapi(self, stack, method, base, path, body):
+        if path == '/user/login/db' and method == 'POST':
+            form = parse_qs(body.decode('utf-8'))
+            if form.get('login') == [stack['user']] and form.get('password') == [stack['passw']]:
+                self.send(200, '{}', 'application/json', [('Bearer', new_token(stack)),
+                                                          ('Set-Cookie', 'JSESSIONID=' + format(
+                                                              random.getrandbits(64), '016x') + '; Path=/')])
+            else:
+                self.send(401, '{}', 'application/json')
+            return
+
+        if not self.authorized(stack):
+            self.send(401, '{}', 'application/json')
+            return
+
+        # each endpoint and region is a separate deployment with its own cohort definitions
+        parts = [part for part in path.split('/') if part]
+        with stack['lock']:
+            cohorts = stack['cohorts'].setdefault(base, {})
+        if parts == ['source', 'sources']:
+            sources = [{'sourceId': 1, 'sourceKey': 'LOCAL', 'sourceName': 'Local CDM',
+                        'daimons': [{'daimonType': 'CDM'}, {'daimonType': 'Results'}]}]
+            self.send(200, json.dumps(sources), 'application/json')
+        elif parts == ['cohortdefinition'] and method == 'POST':
+            cohort = json.loads(body.decode('utf-8'))
+            with stack['lock']:
+                if any(c['name'] == cohort.get('name') for c in cohorts.values()):
+                    self.send(409, '{}', 'application/json')
+                    return
+                cohort['id'] = stack['next id']
+                stack['next id'] += 1
+                cohorts[cohort['id']] = cohort
+            self.send(200, json.dumps(cohort), 'application/json')
+        elif parts == ['cohortdefinition']:
+            with stack['lock']:
+                listing = [{'id': c['id'], 'name': c['name']} for c in cohorts.values()]
+            self.send(200, json.dumps(listing), 'application/json')
+        elif len(parts) >= 2 and parts[0] == 'cohortdefinition' and parts[1].isdigit():
+            self.cohort(stack, cohorts, method, int(parts[1]), parts[2:])
+        else:
+            self.send(404, '{}', 'application/json')
+
+    def cohort(self, stack, cohorts, method, cohort_id, parts):
+        with stack['lock']:
+            if cohort_id not in cohorts:
+                self.send(404, '{}', 'application/json')
+                return
+            if method == 'DELETE':
+                del cohorts[cohort_id]
+                stack['generations'].pop(cohort_id, None)
+                self.send(204)
+            elif parts[:1] == ['generate']:
+                stack['generations'][cohort_id] = time.monotonic()
+                self.send(200, json.dumps({'status': 'STARTED'}), 'application/json')
+            elif parts == ['info']:
+                started = stack['generations'].get(cohort_id)
+                if started is None:
+                    info = []
+                else:
+                    done = time.monotonic() - started >= stack['generate seconds']
+                    info = [{'id': {'cohortDefinitionId': cohort_id, 'sourceId': 1},
+                             'status': 'COMPLETE' if done else 'RUNNING',
+                             'isValid': done}]
+                self.send(200, json.dumps(info), 'application/json')
+            else:
+                self.send(200, json.dumps(cohorts[cohort_id]), 'application/json')
+
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-port", type=int, help="port to listen on (int) [default: 8000]", default=8000)
+    parser.add_argument("-user", type=str, help="accepted username (str) [default: user]", default="user")
+    parser.add_argument("-passw", type=str, help="accepted password (str) [default: password]", default="password")
+    parser.add_argument("-latency", type=float, help="ms added to every response (float) [default: 0]", default=0)
+    parser.add_argument("-jitter", type=float, help="max random ms added on top of latency (float) [default: 0]",
+                        default=0)
+    parser.add_argument("-fail-rate", type=float, help="fraction of requests answered with 503 (float) [default: 0]",
+                        default=0)
+    parser.add_argument("-ready-after", type=float, help="seconds after start every request is answered with 503 "
+                        "(float) [default: 0]", default=0)
+    parser.add_argument("-bare", type=str, help="product at an endpoint without a product label (str) from set "
+                        "{\"ATLAS\", \"REDCap\"} [default: ATLAS]", default="ATLAS")
+    parser.add_argument("-generate-seconds", type=float, help="seconds a cohort generation takes (float) "
+                        "[default: 2]", default=2)
+    args = parser.parse_args()
+
+    stack = new_stack(args.user, args.passw, args.latency / 1000, args.jitter / 1000, args.fail_rate,
+                      args.ready_after, args.bare, args.generate_seconds)
+    server = start(stack, args.port)
+    print("Serving local stack, run tests.py with -url-template=" + url_template(server))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
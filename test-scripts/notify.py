@@ -0,0 +1,203 @@
+""" Versions:     python v. 3.x
+
+    Failure notifications for a whole pipeline run, used by get_test_results.py.
+    Failures from every region are grouped by product and failure message and sent as one summary per topic, split
+    into batches only when the summary exceeds the SNS message size limit. Tests that passed only on retry are
+    reported alongside the failures, so a flaky sub-test is seen before it fails outright. A failure that is
+    unchanged since the previous run is suppressed for a dedup window so a region that stays down does not re-alert
+    every week.
+"""
+
+import hashlib
+import json
+import time
+import aws_interact as aws
+
+# SNS messages are limited to 256 KB, leave room for the batch header
+MAX_MESSAGE_BYTES = 250000
+SUBJECT = 'Cloudformation Testing Pipeline Internal Test Failure'
+RETRIED = 'Passed only on retry'
+
+
+def retried(test):
+    """
+        :param test: test dict
+        :return: True if the test succeeded, but only after a failed attempt
+    """
+    return test["status"] == "SUCCESS" and test.get("attempts", 1) > 1
+
+
+def collect_failures(results):
+    """Gather every failed test across all regions, and every test that passed only on retry
+
+        Tests passing on retry are reported under their own message, so flakiness is seen before it becomes a failure.
+
+        :param results: dict of region to (result file path, list of test dicts)
+        :return: list of failure dicts
+    """
+    failures = []
+    for region, (path, tests) in results.items():
+        for test in tests:
+            if test["status"] != "SUCCESS" or retried(test):
+                failures.append({'region': region,
+                                 'tag': test["tag"],
+                                 'test': test["test"],
+                                 'message': RETRIED if retried(test) else test["message"],
+                                 'attempts': test.get("attempts", 1),
+                                 'extra': test["extra"]
+                                 })
+
+    return failures
+
+
+def group_failures(failures):
+    """Group failures sharing the same product and failure message
+
+        :param failures: list of failure dicts
+        :return: dict of (tag, message) to list of failure dicts
+    """
+    groups = {}
+    for failure in failures:
+        groups.setdefault((failure['tag'], failure['message']), []).append(failure)
+
+    return groups
+
+
+def fingerprint(key, failures):
+    """Identify a failure group so an unchanged failure can be recognized in the next run
+
+        :param key: (tag, message) tuple
+        :param failures: failures in group
+        :return: hex digest as String
+    """
+    where = sorted(failure['region'] + "/" + failure['test'] for failure in failures)
+    return hashlib.sha1(json.dumps([key, where]).encode('utf-8')).hexdigest()
+
+
+def dedup(groups, state, window, now=None):
+    """Drop failure groups already notified within the dedup window in the previous run
+
+        :param groups: dict of (tag, message) to list of failure dicts
+        :param state: dict of fingerprint to time first notified, from the previous run
+        :param window: seconds an unchanged failure stays suppressed
+        :param now: current time in seconds since the epoch
+        :return: groups still to be sent and the state to store for the next run
+    """
+    now = time.time() if now is None else now
+    send = {}
+    new_state = {}
+
+    # only failures seen in this run are kept, so a failure that clears and then recurs alerts again
+    for key, failures in groups.items():
+        fp = fingerprint(key, failures)
+        notified = state.get(fp)
+        if notified is not None and now - notified < window:
+            new_state[fp] = notified
+        else:
+            new_state[fp] = now
+            send[key] = failures
+
+    return send, new_state
+
+
+def summarize(groups):
+    """Write a summary section for each failure group
+
+        :param groups: dict of (tag, message) to list of failure dicts
+        :return: list of section Strings
+    """
+    sections = []
+    for (tag, message), failures in sorted(groups.items()):
+        where = ", ".join(failure['region'] + " (" + failure['test'] +
+                          (", " + str(failure['attempts']) + " attempts" if failure['attempts'] > 1 else "") + ")"
+                          for failure in failures)
+        sections.append(tag + ": " + message + "\n Regions: " + where +
+                        "\n Extra information: \n" + json.dumps(failures[0]['extra']) + "\n")
+
+    return sections
+
+
+def batch(sections, limit=MAX_MESSAGE_BYTES):
+    """Pack summary sections into as few messages as fit under the size limit
+
+        :param sections: list of section Strings
+        :param limit: max message size in bytes
+        :return: list of message Strings
+    """
+    messages = []
+    current = ""
+    for section in sections:
+        # each section is followed by a newline, which counts towards the limit too
+        section = section.encode('utf-8')[:limit - 1].decode('utf-8', 'ignore') + "\n"
+        if current and len((current + section).encode('utf-8')) > limit:
+            messages.append(current)
+            current = ""
+        current += section
+    if current:
+        messages.append(current)
+
+    return messages
+
+
+def sns_publisher(topic_arn):
+    """Create publisher sending messages to an SNS topic through a single client
+
+        :param topic_arn: ARN of SNS topic to publish to
+        :return: publish function taking subject and message
+    """
+    client = aws.get_client('sns')
+
+    def publish(subject, message):
+        client.publish(TopicArn=topic_arn, Message=message, Subject=subject)
+
+    return publish
+
+
+def stub_publisher(path):
+    """Create publisher appending messages to a local JSON lines file instead of sending them
+
+        :param path: file to append messages to
+        :return: publish function taking subject and message
+    """
+    def publish(subject, message):
+        with open(path, 'a') as f:
+            f.write(json.dumps({'subject': subject, 'message': message}) + "\n")
+
+    return publish
+
+
+def notify_run(results, publish, state, window, dashboard, interval=1.0):
+    """Send one deduplicated failure summary for the whole run
+
+        :param results: dict of region to (result file path, list of test dicts)
+        :param publish: publish function taking subject and message
+        :param state: dict of fingerprint to time first notified, from the previous run
+        :param window: seconds an unchanged failure stays suppressed
+        :param dashboard: url to the results dashboard
+        :param interval: min seconds between published messages
+        :return: state to store for the next run
+    """
+    failures = collect_failures(results)
+    groups, new_state = dedup(group_failures(failures), state, window)
+
+    flaky = sum(1 for failure in failures if failure['message'] == RETRIED)
+    print(str(len(failures) - flaky) + " FAILURES found, " + str(flaky) + " tests passed only on retry, " +
+          str(len(groups)) + " new failure groups to notify")
+    if not groups:
+        return new_state
+
+    sent = [failure for key in groups for failure in groups[key]]
+    regions = set(failure['region'] for failure in sent)
+    passed = sum(1 for failure in sent if failure['message'] == RETRIED)
+    messages = batch(summarize(groups))
+    for i, message in enumerate(messages):
+        subject = SUBJECT
+        if len(messages) > 1:
+            subject += " (" + str(i + 1) + "/" + str(len(messages)) + ")"
+        if i > 0:
+            time.sleep(interval)
+        publish(subject, str(len(sent) - passed) + " failed tests and " + str(passed) + " tests passed only on retry "
+                "in " + str(len(regions)) + " regions\n\n" + message +
+                "\n Dashboard: \n " + dashboard)
+
+    return new_state
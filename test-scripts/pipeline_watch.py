@@ -0,0 +1,226 @@
+""" Versions:     python v. 3.x
+
+    Pipelined deploy, test and clean up, used by buildspec.yml in place of running taskcat, tests.py and the clean up
+    one after another. taskcat deploys every region in the background while the stack of each region is watched: a
+    region is tested (as tests.py -discover tests it) as soon as its stack reaches CREATE_COMPLETE, overlapping with
+    the regions still deploying, and its stack is deleted as soon as its tests pass. Stacks that fail to deploy or
+    fail their tests are kept for investigation. The build then takes about as long as its slowest region, rather
+    than the slowest deployment plus the slowest test plus the slowest deletion.
+
+    usage: python3 pipeline_watch.py <endpoint> <region> <username> <password> <bucket> -taskcat=<command>
+                                     -poll=<s> -deploy-timeout=<s> -keep   [any tests.py option]
+
+    Stacks deleted here are deleted while taskcat may still be reporting on other regions, so its own report can show
+    them as deleted; the verdict for each region is the one printed here.
+"""
+
+import json
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import aws_interact as aws
+import discovery
+import driver_pool as dp
+import tests
+import tracing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# statuses a stack being created can end in without being usable, including a rollback still in progress
+FAILED = ('CREATE_FAILED', 'ROLLBACK_IN_PROGRESS', 'ROLLBACK_FAILED', 'ROLLBACK_COMPLETE', 'DELETE_IN_PROGRESS',
+          'DELETE_FAILED', 'DELETE_COMPLETE')
+
+# stacks created this long before the watch started still count, allowing for clock skew with CloudFormation
+CLOCK_SKEW = timedelta(minutes=1)
+
+
+def new_watch(project, command=None, poll=30, deploy_timeout=7200, keep=False):
+    """Start the deployment, if a command is given, and the state of watching it
+
+        :param project: taskcat project name as String
+        :param command: optional deployment command, e.g. "taskcat test run --no-delete"
+        :param poll: seconds between stack status checks
+        :param deploy_timeout: max seconds to wait for a stack to be created
+        :param keep: keep the stacks of regions that pass instead of deleting them
+        :return: watch dict
+    """
+    watch = {'project': project,
+             'since': datetime.now(timezone.utc) - CLOCK_SKEW if command else None,
+             'process': subprocess.Popen(shlex.split(command)) if command else None,
+             'poll': poll,
+             'deploy timeout': deploy_timeout,
+             'keep': keep
+             }
+
+    return watch
+
+
+def deploying(watch):
+    """
+        :param watch: watch dict
+        :return: True while the deployment command is still running
+    """
+    return watch['process'] is not None and watch['process'].poll() is None
+
+
+def wait_for_stack(watch, region, endpoint=None):
+    """Wait for the stack deployed to a region to be created or to fail
+
+        :param watch: watch dict
+        :param region: region deployed to as String
+        :param endpoint: optional EBEndpoint parameter of the stack, when the region holds several
+        :return: stack dict, None if no stack was deployed
+    """
+    timeout = time.monotonic() + watch['deploy timeout']
+    while True:
+        stacks = [s for s in discovery.project_stacks(region, watch['project'])
+                  if watch['since'] is None or s['CreationTime'] >= watch['since']]
+        stack = discovery.select_stack(stacks, endpoint)
+
+        if stack is not None and (stack['StackStatus'] in discovery.COMPLETE or stack['StackStatus'] in FAILED):
+            return stack
+        # the deployment command only exits once every stack it started is created or has failed
+        if stack is None and watch['process'] is not None and not deploying(watch):
+            return None
+        if time.monotonic() >= timeout:
+            return stack
+
+        time.sleep(watch['poll'])
+
+
+def delete_stack(watch, region, stack_id):
+    """Delete a stack and wait until it is gone
+
+        :param watch: watch dict
+        :param region: region stack is deployed in as String
+        :param stack_id: stack ID as String
+        :return: final stack status as String
+    """
+    client = aws.get_client('cloudformation', region)
+    client.delete_stack(StackName=stack_id)
+    while True:
+        status = client.describe_stacks(StackName=stack_id)['Stacks'][0]['StackStatus']
+        if status in ('DELETE_COMPLETE', 'DELETE_FAILED'):
+            return status
+        time.sleep(watch['poll'])
+
+
+def region_flow(watch, region, test, endpoint=None):
+    """Deploy, test and clean up one region, each step starting as soon as the region is ready for it
+
+        :param watch: watch dict
+        :param region: region as String
+        :param test: callable taking the region and its stack, returning True if the tests passed
+        :param endpoint: optional EBEndpoint parameter of the stack, when the region holds several
+        :return: report dict for region
+    """
+    report = {'status': None, 'stack': None}
+
+    start = time.monotonic()
+    with tracing.span("deploy " + region, 'deploy'):
+        stack = wait_for_stack(watch, region, endpoint)
+    report['deploy (s)'] = round(time.monotonic() - start, 1)
+
+    if stack is None:
+        report['status'] = 'NOT DEPLOYED'
+        return report
+    report['stack'] = stack['StackName']
+    if stack['StackStatus'] not in discovery.COMPLETE:
+        report['status'] = 'DEPLOY FAILED (' + stack['StackStatus'] + ')'
+        return report
+
+    start = time.monotonic()
+    try:
+        passed = test(region, stack)
+    except Exception as e:
+        print("ERROR occurred testing " + region + ": ")
+        print(e)
+        passed = False
+    report['test (s)'] = round(time.monotonic() - start, 1)
+
+    if not passed:
+        report['status'] = 'TEST FAILED'
+        return report
+    if watch['keep']:
+        report['status'] = 'PASSED'
+        return report
+
+    start = time.monotonic()
+    with tracing.span("delete " + region, 'deploy'):
+        status = delete_stack(watch, region, stack['StackId'])
+    report['delete (s)'] = round(time.monotonic() - start, 1)
+    report['status'] = 'PASSED' if status == 'DELETE_COMPLETE' else 'DELETE FAILED (' + status + ')'
+
+    return report
+
+
+def watch_regions(watch, regions, test, workers=4, endpoints=None):
+    """Follow every region through deployment, testing and clean up at once
+
+        :param watch: watch dict
+        :param regions: list of regions as Strings
+        :param test: callable taking a region and its stack, returning True if the tests passed
+        :param workers: max regions tested at once, deployments and deletions are not limited
+        :param endpoints: optional dict of region to expected EBEndpoint parameter
+        :return: dict of region to report dict
+    """
+    endpoints = endpoints or {}
+    testers = threading.Semaphore(max(1, workers))
+
+    def limited(region, stack):
+        with testers:
+            return test(region, stack)
+
+    # one thread per region, as most of each region's time is spent waiting on CloudFormation
+    with ThreadPoolExecutor(max_workers=max(1, len(regions))) as pool:
+        futures = {region: pool.submit(region_flow, watch, region, limited, endpoints.get(region))
+                   for region in regions}
+        return {region: future.result() for region, future in futures.items()}
+
+
+def main(args):
+    parser = tests.build_parser()
+    parser.add_argument("-taskcat", type=str, help="command deploying the stacks, run in the background (str), "
+                        "empty to watch stacks deployed by another process [default: taskcat test run --no-delete]",
+                        default="taskcat test run --no-delete")
+    parser.add_argument("-poll", type=float, help="seconds between stack status checks (float) [default: 30]",
+                        default=30)
+    parser.add_argument("-deploy-timeout", type=int, help="max seconds to wait for a stack to be created (int) "
+                        "[default: 7200]", default=7200)
+    parser.add_argument("-keep", action="store_true", help="keep the stacks of regions that pass instead of "
+                        "deleting them")
+    args = parser.parse_args()
+    sampler = tests.prepare(args)
+
+    regions = tests.parse_regions(args.region, args.config)
+    endpoints = tests.scenario_endpoints(args.config)
+    workers = max(1, min(args.workers, len(regions)))
+    drivers = tests.start_browsers(args, workers, sampler)
+
+    def test(region, stack):
+        deadline = time.monotonic() + args.wait_for_ready if args.wait_for_ready > 0 else None
+        run, output = tests.run_region(args, region, drivers, deadline, endpoints.get(region), stack)
+        print(region + ": " + str(output))
+        return not run['failure']
+
+    try:
+        watch = new_watch(args.project or tests.project_name(args.config), args.taskcat, args.poll,
+                          args.deploy_timeout, args.keep)
+        report = watch_regions(watch, regions, test, workers, endpoints)
+
+        # the deployment's own report is written once it exits
+        if watch['process'] is not None:
+            print("Deployment command exited with " + str(watch['process'].wait()))
+    finally:
+        dp.close_pool(drivers)
+    tests.finish(args, sampler)
+    print(json.dumps(report, indent=2))
+
+    if any(entry['status'] != 'PASSED' for entry in report.values()):
+        exit(-1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,203 @@
+""" Versions:     python v. 3.x
+
+    Benchmark of the cleanupBucketOnDeleteLambda bucket purge in Pipeline_Template.yml against the local S3 stand-in.
+    The Lambda source is read from the template and run in this process with its S3 client replaced by LocalS3, so
+    the code measured is the code deployed. A bucket is seeded with many keys (and optionally versions and delete
+    markers), then the Delete request is handled with a simulated time limit, following re-invocations until the
+    CloudFormation response is sent. The one request per key purge it replaced is timed on a sample for comparison.
+
+    usage: python3 purge_bench.py -keys=<n> -versions=<n> -markers -latency=<ms> -timeout=<s> -margin=<s>
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import yaml
+import local_aws
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Pipeline_Template.yml')
+FUNCTION = 'cleanupBucketOnDeleteLambda'
+
+
+class TemplateLoader(yaml.SafeLoader):
+    """Loads CloudFormation templates, reading intrinsic functions such as !Sub and !Ref as plain values"""
+
+
+def intrinsic(loader, suffix, node):
+    if isinstance(node, yaml.ScalarNode):
+        return loader.construct_scalar(node)
+    if isinstance(node, yaml.SequenceNode):
+        return loader.construct_sequence(node)
+    return loader.construct_mapping(node)
+
+
+TemplateLoader.add_multi_constructor('!', intrinsic)
+
+
+def lambda_source(template=TEMPLATE, function=FUNCTION):
+    """Read the inline source of a Lambda function in a template
+
+        :param template: CloudFormation template file
+        :param function: logical id of function
+        :return: source code as String
+    """
+    with open(template) as f:
+        doc = yaml.load(f, Loader=TemplateLoader)
+
+    return doc['Resources'][function]['Properties']['Code']['ZipFile']
+
+
+class LocalContext:
+    """Lambda context with a simulated time limit"""
+
+    def __init__(self, timeout):
+        self.deadline = time.monotonic() + timeout
+        self.function_name = FUNCTION
+        self.log_stream_name = 'local/' + format(id(self), 'x')
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+
+class LocalLambda:
+    """Lambda client queueing asynchronous invocations for the benchmark to run"""
+
+    def __init__(self):
+        self.queue = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.queue.append(json.loads(Payload))
+        return {'StatusCode': 202}
+
+
+class ResponseHandler(BaseHTTPRequestHandler):
+    """Receives the response the custom resource sends to CloudFormation"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.responses.append(json.loads(body.decode('utf-8')))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def load_function(s3, invoker):
+    """Run the Lambda source with local clients
+
+        :param s3: LocalS3 the function deletes from
+        :param invoker: LocalLambda receiving re-invocations
+        :return: module namespace of function as dict
+    """
+    # clients are created at import as in Lambda, so they need a region before being replaced
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    namespace = {'__name__': 'index'}
+    exec(compile(lambda_source(), TEMPLATE + ':' + FUNCTION, 'exec'), namespace)
+    namespace['s3'] = s3
+    namespace['lambda_client'] = invoker
+
+    return namespace
+
+
+def purge(s3, bucket, timeout, margin):
+    """Handle a Delete request for a bucket, following re-invocations until CloudFormation is answered
+
+        :param s3: LocalS3 holding bucket
+        :param bucket: bucket name
+        :param timeout: seconds each invocation may run
+        :param margin: seconds left when an invocation hands over
+        :return: report dict
+    """
+    invoker = LocalLambda()
+    function = load_function(s3, invoker)
+    function['MARGIN'] = margin
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ResponseHandler)
+    server.responses = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    invoker.queue.append({'RequestType': 'Delete',
+                          'ResponseURL': 'http://127.0.0.1:' + str(server.server_address[1]) + '/response',
+                          'StackId': 'local-stack',
+                          'RequestId': 'local-request',
+                          'LogicalResourceId': 'cleanupBucketOnDelete4',
+                          'PhysicalResourceId': 'local/physical',
+                          'ResourceProperties': {'BucketName': bucket}})
+    invocations = []
+    start = time.perf_counter()
+    while invoker.queue:
+        event = invoker.queue.pop(0)
+        began = time.perf_counter()
+        function['lambda_handler'](event, LocalContext(timeout))
+        invocations.append(time.perf_counter() - began)
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    return {'invocations': len(invocations),
+            'longest invocation (s)': max(invocations),
+            'wall (s)': wall,
+            'response': server.responses[-1]['Status'] if server.responses else None,
+            'physical id kept': all(r['PhysicalResourceId'] == 'local/physical' for r in server.responses)}
+
+
+def purge_one_by_one(s3, bucket):
+    """Delete every current object with one request per key, as the function did before
+
+        :param s3: LocalS3 holding bucket
+        :param bucket: bucket name
+        :return: keys deleted
+    """
+    deleted = 0
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket):
+        for obj in page.get('Contents', []):
+            s3.delete_object(Bucket=bucket, Key=obj['Key'])
+            deleted += 1
+
+    return deleted
+
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-keys", type=int, help="keys in the purged bucket (int) [default: 200000]", default=200000)
+    parser.add_argument("-versions", type=int, help="noncurrent versions per key (int) [default: 0]", default=0)
+    parser.add_argument("-markers", action="store_true", help="add a delete marker for every key")
+    parser.add_argument("-latency", type=float, help="ms of round trip per S3 request (float) [default: 20]",
+                        default=20)
+    parser.add_argument("-timeout", type=float, help="seconds each invocation may run (float) [default: 5]", default=5)
+    parser.add_argument("-margin", type=float, help="seconds left when an invocation hands over (float) "
+                        "[default: 1]", default=1)
+    parser.add_argument("-baseline-keys", type=int, help="keys deleted one by one to time the previous purge (int) "
+                        "[default: 500]", default=500)
+    args = parser.parse_args()
+
+    s3 = local_aws.LocalS3(latency=args.latency / 1000, setup=0, max_pool_connections=50)
+    keys = ["dashboards/" + format(i // 1000, '04d') + "/result_" + format(i, '07d') + ".json"
+            for i in range(args.keys)]
+    s3.seed('purged', keys, args.versions, args.markers)
+    s3.seed('baseline', keys[:args.baseline_keys])
+    total = len(s3.objects) + len(s3.versions) - args.baseline_keys
+
+    report = purge(s3, 'purged', args.timeout, args.margin)
+    report['versions deleted'] = total
+    report['versions left'] = sum(1 for bucket, _ in s3.objects if bucket == 'purged') + \
+        sum(1 for bucket, _, _ in s3.versions if bucket == 'purged')
+    report['versions/s'] = total / report['wall (s)']
+    report['requests'] = dict(s3.calls)
+
+    start = time.perf_counter()
+    deleted = purge_one_by_one(s3, 'baseline')
+    rate = deleted / (time.perf_counter() - start) if deleted else None
+    report['one by one keys/s'] = rate
+    report['one by one estimate for all keys (s)'] = args.keys / rate if rate else None
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,106 @@
+""" Versions:     python v. 3.x
+
+    Performance regression gate, used by get_test_results.py.
+    Compares each sub-test's timings in the current run with a percentile of the same measurement over previous runs
+    from the history store, flagging any that have slowed down by more than a configured ratio.
+"""
+
+import history
+import stats
+import test_objects as tob
+from collections import OrderedDict
+
+# timings gated by default, as recorded in the history store
+METRICS = ['front end response time (ms)', 'back end response time (ms)', 'http response time (ms)']
+
+
+def baseline(path, last=10, pct=90, min_runs=3, metrics=None):
+    """Build baseline percentiles from previous runs in one pass over the history store
+
+        :param path: history store file
+        :param last: number of most recent runs in the baseline
+        :param pct: percentile of previous values used as the baseline
+        :param min_runs: fewest previous runs needed before a measurement is gated
+        :param metrics: metric names to include
+        :return: dict of (region, tag, test, metric) to (baseline value, runs used)
+    """
+    metrics = set(metrics or METRICS)
+    series = {}
+
+    for row in history.rows(path):
+        if row['metric'] in metrics:
+            values = series.setdefault((row['region'], row['tag'], row['test'], row['metric']), OrderedDict())
+            values.pop(row['run'], None)
+            values[row['run']] = row['value']
+            if len(values) > last:
+                values.popitem(last=False)
+
+    return {key: (stats.percentile(list(values.values()), pct), len(values))
+            for key, values in series.items() if len(values) >= min_runs}
+
+
+def gate(results, base, threshold=1.5, min_delta=100, metrics=None):
+    """Compare the current run against the baseline
+
+        :param results: dict of region to (result file path, list of test dicts)
+        :param base: baseline dict from baseline()
+        :param threshold: ratio of current to baseline value that counts as a regression
+        :param min_delta: smallest increase in milliseconds that counts as a regression, ignoring noise on fast pages
+        :param metrics: metric names to gate
+        :return: dict of region to list of check dicts
+    """
+    metrics = metrics or METRICS
+    checks = {}
+
+    for region, (_, tests) in results.items():
+        checks[region] = []
+        for test in tests:
+            current = history.metrics(test)
+            for metric in metrics:
+                key = (region, test['tag'], test['test'], metric)
+                if metric not in current or key not in base:
+                    continue
+                value, runs = base[key]
+                delta = current[metric] - value
+                checks[region].append({'tag': test['tag'],
+                                       'test': test['test'],
+                                       'metric': metric,
+                                       'current': current[metric],
+                                       'baseline': value,
+                                       'baseline runs': runs,
+                                       'delta': delta,
+                                       'ratio': current[metric] / value if value else None,
+                                       'breached': delta > min_delta and current[metric] > value * threshold
+                                       })
+
+    return checks
+
+
+def verdict(checks, mode):
+    """Decide outcome of the gate for a region
+
+        :param checks: list of check dicts
+        :param mode: "warn" or "fail", action taken on a regression
+        :return: "PASS", "WARN" or "FAIL"
+    """
+    if not any(check['breached'] for check in checks):
+        return "PASS"
+
+    return "FAIL" if mode == "fail" else "WARN"
+
+
+def as_failures(checks):
+    """Describe breached checks as failed tests so they are notified like functional failures
+
+        :param checks: list of check dicts
+        :return: list of test dicts
+    """
+    failures = []
+    for check in checks:
+        if check['breached']:
+            test = tob.new_test(check['tag'], check['test'])
+            test = tob.fail(test, 'Performance regression in ' + check['metric'])
+            test.extra.append(check)
+            failures.append(test.to_dict())
+
+    return failures
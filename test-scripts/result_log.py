@@ -0,0 +1,131 @@
+""" Versions:     python v. 3.x
+
+    Streaming result log, used by tests.py and load_test.py.
+    Each sub-test result is appended to a local JSON Lines file as soon as it completes, and lines written since the
+    last flush are uploaded to S3 as numbered part objects every few seconds or records, so a crash loses at most
+    one flush interval and memory stays flat however many results a run produces. When the run ends the log is
+    converted to the result file read by the dashboard, streaming line by line.
+"""
+
+import json
+import threading
+import time
+import aws_interact as aws
+
+FLUSH_SECONDS = 30
+FLUSH_RECORDS = 200
+
+
+def new_log(path, bucket=None, prefix=None, flush_seconds=FLUSH_SECONDS, flush_records=FLUSH_RECORDS):
+    """Open a result log, replacing any earlier log at the same path
+
+        :param path: local JSON Lines file
+        :param bucket: optional S3 bucket parts are flushed to
+        :param prefix: key prefix of part objects, e.g. odshi-on-aws/stream/<run>/test_output_us-east-1-
+        :param flush_seconds: max seconds between flushes to S3
+        :param flush_records: max records between flushes to S3
+        :return: log dict
+    """
+    log = {'path': path,
+           'file': open(path, 'w'),
+           'bucket': bucket,
+           'prefix': prefix,
+           'flush seconds': flush_seconds,
+           'flush records': flush_records,
+           'lock': threading.Lock(),
+           'records': 0,
+           'failures': 0,
+           'pending': 0,
+           'flushed offset': 0,
+           'flushed at': time.monotonic(),
+           'parts': 0
+           }
+
+    return log
+
+
+def write(log, test):
+    """Append a completed result, flushing to S3 when due
+
+        :param log: log dict
+        :param test: TestResult
+    """
+    line = json.dumps(test.to_dict()) + "\n"
+
+    with log['lock']:
+        log['file'].write(line)
+        # written through to the OS so the local log survives a crash of this process
+        log['file'].flush()
+        log['records'] += 1
+        log['failures'] += 0 if test.status == 'SUCCESS' else 1
+        log['pending'] += 1
+
+        if log['pending'] >= log['flush records'] or \
+                time.monotonic() - log['flushed at'] >= log['flush seconds']:
+            flush(log)
+
+
+def flush(log):
+    """Upload lines written since the last flush as the next part object, caller holds the log lock
+
+        :param log: log dict
+    """
+    log['flushed at'] = time.monotonic()
+    if log['bucket'] is None or not log['pending']:
+        return
+
+    with open(log['path'], 'rb') as f:
+        f.seek(log['flushed offset'])
+        chunk = f.read()
+
+    log['parts'] += 1
+    key = log['prefix'] + format(log['parts'], '05d') + ".jsonl"
+    try:
+        aws.get_client('s3').put_object(Bucket=log['bucket'], Key=key, Body=chunk)
+    except Exception as e:
+        # the lines stay pending and are sent with the next flush
+        log['parts'] -= 1
+        print("WARNING: could not flush results to s3://" + log['bucket'] + "/" + key + ": " + str(e))
+        return
+
+    log['flushed offset'] += len(chunk)
+    log['pending'] = 0
+
+
+def read(path):
+    """Stream the results in a log
+
+        :param path: local JSON Lines file
+        :return: generator of sub-test dicts
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def close(log, result_file=None, extra=None):
+    """Flush the remaining lines and write the result file, one result at a time
+
+        :param log: log dict
+        :param result_file: optional JSON result file to write, as read by get_test_results.py
+        :param extra: optional dict of additional top level fields
+        :return: dict of records and failures written
+    """
+    with log['lock']:
+        log['file'].close()
+        flush(log)
+
+    if result_file is None:
+        return {'records': log['records'], 'failures': log['failures'], 'parts': log['parts']}
+
+    with open(result_file, "w+") as out:
+        out.write('{"Page Access Info": [')
+        for i, test in enumerate(read(log['path'])):
+            out.write((", " if i else "") + json.dumps(test))
+        out.write("]")
+        for name, value in (extra or {}).items():
+            out.write(", " + json.dumps(name) + ": " + json.dumps(value))
+        out.write("}")
+
+    return {'records': log['records'], 'failures': log['failures'], 'parts': log['parts']}
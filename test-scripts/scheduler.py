@@ -0,0 +1,169 @@
+""" Versions:     python v. 3.x
+
+    Dependency aware scheduler for sub-tests, used by tests.py.
+    Each sub-test is a node naming the nodes it depends on. Nodes whose dependencies have succeeded run concurrently,
+    and nodes downstream of a failure are skipped as soon as it is known. Retry policies (attempts, backoff, jitter
+    and retry deadline) are set per sub-test in a JSON file, e.g.
+
+        {"default": {"attempts": 1},
+         "sign in attempt": {"attempts": 3, "base": 2, "cap": 10, "jitter": true, "retry_deadline": 60},
+         "ATLAS create cohort attempt": {"attempts": 2}}
+
+    where a "<tag> <sub-test>" entry overrides a "<sub-test>" entry, which overrides "default". The retry deadline
+    is the number of seconds after the first attempt started in which a retry may still start; it does not interrupt
+    an attempt in progress, whose own length is bounded by the page load and request timeouts.
+"""
+
+import json
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_POLICY = {'attempts': 1,
+                  'base': 1.0,
+                  'cap': 10.0,
+                  'jitter': True,
+                  'retry_deadline': None
+                  }
+
+# a failed sign in is retried once straight away, as tests.py always has
+DEFAULT_POLICIES = {'default': {},
+                    'sign in attempt': {'attempts': 2, 'base': 0}
+                    }
+
+
+def load_policies(path=None):
+    """Read retry policies, on top of the defaults
+
+        :param path: optional JSON file of policies keyed by "default", sub-test name or "<tag> <sub-test name>"
+        :return: dict of policies
+        :raises ValueError: if a policy sets an unknown field
+    """
+    policies = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+    if path is None:
+        return policies
+
+    with open(path) as f:
+        for name, policy in json.load(f).items():
+            unknown = set(policy) - set(DEFAULT_POLICY)
+            if unknown:
+                hint = " (\"timeout\" is now \"retry_deadline\")" if 'timeout' in unknown else ""
+                raise ValueError("Unknown retry policy fields for " + name + ": " + ", ".join(sorted(unknown)) + hint)
+            policies.setdefault(name, {}).update(policy)
+
+    return policies
+
+
+def policy_for(policies, tag, name):
+    """Find the retry policy for a sub-test
+
+        :param policies: dict of policies, see load_policies()
+        :param tag: tag for resource being tested
+        :param name: name of sub-test
+        :return: policy dict
+    """
+    policy = dict(DEFAULT_POLICY)
+    for key in ('default', name, tag + " " + name):
+        policy.update(policies.get(key, {}))
+
+    return policy
+
+
+def retry(attempt, policy):
+    """Call an attempt until it succeeds or the policy gives up
+
+        No retry is started once the retry deadline would be passed, an attempt in progress is not interrupted. An
+        attempt raising an exception counts as a failed attempt.
+
+        :param attempt: callable returning True on success
+        :param policy: policy dict
+        :return: True if an attempt succeeded, False if the last attempt failed
+        :raises Exception: raised by the last attempt, once no attempts are left
+    """
+    start = time.monotonic()
+    error = None
+    for i in range(max(1, policy['attempts'])):
+        if i:
+            delay = min(policy['cap'], policy['base'] * 2 ** (i - 1))
+            delay = random.uniform(0, delay) if policy['jitter'] else delay
+            if policy['retry_deadline'] is not None and time.monotonic() + delay - start > policy['retry_deadline']:
+                break
+            time.sleep(delay)
+        try:
+            if attempt():
+                return True
+            error = None
+        except Exception as e:
+            print("Attempt " + str(i + 1) + " raised " + type(e).__name__ + ": " + str(e).strip().split("\n")[0])
+            error = e
+
+    if error is not None:
+        raise error
+    return False
+
+
+def new_node(name, run, deps=(), skip=None):
+    """Create a node of a sub-test graph
+
+        :param name: unique name of node
+        :param run: callable performing the sub-test, returning True on success
+        :param deps: names of nodes that must succeed first
+        :param skip: optional callable, called with the name of the failed dependency when the node is skipped
+        :return: node dict
+    """
+    return {'name': name, 'run': run, 'deps': list(deps), 'skip': skip}
+
+
+def run_graph(nodes, workers=4):
+    """Run every node once its dependencies have succeeded, skipping nodes downstream of a failure
+
+        :param nodes: list of node dicts
+        :param workers: max nodes running at once
+        :return: dict of node name to "SUCCESS", "FAILURE" or "SKIPPED"
+        :raises ValueError: if a dependency is unknown or the dependencies form a cycle
+    """
+    by_name = {node['name']: node for node in nodes}
+    for node in nodes:
+        for dep in node['deps']:
+            if dep not in by_name:
+                raise ValueError("Node " + node['name'] + " depends on unknown node " + dep)
+
+    status = {}
+
+    def execute(node):
+        try:
+            return 'SUCCESS' if node['run']() else 'FAILURE'
+        except Exception as e:
+            print("ERROR in " + node['name'] + ": " + str(e))
+            return 'FAILURE'
+
+    def settle(name):
+        # skip every node downstream of a failure straight away, rather than when it would have been reached
+        for node in nodes:
+            if node['name'] not in status and name in node['deps'] and status[name] != 'SUCCESS':
+                status[node['name']] = 'SKIPPED'
+                if node['skip'] is not None:
+                    node['skip'](name)
+                settle(node['name'])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        running = {}
+        while True:
+            for node in nodes:
+                if node['name'] not in status and node['name'] not in running.values() and \
+                        all(status.get(dep) == 'SUCCESS' for dep in node['deps']):
+                    running[pool.submit(execute, node)] = node['name']
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status[name] = future.result()
+                settle(name)
+
+    # nodes never reached are part of a cycle
+    if len(status) < len(nodes):
+        raise ValueError("Dependency cycle between " + ", ".join(n['name'] for n in nodes if n['name'] not in status))
+
+    return status
@@ -0,0 +1,188 @@
+""" Versions:     python v. 3.x
+
+    Splits the region x product test matrix into shards run by independent CodeBuild builds, and merges the
+    results of every shard for a single dashboard and verdict.
+    Regions are the unit of assignment, since each region is deployed as one stack tested for every product.
+    A region's shard depends only on the set of regions, never on their order in the config, so every build
+    computes the same assignment.
+
+    usage: python3 shard.py <shard> <shards> -config=<taskcat config> -test=<test> -units   (prints shard's regions)
+           python3 shard.py -merge <dir> [<dir> ...] -out=<dir>   (merges shard results, fails if any test failed)
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import yaml
+
+# products tested in each deployed region, by tests.py -test
+PRODUCTS = {'ohdsi': ['RStudio', 'Jupyter', 'ATLAS'],
+            'redcap': ['REDCap'],
+            'load': ['RStudio', 'Jupyter', 'ATLAS']
+            }
+RESULT_FILES = ('test_output_*.json', 'load_output_*.json')
+DASHBOARD = os.path.join('taskcat_outputs', 'index.html')
+
+# use the libyaml bindings when available, as insert_vars.py does
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def assign(regions, shards):
+    """Assign each region to a shard, balancing the number of regions per shard
+
+        :param regions: list of regions
+        :param shards: number of shards
+        :return: dict of region to shard number, from 1
+    """
+    order = sorted(set(regions), key=lambda region: (hashlib.sha1(region.encode('utf-8')).hexdigest(), region))
+
+    return {region: i % shards + 1 for i, region in enumerate(order)}
+
+
+def shard_regions(regions, shard, shards):
+    """Regions deployed and tested by one shard
+
+        :param regions: list of regions
+        :param shard: shard number, from 1
+        :param shards: number of shards
+        :return: list of regions in config order
+    """
+    assignment = assign(regions, shards)
+
+    return [region for region in regions if assignment[region] == shard]
+
+
+def units(regions, test):
+    """Expand regions into the region x product units they test
+
+        :param regions: list of regions
+        :param test: test performed by tests.py
+        :return: list of (region, product) tuples
+    """
+    return [(region, product) for region in regions for product in PRODUCTS[test]]
+
+
+def merge_dashboards(pages):
+    """Combine taskcat dashboards by adding the stack rows of every page to the first
+
+        :param pages: list of dashboard html Strings
+        :return: combined dashboard html String
+    """
+    base = pages[0]
+    rows = []
+    for page in pages[1:]:
+        start = page.find('</thread>')
+        if start >= 0:
+            start += len('</thread>')
+        else:
+            # without a header the rows start after the opening table tag, which is not copied
+            table = page.find('<table')
+            start = page.find('>', table) + 1 if table >= 0 else -1
+        end = page.find('</table>')
+        if start >= 0 and end > start:
+            rows.append(page[start:end])
+
+    insert = base.find('</table>')
+    if insert < 0:
+        insert = len(base)
+
+    return base[:insert] + "".join(rows) + base[insert:]
+
+
+def merge(folders, out):
+    """Combine the result files and taskcat outputs of every shard
+
+        :param folders: list of shard output directories
+        :param out: directory to write merged results to
+        :return: dict of regions, tests and failures found
+        :raises ValueError: if a region was tested by more than one shard
+    """
+    os.makedirs(os.path.join(out, 'taskcat_outputs'), exist_ok=True)
+    sources = {}
+    pages = []
+    tests = failures = 0
+
+    for folder in folders:
+        for pattern in RESULT_FILES:
+            for path in sorted(glob.glob(os.path.join(folder, pattern))):
+                name = os.path.basename(path)
+                if name in sources:
+                    raise ValueError(name + " found in both " + sources[name] + " and " + folder)
+                sources[name] = folder
+                shutil.copyfile(path, os.path.join(out, name))
+
+                with open(path) as f:
+                    for test in json.load(f).get("Page Access Info", []):
+                        tests += 1
+                        failures += 0 if test["status"] == "SUCCESS" else 1
+
+        outputs = os.path.join(folder, 'taskcat_outputs')
+        for path in glob.glob(os.path.join(outputs, '*')):
+            if os.path.basename(path) == 'index.html':
+                with open(path) as f:
+                    pages.append(f.read())
+            elif os.path.isfile(path):
+                shutil.copyfile(path, os.path.join(out, 'taskcat_outputs', os.path.basename(path)))
+
+    if pages:
+        with open(os.path.join(out, DASHBOARD), 'w') as f:
+            f.write(merge_dashboards(pages))
+
+    return {'regions': sorted(name[len('test_output_'):-len('.json')] for name in sources
+                              if name.startswith('test_output_')),
+            'tests': tests,
+            'failures': failures
+            }
+
+
+def project_regions(config):
+    """Read the project regions from a taskcat config
+
+        :param config: path to taskcat project config
+        :return: list of regions
+    """
+    with open(config, 'r') as f:
+        doc = yaml.load(f, Loader=YAML_LOADER)
+
+    return doc['project']['regions']
+
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("shard", type=int, nargs="?", help="shard to report, from 1 (int)")
+    parser.add_argument("shards", type=int, nargs="?", help="number of shards (int)")
+    parser.add_argument("-config", type=str, help="taskcat project config listing regions (str) [default: "
+                        ".taskcat.yml]", default=".taskcat.yml")
+    parser.add_argument("-test", type=str, help="test performed by tests.py (str) from set {\"ohdsi\", \"redcap\", "
+                        "\"load\"} [default: ohdsi]", default="ohdsi")
+    parser.add_argument("-units", action="store_true", help="print the shard's region x product units as JSON "
+                        "instead of its comma separated regions")
+    parser.add_argument("-merge", type=str, nargs="+", help="shard output directories to merge (str)", default=None)
+    parser.add_argument("-out", type=str, help="directory merged results are written to (str) [default: .]",
+                        default=".")
+    args = parser.parse_args()
+
+    if args.merge:
+        result = merge(args.merge, args.out)
+        print(str(result['tests']) + " tests in " + str(len(result['regions'])) + " regions merged from " +
+              str(len(args.merge)) + " shards, " + str(result['failures']) + " failed")
+        if result['failures']:
+            exit(-1)
+        return
+
+    if args.shard is None or args.shards is None or not 1 <= args.shard <= args.shards:
+        parser.error("shard must be between 1 and shards")
+
+    regions = shard_regions(project_regions(args.config), args.shard, args.shards)
+    if args.units:
+        print(json.dumps({'shard': args.shard, 'shards': args.shards, 'units': units(regions, args.test)}))
+    else:
+        print(",".join(regions))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,34 @@
+""" Versions:     python v. 3.x
+
+    Percentiles and summaries of repeated measurements, used by test_objects.py, regression.py and the benchmarks.
+    Kept free of other dependencies so the dashboard and regression gate run without a browser installed.
+"""
+
+import math
+import statistics
+
+
+def percentile(values, pct):
+    """Nearest rank percentile of numeric values
+
+        :param values: list of numbers
+        :param pct: percentile from 0 to 100
+        :return: value at percentile
+    """
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(pct / 100.0 * len(ordered))))
+
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """Summarize repeated samples of a measurement
+
+        :param values: list of numbers
+        :return: dict of min, median, p95 and max
+    """
+    return {'min': min(values),
+            'median': statistics.median(values),
+            'p95': percentile(values, 95),
+            'max': max(values)
+            }
@@ -4,7 +4,12 @@
     Creates an alters objects holding test result data, used by tests.py
 """
 
-import web_interact as wi
+import http_interact as http
+from stats import percentile, summarize
+
+
+# where deployed endpoints are reached, overridden by tests.py -url-template to test against local_stack.py
+URL_TEMPLATE = "http://{endpoint}.{region}.elasticbeanstalk.com"
 
 
 def key_url(key, endpoint, region):
@@ -15,13 +20,52 @@ def key_url(key, endpoint, region):
         :param region: region reusable solution was deployed in
         :return: outputs from stack as json object
     """
-    url = "http://" + endpoint + "." + region + ".elasticbeanstalk.com"
+    url = URL_TEMPLATE.format(endpoint=endpoint, region=region)
     kv = {"OutputKey": key,
           "OutputValue": url}
 
     return kv
 
 
+class TestResult:
+    """Result of a single sub-test, kept compact as thousands are recorded by load and soak runs"""
+
+    __slots__ = ('tag', 'test', 'status', 'message', 'extra', 'elapsed', 'attempts')
+
+    def __init__(self, tag, test, status='UNEXECUTED', message='Test could not be executed', extra=None,
+                 elapsed=None, attempts=1):
+        """
+            :param tag: tag for resource being tested
+            :param test: name of sub-test
+            :param status: "UNEXECUTED", "SUCCESS" or "FAILURE"
+            :param message: reason for status
+            :param extra: list of response information dicts
+            :param elapsed: time taken by sub-test in milliseconds
+            :param attempts: number of times the sub-test was attempted under its retry policy
+        """
+        self.tag = tag
+        self.test = test
+        self.status = status
+        self.message = message
+        self.extra = [] if extra is None else extra
+        self.elapsed = elapsed
+        self.attempts = attempts
+
+    def to_dict(self):
+        """Convert to the dict written to result files
+
+            :return: sub-test dict
+        """
+        return {'tag': self.tag,
+                'test': self.test,
+                'status': self.status,
+                'message': self.message,
+                'elapsed (ms)': self.elapsed,
+                'attempts': self.attempts,
+                'extra': self.extra
+                }
+
+
 def new_test(tag, name):
     """Create default, empty sub-test result objects
 
@@ -30,65 +74,74 @@ def new_test(tag, name):
         :return: sub-test object
     """
     # init all status message to 'could not be executed' failures
-    test = {'tag': tag,
-            'test': name,
-            'status': 'UNEXECUTED',
-            'message': 'Test could not be executed',
-            'extra': []
-            }
-
-    return test
+    return TestResult(tag, name)
 
 
-def add_response(test, link, driver=None):
+def add_response(test, link, driver=None, resp=None, samples=1):
     """Append response information dict to extra info of test
 
         :param test: test object to append response info to
         :param link: url for page yielding response
         :param driver: optional driver for receiving additional response info
-        :return: updated test dict
-    """
-    test['extra'].append(response_info(link, driver))
-    return test
-
-
-def set_http_sts(test, sts):
-    """Set http status code
-
-        :param test: test object to append response info to
-        :param sts: http status code as String
-        :return: updated test dict
+        :param resp: optional http response dict already retrieved for link
+        :param samples: number of page timing samples to take with driver
+        :return: updated test object
     """
-    test['extra'][0]['http status'] = sts
+    test.extra.append(response_info(link, driver, resp, samples))
     return test
 
 
 def get_sts(test):
-    return test['status']
+    return test.status
 
 
 def get_tag(test):
-    return test['tag']
+    return test.tag
 
 
-def response_info(link, driver=None):
+def response_info(link, driver=None, resp=None, samples=1):
     """Create and populate response information dict
 
+        With a driver the status, redirects and timings are taken from the browser's own navigation, otherwise from
+        the given http response or a direct request to the link.
+
         :param link: url for page yielding response
         :param driver: optional driver for receiving additional response info
+        :param resp: optional http response dict already retrieved for link
+        :param samples: number of page timing samples to take with driver
         :return: response information dict
     """
     page_info = pg_info(link)
 
-    if driver is None:
-        page_info['http status'] = wi.http_status('', link)
-        return page_info
-    else:
+    if driver is not None:
+        # imported here so results can be read and gated (regression.py) without selenium installed
+        import web_interact as wi
+
         page_info['title'] = driver.title
-        front, back = wi.response(driver)
-        page_info['http status'] = wi.http_status('', link)
-        page_info['front end response time (ms)'] = front
-        page_info['back end response time (ms)'] = back
+        record = wi.navigation(driver)
+        if record is not None:
+            page_info['url'] = record['url']
+            page_info['http status'] = record['http status']
+            page_info['redirects'] = record['redirects']
+            page_info['network timing (ms)'] = record['timing (ms)']
+            page_info['transfer size (bytes)'] = record['transfer size (bytes)']
+        timings = wi.timing_samples(driver, samples)
+        breakdown = {metric: summarize([timing[metric] for timing in timings]) for metric in timings[0]}
+        page_info['front end response time (ms)'] = breakdown['ttfb']['median']
+        page_info['back end response time (ms)'] = breakdown['dom complete']['median'] - breakdown['ttfb']['median']
+        page_info['samples'] = len(timings)
+        page_info['page timing'] = breakdown
+        return page_info
+
+    if resp is None:
+        resp = http.status(link)
+    page_info['http status'] = resp['status']
+    page_info['http response time (ms)'] = resp['time (ms)']
+    # pages fetched by http_probe carry their title and the redirects followed
+    if 'title' in resp:
+        page_info['url'] = resp['url']
+        page_info['title'] = resp['title']
+        page_info['redirects'] = resp['redirects']
 
     return page_info
 
@@ -104,9 +157,11 @@ def pg_info(link):
         'tag': 'response',
         'url': link,
         'title': 'Not tested',
-        'http status': '---',
-        'front end response time (ms)': 'Not tested',
-        'back end response time (ms)': 'Not tested'
+        'http status': None,
+        'http response time (ms)': None,
+        'redirects': [],
+        'front end response time (ms)': None,
+        'back end response time (ms)': None
     }
 
     return page_info
@@ -122,8 +177,8 @@ def success(test, msg=None):
     if msg is None:
         msg = 'Test entirely succeeded'
 
-    test['status'] = 'SUCCESS'
-    test['message'] = msg
+    test.status = 'SUCCESS'
+    test.message = msg
 
     return test
 
@@ -138,8 +193,8 @@ def fail(test, msg=None):
     if msg is None:
         msg = 'Test failed'
 
-    test['status'] = 'FAILURE'
-    test['message'] = msg
+    test.status = 'FAILURE'
+    test.message = msg
 
     return test
 
@@ -151,10 +206,9 @@ def resolve_sts(test, sts_msg):
         :param sts_msg: optional message for status reason
         :return: updated test object
     """
-    if sts_msg[0] is 'FAILURE':
+    if sts_msg[0] == 'FAILURE':
         return fail(test, sts_msg[1])
-    elif sts_msg[0] is 'SUCCESS':
+    elif sts_msg[0] == 'SUCCESS':
         return success(test, sts_msg[1])
     else:
-        print('Script error - test status unresolved for test ' + str(test))
-        exit(-1)
+        raise ValueError('Script error - test status unresolved for test ' + str(test.to_dict()))
@@ -6,266 +6,456 @@
     can be created in ATLAS.
 
     usage: python3 tests.py <endpoint> <region> <username> <password> <bucket> -test=<test>
+
+    <region> may be a single region, a comma separated list of regions, or "ALL" to test every region listed in the
+    taskcat project config. Regions are tested concurrently, each with its own cookie jar and result file, and within a
+    region the products are tested concurrently as a graph of sub-tests (see scheduler.py) with a browser each. A
+    sub-test is skipped once one it depends on fails, and is retried as set by -retry-policies.
+
+    -test=load signs concurrent virtual users in to every product (see load_test.py) instead of testing functionality.
+
+    -trace=<file> records timing spans for each region, sub-test, browser action, request and upload in Chrome trace
+    format (see tracing.py) and uploads the file next to the results.
+
+    -discover tests the urls the taskcat stack in each region outputs (see discovery.py) instead of building them from
+    <endpoint>.
 """
 
 import argparse
+import functools
 import json
 import os
-import shutil
 import sys
+import time
+import yaml
+import atlas
 import aws_interact as aws
+import cohort_bench as cb
+import discovery
+import driver_pool as dp
+import history
+import http_interact as http
+import http_probe as hp
+import load_test as lt
+import result_log as rl
+import scheduler
 import web_interact as wi
 import test_objects as tob
-from datetime import datetime
+import tracing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from selenium.common.exceptions import WebDriverException
 
-BUCKET = ""
-USER = ""
-PASSW = ""
-FAILURE_FOUND = False
+# use the libyaml bindings when available, as insert_vars.py does
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 
-def test_pages(outputs, filename):
-    """Test all ohdsi web page functionality
+def new_run(endpoint, region, user, passw, bucket, deadline=None, samples=1, policies=None, probe='browser'):
+    """Create state object for testing a single region, used in place of module level globals
 
+        :param endpoint: endpoint name for parent stack as String
+        :param region: region for parent stack as String
+        :param user: username as String
+        :param passw: password as String
+        :param bucket: name of S3 bucket for storing test results
+        :param deadline: optional time.monotonic() deadline for endpoints to become ready before testing
+        :param samples: number of page timing samples to take per page
+        :param policies: optional retry policies per sub-test, see scheduler.load_policies()
+        :param probe: "browser" to test pages in Chrome, "http" to test them with plain requests where possible
+        :return: run state dict
+    """
+    run = {'endpoint': endpoint,
+           'region': region,
+           'user': user,
+           'passw': passw,
+           'bucket': bucket,
+           'filename': "test_output_" + region + ".json",
+           'cookies': {},
+           'deadline': deadline,
+           'ready': {},
+           'samples': samples,
+           'policies': scheduler.load_policies() if policies is None else policies,
+           'probe': probe,
+           'log': None,
+           'failure': False
+           }
+
+    return run
+
+
+def test_pages(run, outputs, pool):
+    """Test all ohdsi web page functionality, the products concurrently
+
+        :param run: run state for region being tested
         :param outputs: list of urls and keys as dicts for pages being tested
-        :param filename: name of file to store test results in
-        :return: list containing all test result dicts
+        :param pool: driver pool lending a clean browser to each product
+        :return: dict of results recorded and failures
     """
+    open_log(run, "odshi-on-aws/")
+    drivers = {}
+    try:
+        nodes = []
+        for output in outputs:
+            key = output["OutputKey"]
 
-    driver = wi.chrome_driver()
-
-    all_tests = []
-
-    for output in outputs:
-        link = output["OutputValue"]
-        key = output["OutputKey"]
+            # Deployment logs unchecked
+            if "Deployment" not in key:
+                if wi.login_form(key) is not None or "ATLAS" in key:
+                    nodes += page_nodes(run, output, pool, drivers)
+                else:
+                    rl.write(run['log'], tob.new_test('UNKNOWN PAGE', 'N/A'))
 
-        # Deployment logs unchecked
-        if "Deployment" not in key:
-            # attempt to connect to the page and record
-            if "RStudio" in key:
-                all_tests = test_page(driver, link, all_tests, key, "//button[@type='submit']")
-            elif "Jupyter" in key:
-                all_tests = test_page(driver, link, all_tests, key, "//input[@id='login_submit']")
-            elif "ATLAS" in key:
-                all_tests = test_page(driver, link, all_tests, key, "ATLAS")
-            else:
-                all_tests.append(tob.new_test('UNKNOWN PAGE', 'N/A'))
+        try:
+            scheduler.run_graph(nodes, workers=len(nodes))
+        finally:
+            for driver in drivers.values():
+                dp.release(pool, driver)
+    finally:
+        summary = upload_to_s3(run, run['filename'], "odshi-on-aws/" + run['filename'])
 
-    upload_to_s3(all_tests, filename, "odshi-on-aws/" + filename)
+    return summary
 
-    driver.close()
-    return all_tests
 
-
-def red_test(output, filename):
+def red_test(run, output, pool):
     """Test redcap web page functionality
 
+        :param run: run state for region being tested
         :param output: url and key as dict for page being tested
-        :param filename: name of file to store test results in
-        :return: list containing all test result dicts
+        :param pool: driver pool lending a clean browser to the page test
+        :return: dict of results recorded and failures
     """
+    open_log(run, "redcap/")
+    drivers = {}
+    try:
+        try:
+            scheduler.run_graph(page_nodes(run, output, pool, drivers))
+        finally:
+            for driver in drivers.values():
+                dp.release(pool, driver)
+    finally:
+        summary = upload_to_s3(run, "red_" + run['filename'], "redcap/" + run['filename'])
 
-    driver = wi.chrome_driver()
+    return summary
 
+
+def page_nodes(run, output, pool, drivers):
+    """Build the sub-test graph for one product: wait for ready, get page, sign in and for ATLAS create a cohort
+
+        :param run: run state for region being tested
+        :param output: url and key as dict for page being tested
+        :param pool: driver pool lending a browser to the product
+        :param drivers: dict of key to driver borrowed by the product, returned to the pool by the caller
+        :return: list of scheduler nodes
+    """
     link = output["OutputValue"]
     key = output["OutputKey"]
+    nodes = []
+    deps = []
+
+    if run['deadline'] is not None:
+        nodes.append(scheduler.new_node(key + " ready", lambda: wait_ready(run, link)))
+        deps = [key + " ready"]
 
-    all_tests = test_page(driver, link, [], key, "//button[@id='login_btn']")
-    upload_to_s3(all_tests, "red_" + filename, "redcap/" + filename)
+    if run['probe'] == "http" and not any(product in key for product in hp.BROWSER_ONLY):
+        probe = hp.new_probe()
 
-    driver.close()
-    return all_tests
+        def get_page(test):
+            return probe_page(run, probe, link, key, test)
+
+        def sign_in_attempt(test):
+            return probe_sign_in(run, probe, link, test)
+    else:
+        def get_page(test):
+            if key not in drivers:
+                drivers[key] = dp.acquire(pool)
+            return test_page(run, drivers[key], link, key, test)
+
+        def sign_in_attempt(test):
+            return sign_in(run, drivers[key], link, wi.login_form(key)[0], test)
+
+    nodes += sub_test_nodes(run, key, [('get page attempt', get_page)], deps)
+    if "ATLAS" in key:
+        return nodes + atlas_nodes(run, link, key, [nodes[-1]['name']])
+
+    return nodes + sub_test_nodes(run, key, [('sign in attempt', sign_in_attempt)], [nodes[-1]['name']])
+
+
+def atlas_nodes(run, link, key="ATLAS", deps=()):
+    """Build the sub-test graph for signing in to ATLAS and creating a cohort, sharing one WebAPI session
+
+        :param run: run state for region being tested
+        :param link: url for ATLAS page as String
+        :param key: output key of ATLAS page
+        :param deps: names of nodes that must succeed first
+        :return: list of scheduler nodes
+    """
+    session = atlas.new_session(link, run['user'], run['passw'], run['cookies'])
+
+    return sub_test_nodes(run, key, [('sign in attempt', lambda test: atlas_sign_in(run, session, test)),
+                                     ('create cohort attempt', lambda test: create_cohort(run, session, test))], deps)
 
 
-def test_page(driver, link, all_tests, key, btn_path):
-    """Ensure proper, expected page is loaded for specific link and test page functionality
+def sub_test_nodes(run, tag, steps, deps=()):
+    """Chain sub-tests into scheduler nodes, each recorded once whatever the number of attempts
+
+        :param run: run state for region being tested
+        :param tag: tag for resource being tested
+        :param steps: list of (sub-test name, attempt) tuples, each attempt taking the test object and returning
+                      True on success
+        :param deps: names of nodes the first sub-test depends on
+        :return: list of scheduler nodes
+    """
+    nodes = []
+    for name, attempt in steps:
+        test = tob.new_test(tag, name)
+        nodes.append(scheduler.new_node(tag + " " + name, functools.partial(attempted, run, test, attempt),
+                                        deps, functools.partial(skipped, run, test)))
+        deps = [nodes[-1]['name']]
+
+    return nodes
+
+
+def attempted(run, test, attempt):
+    """Run a sub-test under its retry policy and record the outcome
+
+        :param run: run state for region being tested
+        :param test: sub-test object
+        :param attempt: callable taking the test object, returning True on success
+        :return: True if the sub-test succeeded
+    """
+    policy = scheduler.policy_for(run['policies'], test.tag, test.test)
+    ok = False
+    test.attempts = 0
+
+    def counted():
+        test.attempts += 1
+        return attempt(test)
+
+    try:
+        with recorded(run, test):
+            try:
+                ok = scheduler.retry(counted, policy)
+            except Exception as e:
+                # e.g. a browser dying mid sign in, recorded as the failure rather than left unexecuted
+                tob.fail(test, 'Error: ' + str(e).strip().split("\n")[0])
+    finally:
+        if not ok:
+            run['failure'] = True
 
+    return ok
+
+
+def skipped(run, test, dep):
+    """Record a sub-test skipped because a prerequisite failed
+
+        :param run: run state for region being tested
+        :param test: sub-test object
+        :param dep: name of the failed prerequisite
+    """
+    run['failure'] = True
+    test.message = 'Skipped, ' + dep + ' did not succeed'
+    rl.write(run['log'], test)
+
+
+def wait_ready(run, link):
+    """Poll an endpoint until it is ready, recording the time taken; testing goes ahead if it never is
+
+        :param run: run state for region being tested
+        :param link: url for page being tested as String
+        :return: True
+    """
+    seconds, _ = http.wait_for_ready(link, run['deadline'])
+    run['ready'][link] = seconds
+    if seconds is None:
+        print("WARNING: " + link + " not ready before deadline, testing anyway")
+
+    return True
+
+
+def open_log(run, prefix):
+    """Start streaming the region's results to a local log, flushed to the result bucket as the run goes
+
+        :param run: run state for region being tested
+        :param prefix: S3 folder test results are uploaded to
+    """
+    name = run['filename'][:-len(".json")]
+    run['log'] = rl.new_log(name + ".jsonl", run['bucket'], prefix + "stream/" + history.run_id() + "/" + name + "-")
+
+
+@contextmanager
+def recorded(run, test):
+    """Record a sub-test in the run's log when it completes, or as unexecuted if an error interrupts it
+
+        :param run: run state for region being tested
+        :param test: sub-test object
+        :return: context yielding the sub-test object
+    """
+    start = time.perf_counter()
+    try:
+        with tracing.span(test.tag + " " + test.test, 'test', region=run['region']):
+            yield test
+    finally:
+        test.elapsed = (time.perf_counter() - start) * 1000
+        rl.write(run['log'], test)
+
+
+def test_page(run, driver, link, key, test):
+    """Ensure proper, expected page is loaded for specific link
+
+        :param run: run state for region being tested
         :param driver: webdriver for Chrome page
         :param link: url for page being tested as String
         :param key: keyword to search for in page title
-        :param all_tests: list of all test dictionaries
-        :param btn_path: xpath to submit button
-        :return: populated test info object
+        :param test: get page test object
+        :return: True if the page was retrieved
     """
-    global FAILURE_FOUND
-
-    test = tob.new_test(key, 'get page attempt')
-    all_tests.append(test)
-    driver.get(link)
+    with tracing.span("driver.get", 'browser', url=link):
+        driver.get(link)
 
     if key in driver.title:
-        test = tob.success(test, 'Page retrieved successfully')
-    else:
-        test = tob.fail(test, 'Page could not be retrieved properly')
-
-    # populate page info for test and record in overall test info
-    test = tob.add_response(test, link, driver)
-
-    all_tests.pop()
-    all_tests.append(test)
-    
-    # test sign in upon tob.successful access to page
-    if tob.get_sts(test) is 'SUCCESS':
-        test = tob.new_test(key, 'sign in attempt')
-        all_tests.append(test)
-        all_tests = sign_in(driver, link, btn_path, test, all_tests)
+        tob.success(test, 'Page retrieved successfully')
     else:
-        FAILURE_FOUND = True
+        tob.fail(test, 'Page could not be retrieved properly')
 
-    return all_tests
+    # populate page info for test, replacing that of an earlier attempt
+    del test.extra[:]
+    tob.add_response(test, link, driver, samples=run['samples'])
 
+    return tob.get_sts(test) == 'SUCCESS'
 
-def sign_in(driver, link, btn_path, test, all_tests):
+
+def sign_in(run, driver, link, btn_path, test):
     """Test sign in for page
 
+        :param run: run state for region being tested
         :param driver: webdriver for Chrome page
         :param link: url for page being tested as String
-        :param test: test associated with sign in
-        :param all_tests: list of all test dictionaries
         :param btn_path: xpath to submit button
-        :return: populated test info object
+        :param test: test associated with sign in
+        :return: True if signed in
     """
-    global FAILURE_FOUND
-
-    if "ATLAS" not in btn_path:
-        tag = tob.get_tag(test)
-        if "Jupyter" in tag:
-            tag = tag + "Lab"
-        test = tob.resolve_sts(test, wi.log_in(driver, USER, PASSW, link, btn_path, tag))
-        # perform second sign in attempt if first fails
-        if tob.get_sts(test) == 'FAILURE':
-            FAILURE_FOUND = True
-            test = tob.resolve_sts(test, wi.log_in(driver, USER, PASSW, link, btn_path, tag))
-        test = tob.add_response(test, link, driver)
-        all_tests.pop()
-        all_tests.append(test)
+    title = wi.login_form(tob.get_tag(test))[1]
+    tob.resolve_sts(test, wi.log_in(driver, run['user'], run['passw'], link, btn_path, title))
+
+    del test.extra[:]
+    tob.add_response(test, link, driver, samples=run['samples'])
+
+    return tob.get_sts(test) == 'SUCCESS'
+
+
+def probe_page(run, probe, link, key, test):
+    """Ensure proper, expected page is returned for specific link, without a browser
+
+        :param run: run state for region being tested
+        :param probe: http_probe state of the product
+        :param link: url for page being tested as String
+        :param key: keyword to search for in page title
+        :param test: get page test object
+        :return: True if the page was retrieved
+    """
+    resp = hp.navigate(probe, 'GET', link)
+
+    if key in resp['title']:
+        tob.success(test, 'Page retrieved successfully')
     else:
-        all_tests = atlas_test(USER, PASSW, link, all_tests, test)
+        tob.fail(test, 'Page could not be retrieved properly')
 
-    return all_tests
+    del test.extra[:]
+    tob.add_response(test, link, resp=resp)
 
+    return tob.get_sts(test) == 'SUCCESS'
 
-def atlas_test(user, passw, link, all_tests, test):
-    """Enter username and password then submit to log in, if sign in successful test cohort creation
 
-        :param user: username as String
-        :param passw: password as String
+def probe_sign_in(run, probe, link, test):
+    """Test sign in for page by posting its login form, without a browser
+
+        :param run: run state for region being tested
+        :param probe: http_probe state of the product, on the sign in page
         :param link: url for page being tested as String
-        :param all_tests: list of all test dictionaries
-        :param test: default sign in test object
-        :return: success String if log in completed, failure description String otherwise
+        :param test: test associated with sign in
+        :return: True if signed in
     """
-    global FAILURE_FOUND
+    title = wi.login_form(tob.get_tag(test))[1]
+    sts_msg, resp = hp.sign_in(probe, link, run['user'], run['passw'], title)
+    tob.resolve_sts(test, sts_msg)
 
-    full_link = link + "/WebAPI/user/login/db"
-    command = ("curl -c cookies.txt -v -s " + full_link + " 2>&1 -X POST -d \"rememberMe=true\" "
-               "-d \"login=" + user + "\" --data-urlencode \"password=" + passw + "\"")
+    del test.extra[:]
+    tob.add_response(test, resp['url'], resp=resp)
 
-    resp = wi.curl_cmd(command)
-    if 'error' in resp:
-        sts = '---'
-    else:
-        sts = wi.curl_http(command)
+    return tob.get_sts(test) == 'SUCCESS'
 
-    test = tob.add_response(test, link)
-    test = tob.set_http_sts(test, sts)
 
-    if sts != '200':
-        FAILURE_FOUND = True
-        if sts == '401':
-            test = tob.fail(test, 'Incorrect username or password')
-        elif sts == '403':
-            test = tob.fail(test, 'Forbidden')
-        else:
-            test = tob.fail(test, 'Unusual failure, see HTTP status code')
-    else:
-        test = tob.success(test, 'Sign in complete')
-
-    all_tests.pop()
-    all_tests.append(test)
-   
-    cohort_test = tob.new_test('ATLAS', 'create cohort attempt')
-    all_tests.append(cohort_test)
-
-    # attempt to create cohort if sign in is successful
-    if tob.get_sts(test) == 'SUCCESS':
-        cohort_test = create_cohort(command, user, link, cohort_test)
-        all_tests.pop()
-        all_tests.append(cohort_test)
+def atlas_sign_in(run, session, test):
+    """Sign in to ATLAS WebAPI, keeping the bearer token in the session for the cohort test
+
+        :param run: run state for region being tested
+        :param session: ATLAS session dict
+        :param test: sign in test object
+        :return: True if signed in
+    """
+    resp = atlas.login(session)
+    sts = resp['status']
+
+    del test.extra[:]
+    tob.add_response(test, resp['url'], resp=resp)
+
+    if sts == 200:
+        tob.success(test, 'Sign in complete')
+    elif sts == 401:
+        tob.fail(test, 'Incorrect username or password')
+    elif sts == 403:
+        tob.fail(test, 'Forbidden')
     else:
-        FAILURE_FOUND = True
+        tob.fail(test, 'Unusual failure, see HTTP status code')
 
-    return all_tests
+    return sts == 200
 
 
-def create_cohort(command, user, link, test):
-    """Enter username and password then submit to log in, if sign in successful test cohort creation
+def create_cohort(run, session, test):
+    """Create a cohort with the session's bearer token, checking the definition list concurrently
 
-        :param command: curl command to sign in to page
-        :param user: username as String
-        :param link: url for page being tested as String
-        :param test: test dict associated with creating cohort
-        :return: success String if log in completed, failure description String otherwise
+        :param run: run state for region being tested
+        :param session: signed in ATLAS session dict
+        :param test: test object associated with creating cohort
+        :return: True if the cohort was created
     """
+    cohort, name = atlas.cohort_payload(run['user'])
+
+    headers = atlas.auth_headers(session)
+    post_headers = dict(headers, **{'Content-Type': 'application/json'})
 
-    filename = 'cohort.json'
-    dt_string = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-    with open(filename, 'r') as file:
-        cohort = json.load(file)
-        # ensure file isn't empty
-        if os.path.getsize(filename) == 0:
-            print("ERROR: Empty cohort definition file.. cannot create cohort")
-            exit(-1)
-        name = cohort['name']
-        cohort['name'] = name + " " + dt_string
-        cohort['createdBy'] = user
-        cohort['createdDate'] = dt_string
-        cohort['modifiedBy'] = user
-        cohort['modifiedDate'] = dt_string
-
-    # save backup of cohort file before removing
-    backup = 'backup-' + filename
-    shutil.copyfile(filename, backup)
-    os.remove(filename)
-
-    with open(filename, 'w+') as file:
-        json.dump(cohort, file)
-
-    bearer = "TOKEN=`" + command + " | grep -i bearer | cut -d ' ' -f 3` ; "
-    dest = link + "/WebAPI/cohortdefinition -H \"Authorization: Bearer $TOKEN\""
-    cohort_command = (bearer + "curl -v -b cookies.txt -H \"Content-Type: application/json\" -X POST -d @cohort.json " +
-                      dest)
-    ret = wi.curl_cmd(cohort_command)
-
-    if name in str(ret):
-        test = tob.success(test, 'Cohort created')
+    dest = session['link'] + "/WebAPI/cohortdefinition"
+    ret, resp = http.fetch_all([('POST', dest, json.dumps(cohort), post_headers),
+                             ('GET', dest, None, headers)])
+
+    if name in ret['body'].decode('utf-8', 'replace'):
+        tob.success(test, 'Cohort created')
     else:
-        test = tob.fail(test, 'Unable to create cohort')
+        tob.fail(test, 'Unable to create cohort')
 
     # include page response info
-    test = tob.add_response(test, link + "/WebAPI/cohortdefinition")
-    test = tob.set_http_sts(test, wi.http_status(bearer, "-b cookies.txt " + dest))
+    del test.extra[:]
+    tob.add_response(test, dest, resp=resp)
 
-    return test
+    return tob.get_sts(test) == 'SUCCESS'
 
 
-def upload_to_s3(objs, file, path):
-    """Create json file to be uploaded to s3
+@tracing.traced('aws')
+def upload_to_s3(run, file, path):
+    """Close the run's result log, write the json result file from it and upload it to s3
 
-        :param objs: dictionary of test output
+        :param run: run state for region being tested
         :param file: name of file to write json to
         :param path: path to object in s3 bucket
+        :return: dict of results recorded and failures
     """
-
-    output = {'Page Access Info': objs}
+    extra = {'Time To Ready (s)': run['ready']} if run['ready'] else None
 
     # create json file for test output info
-    with open(file, "w+") as write_file:
-        json.dump(output, write_file)
+    summary = rl.close(run['log'], file, extra)
+    aws.upload_file(file, run['bucket'], path)
 
-    aws.upload_file(file, BUCKET, path)
+    return summary
 
 
 def build_outputs(endpoint, region):
@@ -283,59 +473,306 @@ def build_outputs(endpoint, region):
     return [r_output, j_output, a_output]
 
 
-def parse_args():
-    """Parse arguments for running test
+def parse_regions(region, config):
+    """Expand region argument into list of regions to test
 
-        :return: parser for args
+        :param region: single region, comma separated regions, or "ALL" as String
+        :param config: path to taskcat project config listing all project regions
+        :return: list of regions as Strings
+    """
+    if region.upper() == "ALL":
+        with open(config, 'r') as f:
+            doc = yaml.load(f, Loader=YAML_LOADER)
+        return doc['project']['regions']
+
+    return [r.strip() for r in region.split(",") if r.strip()]
+
+
+def scenario_endpoints(config):
+    """Find the endpoint deployed to each region by single region test scenarios, as written by insert_vars.py -matrix
+
+        :param config: path to taskcat project config
+        :return: dict of region to EBEndpoint, empty if config does not exist
     """
+    if not os.path.exists(config):
+        return {}
+
+    with open(config, 'r') as f:
+        doc = yaml.load(f, Loader=YAML_LOADER)
+
+    endpoints = {}
+    for scenario in (doc.get('tests') or {}).values():
+        regions = scenario.get('regions', [])
+        if len(regions) == 1 and scenario.get('parameters', {}).get('EBEndpoint'):
+            endpoints[regions[0]] = scenario['parameters']['EBEndpoint']
+
+    return endpoints
+
+
+def project_name(config):
+    """Read the taskcat project name, which taskcat tags every stack it launches with
+
+        :param config: path to taskcat project config
+        :return: project name as String
+    """
+    with open(config, 'r') as f:
+        doc = yaml.load(f, Loader=YAML_LOADER)
+
+    return doc['project']['name']
+
+
+def run_region(args, region, pool, deadline=None, endpoint=None, stack=None):
+    """Perform test specified by args against a single region
+
+        :param args: parsed command line arguments
+        :param region: region to test as String
+        :param pool: driver pool shared by all regions
+        :param deadline: optional time.monotonic() deadline for endpoints to become ready
+        :param endpoint: optional endpoint deployed to region, overriding args.endpoint
+        :param stack: optional stack found by discovery.discover(), whose outputs are tested instead of urls built
+                      from the endpoint name
+        :return: run state dict and test output list
+    """
+    with tracing.span("region " + region, 'region', test=args.test):
+        if stack is not None:
+            endpoint = discovery.stack_parameters(stack).get('EBEndpoint') or endpoint
+        run = new_run(endpoint or args.endpoint, region, args.user, args.passw, args.bucket, deadline, args.samples,
+                      args.policies, args.probe)
+
+        if stack is not None:
+            pages = discovery.page_outputs(discovery.stack_outputs(stack['StackId'], region))
+        else:
+            pages = build_outputs(run['endpoint'], region)
+
+        def product(key):
+            if stack is not None:
+                return discovery.product_output(pages, key)
+            return tob.key_url(key, run['endpoint'], region)
+
+        if args.test == "load":
+            if args.target == "redcap":
+                outputs, prefix = [product("REDCap")], "redcap/"
+            else:
+                outputs, prefix = pages, "odshi-on-aws/"
+            return run, lt.run_load(run, outputs, pool, args.users, args.ramp, args.iterations, prefix)
+
+        if args.test == "cohort":
+            output = product("ATLAS")
+            return run, cb.run_bench(run, output["OutputValue"], args.cohorts, args.concurrency, "odshi-on-aws/",
+                                     args.source, args.generate_timeout)
+
+        if args.test == "redcap":
+            return run, red_test(run, product("REDCap"), pool)
 
+        return run, test_pages(run, pages, pool)
+
+
+def build_parser():
+    """Build the parser for test arguments, shared with pipeline_watch.py
+
+        :return: argparse.ArgumentParser
+    """
     parser = argparse.ArgumentParser()
     parser.add_argument("endpoint", type=str, help="endpoint name for parent stack (str)")
-    parser.add_argument("region", type=str, help="region deployed in (str) [default: us-east-1]", default="us-east-1")
+    parser.add_argument("region", type=str, help="region deployed in (str), comma separated regions or \"ALL\" for "
+                        "every project region [default: us-east-1]", default="us-east-1")
     parser.add_argument("user", type=str, help="username for accessing resources")
     parser.add_argument("passw", type=str, help="password for accessing resources")
     parser.add_argument("bucket", type=str, help="name of S3 bucket fot storing test results")
-    parser.add_argument("-test", type=str, help="test being performed (str) from set {\"ohdsi\", \"redcap\"} [default: "
-                        "ohdsi]", default="ohdsi")
+    parser.add_argument("-test", type=str, help="test being performed (str) from set {\"ohdsi\", \"redcap\", \"load\", "
+                        "\"cohort\"} [default: ohdsi]", default="ohdsi")
+    parser.add_argument("-target", type=str, help="solution put under load by -test=load (str) from set {\"ohdsi\", "
+                        "\"redcap\"} [default: ohdsi]", default="ohdsi")
+    parser.add_argument("-users", type=int, help="concurrent virtual users for -test=load (int) [default: 10]",
+                        default=10)
+    parser.add_argument("-ramp", type=float, help="seconds over which virtual users start for -test=load (float) "
+                        "[default: 30]", default=30)
+    parser.add_argument("-iterations", type=int, help="sign in flows per virtual user for -test=load (int) "
+                        "[default: 5]", default=5)
+    parser.add_argument("-cohorts", type=int, help="cohort definitions created and generated per region for "
+                        "-test=cohort (int) [default: 20]", default=20)
+    parser.add_argument("-concurrency", type=int, help="cohort definitions in flight at once for -test=cohort (int) "
+                        "[default: 5]", default=5)
+    parser.add_argument("-source", type=str, help="source key cohorts are generated against for -test=cohort (str) "
+                        "[default: first source with CDM and Results daimons]", default=None)
+    parser.add_argument("-generate-timeout", type=int, help="max seconds to wait for each cohort generation for "
+                        "-test=cohort (int) [default: 600]", default=600)
+    parser.add_argument("-workers", type=int, help="max number of regions tested concurrently (int) [default: 4]",
+                        default=4)
+    parser.add_argument("-max-browsers", type=int, help="max headless browsers open at once, shared by every region "
+                        "(int) [default: 12]", default=12)
+    parser.add_argument("-config", type=str, help="taskcat project config listing regions, and the endpoint of each "
+                        "single region scenario (str) [default: .taskcat.yml]", default=".taskcat.yml")
+    parser.add_argument("-wait-for-ready", type=int, help="poll endpoints for up to this many seconds and test each as "
+                        "soon as it is healthy (int) [default: 0, test immediately]", default=0)
+    parser.add_argument("-samples", type=int, help="page timing samples taken per page by reloading it (int) "
+                        "[default: 1]", default=1)
+    parser.add_argument("-secret", type=str, help="Secrets Manager secret holding the credentials, user and passw "
+                        "are then read as keys of its JSON value (str)", default=None)
+    parser.add_argument("-secret-region", type=str, help="region the -secret is stored in (str) [default: us-east-1]",
+                        default="us-east-1")
+    parser.add_argument("-url-template", type=str, help="url of each endpoint with {endpoint} and {region} fields, "
+                        "e.g. as printed by local_stack.py (str) [default: Elastic Beanstalk urls]", default=None)
+    parser.add_argument("-discover", action="store_true", help="test the urls output by the taskcat stack deployed "
+                        "to each region instead of urls built from the endpoint name")
+    parser.add_argument("-project", type=str, help="taskcat project whose stacks -discover searches (str) "
+                        "[default: project name in -config]", default=None)
+    parser.add_argument("-local-aws", action="store_true", help="keep results in in-memory S3 and Secrets Manager "
+                        "stand-ins instead of AWS")
+    parser.add_argument("-probe", type=str, help="how pages are signed into (str) from set {\"browser\", \"http\"}, "
+                        "http posts login forms without a browser except for products that need JavaScript "
+                        "[default: browser]", default="browser")
+    parser.add_argument("-retry-policies", type=str, help="JSON file of retry policies per sub-test, see "
+                        "scheduler.py (str) [default: one immediate sign in retry]", default=None)
+    parser.add_argument("-trace", type=str, help="write timing spans to this Chrome trace file and upload it next to "
+                        "the results (str)", default=None)
+    parser.add_argument("-profile", type=str, help="sample the stacks of every thread and write them to this folded "
+                        "stack file (str)", default=None)
+    parser.add_argument("-profile-interval", type=float, help="ms between stack samples for -profile (float) "
+                        "[default: 10]", default=10)
+
+    return parser
 
-    return parser.parse_args()
 
+def parse_args():
+    """Parse arguments for running test
 
-def main(args):
-    args = parse_args()
+        :return: parser for args
+    """
+    return build_parser().parse_args()
 
-    # set global values here, not to be altered elsewhere
-    global USER
-    global PASSW
-    USER = args.user
-    PASSW = args.passw
 
-    global BUCKET
-    BUCKET = args.bucket
-    filename = "test_output_" + args.region + ".json"
+def prepare(args):
+    """Check arguments and set up what every region worker shares: stand-ins, tracing, credentials and retry policies
 
-    # exceptions raised in this file will be caught here before exiting
-    try:
-        # perform proper test specified and print output to terminal
-        if args.test == "redcap":
-            output = tob.key_url("REDCap", args.endpoint, args.region)
-            print(red_test(output, filename))
-        elif args.test == "ohdsi":
-            outputs = build_outputs(args.endpoint, args.region)
-            print(test_pages(outputs, filename))
-        else:
-            print("ERROR - Unknown test \"" + args.test + "\" (run with -h for help)")
-            exit(-1)
-    except EnvironmentError as ee:
-        print("ERROR occurred creating cohort: ")
-        print(ee)
+        :param args: parsed command line arguments, updated with the credentials and policies
+        :return: stack sampler started for -profile, None without it
+    """
+    if args.test not in ("ohdsi", "redcap", "load", "cohort"):
+        print("ERROR - Unknown test \"" + args.test + "\" (run with -h for help)")
         exit(-1)
-    except Exception as e:
-        print(e)
+    if args.probe not in ("browser", "http"):
+        print("ERROR - Unknown probe \"" + args.probe + "\" (run with -h for help)")
         exit(-1)
 
-    global FAILURE_FOUND
-    if FAILURE_FOUND is True:
+    if args.url_template:
+        tob.URL_TEMPLATE = args.url_template
+    if args.local_aws:
+        import local_aws
+        local_aws.install()
+    if args.trace:
+        tracing.enable()
+    sampler = tracing.start_sampler(args.profile_interval / 1000) if args.profile else None
+
+    # credentials are fetched once and shared by every region worker
+    if args.secret:
+        secret = json.loads(aws.get_secret(args.secret, args.secret_region))
+        args.user, args.passw = secret[args.user], secret[args.passw]
+
+    args.policies = scheduler.load_policies(args.retry_policies)
+
+    return sampler
+
+
+def browser_count(args, workers):
+    """Number of browsers to launch up front for the test being run, and the most the pool may grow to
+
+        Browsers are reused by every region, one per product tested concurrently, one per virtual user under load and
+        none for the cohort benchmark, which only calls WebAPI. Probing over http only RStudio needs a browser. One
+        browser per region is launched up front and the rest only when every browser is in use, never more than
+        -max-browsers.
+
+        :param args: parsed command line arguments
+        :param workers: regions tested at once
+        :return: browsers launched up front and max browsers as int tuple
+    """
+    if args.probe == "http":
+        browsers = {"ohdsi": workers, "redcap": 0, "load": workers * args.users if args.target == "ohdsi" else 0}
+    else:
+        browsers = {"ohdsi": workers * 3, "redcap": workers, "load": workers * args.users}
+
+    limit = min(browsers.get(args.test, 0), max(0, args.max_browsers))
+    return min(workers, limit), limit
+
+
+def start_browsers(args, workers, sampler):
+    """Launch the browser pool, ending the run with an error if Chrome cannot be started
+
+        :param args: parsed command line arguments
+        :param workers: regions tested at once
+        :param sampler: sampler returned by prepare()
+        :return: driver pool dict
+    """
+    try:
+        return dp.new_pool(*browser_count(args, workers))
+    except WebDriverException as e:
+        print("ERROR - Could not start browsers: " + str(e).strip())
+        finish(args, sampler)
+        exit(-1)
+
+
+def finish(args, sampler):
+    """Close pooled connections, then write the stack samples and trace, uploading the trace next to the results
+
+        :param args: parsed command line arguments
+        :param sampler: sampler returned by prepare()
+    """
+    http.close_all()
+    if sampler is not None:
+        print(str(tracing.stop_sampler(sampler, args.profile)) + " stack samples written to " + args.profile)
+    if args.trace:
+        redcap = args.test == "redcap" or (args.test == "load" and args.target == "redcap")
+        prefix = "redcap/" if redcap else "odshi-on-aws/"
+        print(str(tracing.write(args.trace)) + " spans written to " + args.trace)
+        aws.upload_file(args.trace, args.bucket, prefix + os.path.basename(args.trace))
+
+
+def main(args):
+    args = parse_args()
+    sampler = prepare(args)
+
+    regions = parse_regions(args.region, args.config)
+    endpoints = scenario_endpoints(args.config)
+    workers = max(1, min(args.workers, len(regions)))
+    stacks = {}
+    if args.discover:
+        stacks = discovery.discover(regions, args.project or project_name(args.config), endpoints, len(regions))
+    deadline = time.monotonic() + args.wait_for_ready if args.wait_for_ready > 0 else None
+    failure_found = False
+
+    drivers = start_browsers(args, workers, sampler)
+    try:
+        # each worker gets its own run state, cookie jar and result file
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for region in regions:
+                if args.discover and stacks[region] is None:
+                    print("ERROR - No deployed stack found in " + region)
+                    failure_found = True
+                else:
+                    futures[region] = pool.submit(run_region, args, region, drivers, deadline, endpoints.get(region),
+                                                  stacks.get(region))
+
+            # exceptions raised for a region will be caught here so remaining regions still report
+            for region, future in futures.items():
+                try:
+                    run, output = future.result()
+                    print(region + ": " + str(output))
+                    failure_found = failure_found or run['failure']
+                except EnvironmentError as ee:
+                    print("ERROR occurred creating cohort in " + region + ": ")
+                    print(ee)
+                    failure_found = True
+                except Exception as e:
+                    print("ERROR occurred testing " + region + ": ")
+                    print(e)
+                    failure_found = True
+    finally:
+        # browsers are closed whatever happened to the regions, so no Chrome process outlives the run
+        dp.close_pool(drivers)
+    finish(args, sampler)
+
+    if failure_found is True:
         exit(-1)
 
 
@@ -0,0 +1,174 @@
+""" Versions:     python v. 3.x
+
+    Timing spans for the test scripts, used by tests.py, web_interact.py, aws_interact.py and get_test_results.py.
+    Nested spans are recorded per thread while tracing is enabled and written in the Chrome trace event format, which
+    chrome://tracing, Perfetto and speedscope open directly, so a slow build shows whether time went to browser start
+    up, page loads, sign in waits, HTTP requests or uploads. Recording is off by default and costs one dict lookup per
+    span when off. An optional sampling profiler records the stacks of every harness thread as folded stacks.
+
+    usage: python3 tests.py ... -trace=<trace.json> -profile=<sample interval ms>
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE = {'enabled': False,
+         'lock': threading.Lock(),
+         'origin': time.perf_counter(),
+         'events': [],
+         'threads': {}
+         }
+
+
+def enable():
+    """Start recording spans, discarding any recorded earlier"""
+    with TRACE['lock']:
+        TRACE['origin'] = time.perf_counter()
+        TRACE['events'] = []
+        TRACE['threads'] = {}
+        TRACE['enabled'] = True
+
+
+def disable():
+    """Stop recording spans"""
+    TRACE['enabled'] = False
+
+
+def microseconds(counter):
+    return round((counter - TRACE['origin']) * 1000000, 1)
+
+
+@contextmanager
+def span(name, cat='harness', **args):
+    """Record the time taken by the enclosed block as a span, nested under any span open on the same thread
+
+        :param name: name of span as String
+        :param cat: category of span, e.g. "browser", "http" or "aws"
+        :param args: optional details shown with the span, e.g. region or url
+        :return: context
+    """
+    if not TRACE['enabled']:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        thread = threading.current_thread()
+        event = {'name': name,
+                 'cat': cat,
+                 'ph': 'X',
+                 'ts': microseconds(start),
+                 'dur': round((end - start) * 1000000, 1),
+                 'pid': os.getpid(),
+                 'tid': thread.ident
+                 }
+        if args:
+            event['args'] = {key: str(value) for key, value in args.items()}
+        with TRACE['lock']:
+            TRACE['events'].append(event)
+            TRACE['threads'][thread.ident] = thread.name
+
+
+def traced(cat='harness', name=None):
+    """Decorate a function so each call is recorded as a span
+
+        :param cat: category of span
+        :param name: name of span [default: function name]
+        :return: decorator
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__, cat):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def write(path):
+    """Write the spans recorded so far as a Chrome trace file
+
+        :param path: trace file
+        :return: number of spans written
+    """
+    with TRACE['lock']:
+        events = list(TRACE['events'])
+        threads = dict(TRACE['threads'])
+
+    # thread names label each track in trace viewers
+    names = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': thread}}
+             for tid, thread in threads.items()]
+    with open(path, "w") as f:
+        json.dump({'traceEvents': names + sorted(events, key=lambda event: event['ts']),
+                   'displayTimeUnit': 'ms'}, f)
+
+    return len(events)
+
+
+def frame_stack(frame):
+    """Name the functions on a stack, outermost first
+
+        :param frame: innermost frame
+        :return: list of "function (file:line)" Strings
+    """
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(code.co_name + " (" + os.path.basename(code.co_filename) + ":" + str(frame.f_lineno) + ")")
+        frame = frame.f_back
+
+    return stack[::-1]
+
+
+def start_sampler(interval=0.01):
+    """Sample the stack of every other thread in a background thread until stop_sampler() is called
+
+        :param interval: seconds between samples
+        :return: sampler dict
+    """
+    sampler = {'interval': interval,
+               'stop': threading.Event(),
+               'stacks': {},
+               'samples': 0
+               }
+
+    def sample():
+        own = threading.get_ident()
+        while not sampler['stop'].wait(sampler['interval']):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stack = ";".join([names.get(ident, str(ident))] + frame_stack(frame))
+                    sampler['stacks'][stack] = sampler['stacks'].get(stack, 0) + 1
+            sampler['samples'] += 1
+
+    sampler['thread'] = threading.Thread(target=sample, name="trace-sampler", daemon=True)
+    sampler['thread'].start()
+
+    return sampler
+
+
+def stop_sampler(sampler, path):
+    """Stop sampling and write the samples as folded stacks, one "thread;outer;...;inner count" line per stack
+
+        :param sampler: sampler dict
+        :param path: folded stack file, opened by speedscope or flamegraph.pl
+        :return: number of samples taken
+    """
+    sampler['stop'].set()
+    sampler['thread'].join()
+
+    with open(path, "w") as f:
+        for stack, count in sorted(sampler['stacks'].items()):
+            f.write(stack + " " + str(count) + "\n")
+
+    return sampler['samples']
@@ -0,0 +1,280 @@
+""" Versions:     python v. 3.x
+
+    Incremental, concurrent upload of a directory tree to S3, used by buildspec.yml in place of
+    "aws s3 cp --recursive" to publish the dashboard and test results.
+    The bucket is listed once and each file's content hash is compared with the object's ETag, so only new or
+    changed files are sent. Files are uploaded concurrently through one pooled client, large files in parallel
+    parts, and JSON and HTML are gzipped before upload.
+
+    usage: python3 uploader.py <dir> <bucket> -prefix=<folder> -workers=<n> -private -raw
+           python3 uploader.py -bench -files=<n> -size=<KB> -latency=<ms>   (benchmark against a local S3 stand-in)
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor
+
+# matches the boto3 default, so the ETags computed here agree with those S3 gives multipart uploads
+PART_SIZE = 8 * 1024 * 1024
+COMPRESSED_TYPES = ('.json', '.html', '.htm')
+
+
+def etag(stream, part_size=PART_SIZE):
+    """Compute the ETag S3 gives an object uploaded with the transfer config used here
+
+        :param stream: readable binary file positioned at the start of the content
+        :param part_size: multipart threshold and part size in bytes
+        :return: ETag as String, quoted as S3 returns it
+    """
+    digests = []
+    size = 0
+    while True:
+        part = stream.read(part_size)
+        if not part and digests:
+            break
+        digests.append(hashlib.md5(part).digest())
+        size += len(part)
+        if len(part) < part_size:
+            break
+
+    if size < part_size:
+        return '"' + digests[0].hex() + '"'
+    return '"' + hashlib.md5(b''.join(digests)).hexdigest() + '-' + str(len(digests)) + '"'
+
+
+def compress(path):
+    """Gzip a file without a timestamp or name, so unchanged content always gives the same ETag
+
+        :param path: file to compress
+        :return: compressed content as bytes
+    """
+    buffer = io.BytesIO()
+    with open(path, 'rb') as f, gzip.GzipFile(filename='', mode='wb', fileobj=buffer, mtime=0) as gz:
+        shutil.copyfileobj(f, gz)
+
+    return buffer.getvalue()
+
+
+def extra_args(path, public=True, compressed=False):
+    """Object settings for a file
+
+        :param path: file to upload
+        :param public: whether the object is readable from the public dashboard
+        :param compressed: whether the content is gzipped
+        :return: dict of ExtraArgs
+    """
+    extra = {}
+    if public:
+        extra['ACL'] = 'public-read'
+    content_type = mimetypes.guess_type(path)[0]
+    if content_type:
+        extra['ContentType'] = content_type
+    if compressed:
+        extra['ContentEncoding'] = 'gzip'
+
+    return extra
+
+
+def remote_etags(client, bucket, prefix=''):
+    """List the ETag of every object under a prefix
+
+        :param client: S3 client
+        :param bucket: bucket name
+        :param prefix: key prefix
+        :return: dict of key to ETag
+    """
+    etags = {}
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            etags[obj['Key']] = obj['ETag']
+
+    return etags
+
+
+def upload(client, path, bucket, key, remote, config, public=True, raw=False):
+    """Upload a file unless the object already holds the same content
+
+        :param client: S3 client
+        :param path: file to upload
+        :param bucket: bucket name
+        :param key: object key
+        :param remote: dict of key to ETag of objects already in the bucket
+        :param config: TransferConfig for the upload
+        :param public: whether the object is readable from the public dashboard
+        :param raw: upload content as is, without compression
+        :return: bytes sent, 0 if the file was skipped
+    """
+    compressed = not raw and path.lower().endswith(COMPRESSED_TYPES)
+    if compressed:
+        body = compress(path)
+        tag = etag(io.BytesIO(body), config.multipart_chunksize)
+    else:
+        with open(path, 'rb') as f:
+            tag = etag(f, config.multipart_chunksize)
+
+    if remote.get(key) == tag:
+        return 0
+
+    extra = extra_args(path, public, compressed)
+    if compressed:
+        client.upload_fileobj(io.BytesIO(body), bucket, key, ExtraArgs=extra, Config=config)
+        return len(body)
+
+    client.upload_file(path, bucket, key, ExtraArgs=extra, Config=config)
+    return os.path.getsize(path)
+
+
+def sync(client, folder, bucket, prefix='', workers=8, public=True, raw=False):
+    """Upload every new or changed file in a directory tree
+
+        :param client: S3 client, shared by all workers
+        :param folder: local directory to upload
+        :param bucket: bucket name
+        :param prefix: key prefix objects are uploaded under
+        :param workers: files uploaded at once
+        :param public: whether objects are readable from the public dashboard
+        :param raw: upload content as is, without compression
+        :return: dict of files found, uploaded, skipped and bytes sent
+    """
+    files = {}
+    for root, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            files[prefix + os.path.relpath(path, folder).replace(os.sep, '/')] = path
+
+    remote = remote_etags(client, bucket, prefix)
+    # each file's parts share the connection pool with the other workers
+    config = TransferConfig(multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE,
+                            max_concurrency=max(1, workers // 2))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        sent = list(pool.map(lambda key: upload(client, files[key], bucket, key, remote, config, public, raw),
+                             files))
+
+    return {'files': len(files),
+            'uploaded': sum(1 for size in sent if size),
+            'skipped': sum(1 for size in sent if not size),
+            'bytes sent': sum(sent)
+            }
+
+
+def make_artifacts(folder, files, size):
+    """Write a tree resembling taskcat output: mostly JSON and HTML results with some binary files
+
+        :param folder: directory to write to
+        :param files: number of files
+        :param size: approx size of each file in KB
+    """
+    rand = random.Random(0)
+    for i in range(files):
+        sub = os.path.join(folder, 'region-' + str(i % 4))
+        os.makedirs(sub, exist_ok=True)
+        if i % 5 == 4:
+            with open(os.path.join(sub, 'capture_' + str(i) + '.png'), 'wb') as f:
+                f.write(bytes(rand.getrandbits(8) for _ in range(size * 1024)))
+            continue
+        entries = [{'tag': 'ATLAS', 'test': 'sign in attempt', 'status': 'SUCCESS',
+                    'extra': [{'http response time (ms)': rand.randint(50, 900)}]} for _ in range(size * 10)]
+        name = 'test_output_' + str(i) + ('.json' if i % 2 else '.html')
+        with open(os.path.join(sub, name), 'w') as f:
+            json.dump(entries, f)
+
+
+def benchmark(files, size, latency, bandwidth, workers):
+    """Compare a sequential upload with a new client per file against a pooled, incremental sync
+
+        :param files: number of files
+        :param size: approx size of each file in KB
+        :param latency: round trip per request in seconds
+        :param bandwidth: bytes per second over one connection
+        :param workers: files uploaded at once by sync
+        :return: dict of results per strategy
+    """
+    import local_aws
+
+    folder = tempfile.mkdtemp()
+    try:
+        make_artifacts(folder, files, size)
+        total = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names)
+        results = {}
+
+        store = local_aws.LocalS3(latency=latency, bandwidth=bandwidth)
+        start = time.perf_counter()
+        for root, _, names in os.walk(folder):
+            for name in names:
+                path = os.path.join(root, name)
+                store.client().upload_file(path, 'bench', os.path.relpath(path, folder), {'ACL': 'public-read'})
+        results['new client per file'] = (time.perf_counter() - start, dict(store.calls), store.bytes_sent)
+
+        store = local_aws.LocalS3(latency=latency, bandwidth=bandwidth, max_pool_connections=workers)
+        client = store.client()
+        for label in ('pooled sync, empty bucket', 'pooled sync, unchanged'):
+            calls, sent = dict(store.calls), store.bytes_sent
+            start = time.perf_counter()
+            sync(client, folder, 'bench', workers=workers)
+            results[label] = (time.perf_counter() - start,
+                              {op: n - calls.get(op, 0) for op, n in store.calls.items() if n - calls.get(op, 0)},
+                              store.bytes_sent - sent)
+    finally:
+        shutil.rmtree(folder)
+
+    report = {}
+    for label, (seconds, calls, sent) in results.items():
+        report[label] = {'seconds': round(seconds, 3),
+                         'throughput (MB/s)': round(total / seconds / 1e6, 2),
+                         'requests': calls,
+                         'bytes sent': sent
+                         }
+    return report
+
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", type=str, nargs="?", help="local directory to upload (str)")
+    parser.add_argument("bucket", type=str, nargs="?", help="name of S3 bucket to upload to (str)")
+    parser.add_argument("-prefix", type=str, help="folder in bucket to upload to (str) [default: bucket root]",
+                        default="")
+    parser.add_argument("-workers", type=int, help="files uploaded at once (int) [default: 8]", default=8)
+    parser.add_argument("-private", action="store_true", help="do not make uploaded objects publicly readable")
+    parser.add_argument("-raw", action="store_true", help="upload files as is, without gzipping JSON and HTML")
+    parser.add_argument("-bench", action="store_true", help="benchmark against a local S3 stand-in instead")
+    parser.add_argument("-files", type=int, help="benchmark files (int) [default: 200]", default=200)
+    parser.add_argument("-size", type=int, help="benchmark file size in KB (int) [default: 64]", default=64)
+    parser.add_argument("-latency", type=float, help="benchmark request round trip in ms (float) [default: 20]",
+                        default=20)
+    parser.add_argument("-bandwidth", type=float, help="benchmark MB/s per connection (float) [default: 10]",
+                        default=10)
+    args = parser.parse_args()
+
+    if args.bench:
+        report = benchmark(args.files, args.size, args.latency / 1000, args.bandwidth * 1e6, args.workers)
+        print(json.dumps(report, indent=2))
+        return
+
+    if not args.folder or not args.bucket:
+        parser.error("folder and bucket are required unless -bench is given")
+
+    import aws_interact as aws
+
+    prefix = args.prefix.strip("/") + "/" if args.prefix.strip("/") else ""
+    start = time.perf_counter()
+    result = sync(aws.get_client('s3'), args.folder, args.bucket, prefix, args.workers, not args.private,
+                  args.raw)
+    print(str(result['uploaded']) + " of " + str(result['files']) + " files uploaded (" + str(result['skipped']) +
+          " unchanged), " + str(result['bytes sent']) + " bytes in " + str(round(time.perf_counter() - start, 2)) +
+          "s")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
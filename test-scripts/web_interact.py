@@ -2,19 +2,71 @@
     Versions:     python v. 3.x
 
     Includes all logic for interacting with web pages, used by tests.py and test_objects.py
-    Enables sign in to weg pages, gathering status codes and response times, and running curl commands.
+    Enables sign in to weg pages and gathering status codes and response times from the browser's own navigation.
 """
 
-import subprocess
+import json
+import os
+import threading
+import tracing
 from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
 from selenium import webdriver
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as ec
 
+# driver binary installs are not safe to run concurrently when several regions are tested at once
+INSTALL_LOCK = threading.Lock()
+DRIVER_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "chromedriver-path")
 
+# xpath to submit button and page title expected after sign in, for each product signed into with a login form
+LOGIN_FORMS = {'RStudio': ("//button[@type='submit']", "RStudio"),
+               'Jupyter': ("//input[@id='login_submit']", "JupyterLab"),
+               'REDCap': ("//button[@id='login_btn']", "REDCap")
+               }
+
+
+def login_form(key):
+    """Find login form details for a product
+
+        :param key: output key naming the product
+        :return: submit button xpath and expected title as String tuple, None if product has no login form
+    """
+    for product, form in LOGIN_FORMS.items():
+        if product in key:
+            return form
+
+    return None
+
+
+@tracing.traced('browser')
+def driver_path():
+    """Resolve chromedriver binary, installing it only if no cached binary is recorded on disk
+
+        :return: path to chromedriver binary as String
+    """
+    with INSTALL_LOCK:
+        try:
+            with open(DRIVER_CACHE, 'r') as f:
+                path = f.read().strip()
+            if os.access(path, os.X_OK):
+                return path
+        except EnvironmentError:
+            pass
+
+        path = ChromeDriverManager().install()
+
+        os.makedirs(os.path.dirname(DRIVER_CACHE), exist_ok=True)
+        with open(DRIVER_CACHE, 'w') as f:
+            f.write(path)
+
+    return path
+
+
+@tracing.traced('browser')
 def chrome_driver():
     """Configure and create headless Google Chrome browser driver
 
@@ -31,79 +83,159 @@ def chrome_driver():
     options.add_argument("--disable-infobars")
     options.add_argument("--disable-dev-shm-usage")
 
-    return webdriver.Chrome(ChromeDriverManager().install(), options=options)
+    # record network events so status codes and timings come from the browser's own requests
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
+    return webdriver.Chrome(service=Service(driver_path()), options=options)
 
-def http_status(prereq, link):
-    """Retrieve http response from page directly
 
-        :param prereq: command to perform before getting http status
-        :param link: url for page being tested as String
-        :return: http status code as String
+def drain_log(driver):
+    """Discard buffered network events so the next navigation record only covers new requests
+
+        :param driver: webdriver for Chrome page
     """
-    cmd = prereq + "curl -s -o /dev/null -w \"%{http_code}\" " + link
-    ret = curl_cmd(cmd)
-    ret = ret.replace('b', '')
-    ret = ret.replace('\'', '')
+    driver.get_log('performance')
 
-    return ret
 
+def navigation(driver):
+    """Build response record for the latest page navigation from the browser's network events
 
-def curl_http(command):
-    """Retrieve http response from output of curl command
+        Covers every navigation since the log was last read, following the redirect chain of the most recent main
+        frame document request.
 
-        :param command: curl command being run
-        :return: http status code as String
+        :param driver: webdriver for Chrome page
+        :return: dict with url, http status, redirects, timings and transfer size, None if no navigation was logged
     """
-    ret = curl_cmd(command)
-    return parse_http_sts(ret)
+    documents = {}
+    main_frame = None
+    latest = None
+
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        method = message.get('method')
+        params = message.get('params', {})
+        request_id = params.get('requestId')
+
+        if method == 'Network.requestWillBeSent' and request_id == params.get('loaderId'):
+            main_frame = main_frame or params.get('frameId')
+            if params.get('frameId') != main_frame:
+                continue
+            record = documents.setdefault(request_id, {'url': None,
+                                                       'http status': None,
+                                                       'redirects': [],
+                                                       'timing (ms)': {},
+                                                       'transfer size (bytes)': None})
+            # a redirect is logged as a new request carrying the response that caused it
+            if 'redirectResponse' in params:
+                record['redirects'].append({'url': params['redirectResponse']['url'],
+                                            'http status': params['redirectResponse']['status']})
+            record['url'] = params['request']['url']
+            latest = request_id
+        elif method == 'Network.responseReceived' and request_id in documents:
+            response = params['response']
+            documents[request_id]['url'] = response['url']
+            documents[request_id]['http status'] = response['status']
+            documents[request_id]['timing (ms)'] = network_timing(response.get('timing'))
+        elif method == 'Network.loadingFinished' and request_id in documents:
+            documents[request_id]['transfer size (bytes)'] = params.get('encodedDataLength')
+
+    return documents.get(latest)
+
+
+def network_timing(timing):
+    """Convert DevTools resource timing into phase durations
+
+        :param timing: DevTools ResourceTiming dict, offsets in ms from request start (-1 when phase not used)
+        :return: dict of phase durations in milliseconds
+    """
+    if not timing:
+        return {}
+
+    def phase(start, end):
+        if timing.get(start, -1) < 0 or timing.get(end, -1) < 0:
+            return None
+        return timing[end] - timing[start]
+
+    return {'dns': phase('dnsStart', 'dnsEnd'),
+            'connect': phase('connectStart', 'connectEnd'),
+            'tls': phase('sslStart', 'sslEnd'),
+            'wait': phase('sendEnd', 'receiveHeadersEnd'),
+            'headers received': timing.get('receiveHeadersEnd')
+            }
+
+
+# single round trip returning Navigation Timing Level 2 and Resource Timing entries, falling back to Level 1 timing
+TIMING_SCRIPT = """
+var nav = performance.getEntriesByType('navigation')[0];
+if (!nav) {
+    var t = performance.timing, start = t.navigationStart;
+    nav = {startTime: 0, domainLookupStart: t.domainLookupStart - start, domainLookupEnd: t.domainLookupEnd - start,
+           connectStart: t.connectStart - start, connectEnd: t.connectEnd - start,
+           secureConnectionStart: t.secureConnectionStart ? t.secureConnectionStart - start : 0,
+           requestStart: t.requestStart - start, responseStart: t.responseStart - start,
+           responseEnd: t.responseEnd - start, domInteractive: t.domInteractive - start,
+           domComplete: t.domComplete - start, loadEventEnd: t.loadEventEnd - start};
+} else {
+    nav = nav.toJSON();
+}
+var resources = performance.getEntriesByType('resource').map(function (r) {
+    return {transferSize: r.transferSize || 0, duration: r.duration};
+});
+return {nav: nav, resources: resources};
+"""
 
 
-def curl_cmd(command):
-    """Perform command in shell subprocess
+def page_timing(driver):
+    """Record full page load timing breakdown in a single script call
 
-        :param command: command being run
-        :return: output from command
+        :param driver: webdriver for Chrome page
+        :return: dict of timings in milliseconds and sizes in bytes as numbers
     """
-    try:
-        ret = subprocess.check_output(command, shell=True)
-    except Exception as e:
-        print(e)
-        return str(e)
-    return str(ret)
-
+    entries = driver.execute_script(TIMING_SCRIPT)
+    nav = entries['nav']
+    resources = entries['resources']
 
-def parse_http_sts(ret):
-    """Parse http status from text
+    def span(start, end):
+        return max(0, nav.get(end, 0) - nav.get(start, 0))
 
-        :param ret: text output from terminal command
-        :return: http status code as String
-    """
-    token = "HTTP/1.1 "
-    i = ret.find(token)
-    start = i + len(token)
+    tls_start = nav.get('secureConnectionStart', 0)
 
-    return ret[int(start):int(start + 3)]
+    return {'dns': span('domainLookupStart', 'domainLookupEnd'),
+            'tcp': span('connectStart', 'connectEnd'),
+            'tls': nav['connectEnd'] - tls_start if tls_start > 0 else 0,
+            'ttfb': span('startTime', 'responseStart'),
+            'download': span('responseStart', 'responseEnd'),
+            'dom interactive': span('startTime', 'domInteractive'),
+            'dom complete': span('startTime', 'domComplete'),
+            'load event': span('startTime', 'loadEventEnd'),
+            'transfer size': nav.get('transferSize', 0),
+            'resource count': len(resources),
+            'resource transfer size': sum(r['transferSize'] for r in resources)
+            }
 
 
-def response(driver):
-    """Record page response time
+@tracing.traced('browser')
+def timing_samples(driver, samples):
+    """Record page timing for the current page, reloading it to gather additional samples
 
         :param driver: webdriver for Chrome page
-        :return: front, back end response times in milliseconds as Strings
+        :param samples: total number of samples to take
+        :return: list of page timing dicts
     """
+    timings = [page_timing(driver)]
 
-    nav_start = driver.execute_script("return window.performance.timing.navigationStart")
-    resp_start = driver.execute_script("return window.performance.timing.responseStart")
-    dom_complete = driver.execute_script("return window.performance.timing.domComplete")
+    for _ in range(samples - 1):
+        driver.refresh()
+        timings.append(page_timing(driver))
 
-    # compute front end and back end response times
-    front = resp_start - nav_start
-    back = dom_complete - resp_start
+    # reloads are not part of the next navigation being recorded
+    if samples > 1:
+        drain_log(driver)
 
-    return str(front), str(back)
+    return timings
 
 
+@tracing.traced('browser')
 def log_in(driver, user, passw, link, btn_path, title):
     """Enter username and password then submit to log in
 
@@ -126,10 +258,11 @@ def log_in(driver, user, passw, link, btn_path, title):
         return 'FAILURE', 'Unable to access page elements'
 
     try:
-        WebDriverWait(driver, 20).until(ec.url_changes(link))
-        WebDriverWait(driver, 20).until(ec.title_is(title))
+        with tracing.span("WebDriverWait", 'browser', url=link):
+            WebDriverWait(driver, 20).until(ec.url_changes(link))
+            WebDriverWait(driver, 20).until(ec.title_is(title))
     except TimeoutException as e:
-        print("Timeout occurred (" + e + ") while attempting to sign in to " + driver.current_url)
+        print("Timeout occurred (" + str(e) + ") while attempting to sign in to " + driver.current_url)
         if "Sign In" in driver.title or "invalid user" in driver.page_source.lower():
             return 'FAILURE', 'Incorrect username or password'
         else:
@@ -0,0 +1,32 @@
+""" Versions:     python v. 3.x
+
+    Shared set up for the unit tests of test-scripts/ and insert_vars.py, run with python3 -m pytest tests.
+    Modules that need boto3 or selenium are skipped where those are not installed, rather than stubbed.
+"""
+
+import os
+import sys
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.join(REPO, 'test-scripts'))
+
+
+@pytest.fixture
+def local_clients():
+    """Route aws_interact clients to the local_aws stand-ins for one test
+
+        :return: dict of service name to stand-in
+    """
+    pytest.importorskip('boto3')
+    import aws_interact as aws
+    import local_aws
+
+    factory = aws.CLIENT_FACTORY
+    clients = local_aws.install()
+    yield clients
+
+    with aws.CLIENTS_LOCK:
+        aws.CLIENTS.clear()
+        aws.CLIENT_FACTORY = factory
@@ -0,0 +1,72 @@
+""" Versions:     python v. 3.x
+
+    Tests of the history store: one gzip member appended per run, and trends read back across members.
+"""
+
+import gzip
+import history
+
+METRIC = 'http response time (ms)'
+
+
+def results(elapsed, region='us-east-1'):
+    return {region: ('', [{'tag': 'ATLAS', 'test': 'get page', 'status': 'SUCCESS', 'elapsed (ms)': 5,
+                           'extra': [{'http status': 200, METRIC: elapsed}]}])}
+
+
+def test_each_run_is_appended_as_its_own_gzip_member(tmp_path):
+    path = str(tmp_path / 'results.csv.gz')
+
+    assert history.record(path, 'run-1', results(100), when='2020-01-01T00:00:00Z') == 4
+    with open(path, 'rb') as f:
+        first = f.read()
+    history.record(path, 'run-2', results(200), when='2020-01-08T00:00:00Z')
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # earlier runs are never rewritten
+    assert data.startswith(first)
+    assert data[len(first):len(first) + 2] == b'\x1f\x8b'
+    with gzip.open(path, 'rt') as f:
+        assert len(f.read().splitlines()) == 8
+
+
+def test_rows_stream_every_member_in_order_with_numeric_values(tmp_path):
+    path = str(tmp_path / 'results.csv.gz')
+    history.record(path, 'run-1', results(100))
+    history.record(path, 'run-2', results(200))
+
+    rows = [row for row in history.rows(path) if row['metric'] == METRIC]
+
+    assert [(row['run'], row['value']) for row in rows] == [('run-1', 100.0), ('run-2', 200.0)]
+
+
+def test_rows_of_a_missing_store_are_empty(tmp_path):
+    assert list(history.rows(str(tmp_path / 'missing.csv.gz'))) == []
+
+
+def test_trend_returns_the_most_recent_runs_oldest_first(tmp_path):
+    path = str(tmp_path / 'results.csv.gz')
+    for i in range(5):
+        history.record(path, 'run-' + str(i), results(100 + i), when='t' + str(i))
+    history.record(path, 'other', results(999, region='us-west-2'))
+
+    assert history.trend(path, 'us-east-1', 'ATLAS', 'get page', METRIC, last=3) == \
+        [('run-2', 't2', 102.0), ('run-3', 't3', 103.0), ('run-4', 't4', 104.0)]
+
+
+def test_a_run_recorded_again_replaces_its_earlier_value(tmp_path):
+    path = str(tmp_path / 'results.csv.gz')
+    history.record(path, 'run-1', results(100), when='t1')
+    history.record(path, 'run-2', results(200), when='t2')
+    history.record(path, 'run-1', results(150), when='t3')
+
+    assert history.trend(path, 'us-east-1', 'ATLAS', 'get page', METRIC) == \
+        [('run-2', 't2', 200.0), ('run-1', 't3', 150.0)]
+
+
+def test_metrics_include_status_elapsed_and_page_timing():
+    test = {'status': 'FAILURE', 'elapsed (ms)': 12, 'extra': [{'http status': 500,
+                                                                 'page timing': {'load': {'median': 80}}}]}
+
+    assert history.metrics(test) == {'status': 0, 'elapsed (ms)': 12, 'http status': 500, 'page timing load': 80}
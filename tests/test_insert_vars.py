@@ -0,0 +1,91 @@
+""" Versions:     python v. 3.x
+
+    Tests of insert_vars.py: credentials set in every scenario, and scenarios validated only when -matrix builds them.
+"""
+
+import sys
+import pytest
+import yaml
+import insert_vars
+
+CONFIG = """project:
+  regions: [us-east-1, us-west-2]
+tests:
+  {name}:
+    parameters:
+      EBEndpoint: {endpoint}
+    regions: [us-east-1]
+    template: templates/main.yaml
+"""
+
+
+def write(tmp_path, endpoint='ohdsi', name='default'):
+    path = tmp_path / '.taskcat.yml'
+    path.write_text(CONFIG.format(endpoint=endpoint, name=name))
+    return str(path)
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['insert_vars.py'] + list(args))
+    insert_vars.main(sys.argv)
+
+
+def test_insert_creds_keeps_its_file_entry_point(tmp_path):
+    path = write(tmp_path)
+    insert_vars.insert_creds(path, 'user', 'passw')
+
+    assert insert_vars.load(path)['tests']['default']['parameters']['RStudioUserList'] == 'user,passw'
+
+
+def test_insert_creds_exits_when_the_file_is_missing(tmp_path):
+    with pytest.raises(SystemExit):
+        insert_vars.insert_creds(str(tmp_path / 'missing.yml'), 'user', 'passw')
+
+
+def test_configs_are_passed_on_unvalidated_without_matrix(tmp_path, monkeypatch):
+    # taskcat may accept what the -matrix checks would not, e.g. an endpoint with a pseudo parameter
+    path = write(tmp_path, endpoint='$[taskcat_random-string]')
+    run(monkeypatch, path, 'user', 'passw')
+
+    doc = insert_vars.load(path)
+    assert doc['tests']['default']['parameters'] == {'EBEndpoint': '$[taskcat_random-string]',
+                                                      'RStudioUserList': 'user,passw'}
+
+
+def test_matrix_expands_one_scenario_per_region(tmp_path, monkeypatch):
+    path = write(tmp_path)
+    run(monkeypatch, path, 'user', 'passw', '-matrix')
+
+    tests = insert_vars.load(path)['tests']
+    assert sorted(tests) == ['default-us-east-1', 'default-us-west-2']
+    assert tests['default-us-west-2']['parameters'] == {'EBEndpoint': 'ohdsi-us-west-2',
+                                                        'RStudioUserList': 'user,passw'}
+    assert tests['default-us-west-2']['regions'] == ['us-west-2']
+
+
+def test_matrix_rejects_invalid_scenarios_without_writing(tmp_path, monkeypatch, capsys):
+    path = write(tmp_path, endpoint='-bad')
+    with open(path) as f:
+        before = f.read()
+
+    with pytest.raises(SystemExit):
+        run(monkeypatch, path, 'user', 'passw', '-matrix')
+
+    assert "must be 4-63 letters" in capsys.readouterr().out
+    with open(path) as f:
+        assert f.read() == before
+
+
+def test_validate_finds_endpoints_reused_in_a_region():
+    doc = yaml.safe_load(CONFIG.format(endpoint='ohdsi', name='a'))
+    doc['tests']['b'] = dict(doc['tests']['a'])
+
+    assert insert_vars.validate(doc) == ["b: EBEndpoint 'ohdsi' in us-east-1 is also used by a"]
+
+
+def test_configs_are_loaded_with_the_safe_loader(tmp_path):
+    path = tmp_path / '.taskcat.yml'
+    path.write_text("project: !!python/object/apply:os.getcwd []\n")
+
+    with pytest.raises(yaml.YAMLError):
+        insert_vars.load(str(path))
@@ -0,0 +1,50 @@
+""" Versions:     python v. 3.x
+
+    Tests of load test measurements: a bounded latency sample with exact min and max, however many requests are made.
+"""
+
+import pytest
+
+pytest.importorskip('boto3')
+pytest.importorskip('selenium')
+import load_test as lt  # noqa: E402
+
+
+def test_latency_sample_stays_bounded_with_exact_min_and_max():
+    stats = lt.new_stats()
+    for elapsed in range(10 * lt.RESERVOIR):
+        lt.record(stats, elapsed, elapsed % 10 != 0)
+
+    report = lt.report(stats, duration=10)
+
+    assert len(stats['sample']) == lt.RESERVOIR
+    assert report['requests'] == 10 * lt.RESERVOIR
+    assert report['errors'] == lt.RESERVOIR
+    assert (report['latency (ms)']['min'], report['latency (ms)']['max']) == (0, 10 * lt.RESERVOIR - 1)
+    # the sample is uniform over every request, so its median is close to the true median
+    assert abs(report['latency (ms)']['median'] - 5 * lt.RESERVOIR) < lt.RESERVOIR
+
+
+def test_every_request_is_kept_until_the_sample_is_full():
+    stats = lt.new_stats()
+    for elapsed in (300, 100, 200):
+        lt.record(stats, elapsed, True)
+
+    assert stats['sample'] == [300, 100, 200]
+    assert lt.report(stats, duration=1)['latency (ms)'] == {'min': 100, 'median': 200, 'p95': 300, 'max': 300}
+
+
+def test_histogram_counts_each_request_once():
+    stats = lt.new_stats()
+    for elapsed in (50, 100, 101, 70000):
+        lt.record(stats, elapsed, True)
+
+    histogram = lt.report(stats, duration=1)['histogram (ms)']
+    assert histogram['<=100'] == 2 and histogram['<=250'] == 1 and histogram['>60000'] == 1
+    assert sum(histogram.values()) == 4
+
+
+def test_report_without_requests_has_no_latency():
+    report = lt.report(lt.new_stats(), duration=0)
+
+    assert report['latency (ms)'] is None and report['error rate'] is None and report['throughput (req/s)'] is None
@@ -0,0 +1,115 @@
+""" Versions:     python v. 3.x
+
+    Tests of failure notifications: dedup of unchanged failures within the window, and batching under the SNS limit.
+"""
+
+import pytest
+
+pytest.importorskip('boto3')
+import notify  # noqa: E402
+
+
+def result(tag, test, status='SUCCESS', message='Test entirely succeeded', attempts=1):
+    return {'tag': tag, 'test': test, 'status': status, 'message': message, 'attempts': attempts, 'extra': []}
+
+
+def run(*tests, region='us-east-1'):
+    return {region: ('test_output_' + region + '.json', list(tests))}
+
+
+def test_fingerprint_ignores_order_but_not_where_the_failure_is():
+    key = ('ATLAS', 'Sign in failed')
+    east = {'region': 'us-east-1', 'test': 'sign in attempt'}
+    west = {'region': 'us-west-2', 'test': 'sign in attempt'}
+
+    assert notify.fingerprint(key, [east, west]) == notify.fingerprint(key, [west, east])
+    assert notify.fingerprint(key, [east]) != notify.fingerprint(key, [east, west])
+    assert notify.fingerprint(key, [east]) != notify.fingerprint(('RStudio', 'Sign in failed'), [east])
+
+
+def test_dedup_suppresses_an_unchanged_failure_only_within_the_window():
+    groups = notify.group_failures(notify.collect_failures(run(result('ATLAS', 'get page', 'FAILURE', 'down'))))
+
+    send, state = notify.dedup(groups, {}, window=3600, now=1000)
+    assert list(send) == [('ATLAS', 'down')]
+
+    send, later = notify.dedup(groups, state, window=3600, now=4000)
+    assert send == {}
+    # the time first notified is kept, so the window is not extended by every run
+    assert later == state
+
+    send, _ = notify.dedup(groups, state, window=3600, now=4601)
+    assert list(send) == [('ATLAS', 'down')]
+
+
+def test_dedup_alerts_again_once_a_failure_clears_and_recurs():
+    failing = notify.group_failures(notify.collect_failures(run(result('ATLAS', 'get page', 'FAILURE', 'down'))))
+
+    _, state = notify.dedup(failing, {}, window=3600, now=1000)
+    _, state = notify.dedup({}, state, window=3600, now=1100)
+    send, _ = notify.dedup(failing, state, window=3600, now=1200)
+
+    assert list(send) == [('ATLAS', 'down')]
+
+
+def test_batch_keeps_every_message_under_the_limit():
+    sections = ["x" * 100000, "y" * 100000, "z" * 100000, "w" * 10]
+    messages = notify.batch(sections)
+
+    assert len(messages) == 2
+    assert notify.batch(["x" * 124999, "y" * 124999]) == ["x" * 124999 + "\n" + "y" * 124999 + "\n"]
+    assert len(notify.batch(["x" * 125000, "y" * 124999])) == 2
+    assert all(len(message.encode('utf-8')) <= notify.MAX_MESSAGE_BYTES for message in messages)
+    assert "".join(messages).replace("\n", "") == "".join(sections)
+
+
+def test_batch_truncates_a_single_section_over_the_limit():
+    messages = notify.batch(["é" * notify.MAX_MESSAGE_BYTES])
+
+    assert len(messages) == 1
+    assert len(messages[0].encode('utf-8')) <= notify.MAX_MESSAGE_BYTES
+
+
+def test_notify_run_sends_one_numbered_message_per_batch():
+    failures = [result('ATLAS', 'get page ' + str(i), 'FAILURE', 'down ' + str(i) + " " + "x" * 60000)
+                for i in range(6)]
+    sent = []
+
+    notify.notify_run(run(*failures), lambda subject, message: sent.append(subject), {}, 3600, "dashboard",
+                      interval=0)
+
+    assert len(sent) == 2
+    assert sent[0].endswith("(1/2)") and sent[1].endswith("(2/2)")
+
+
+def test_tests_passing_only_on_retry_are_reported():
+    results = run(result('RStudio', 'sign in attempt', attempts=2),
+                  result('ATLAS', 'get page'),
+                  result('ATLAS', 'sign in attempt', 'FAILURE', 'Sign in failed', attempts=2))
+    sent = []
+
+    notify.notify_run(results, lambda subject, message: sent.append(message), {}, 3600, "dashboard")
+
+    assert len(sent) == 1
+    assert sent[0].startswith("1 failed tests and 1 tests passed only on retry in 1 regions")
+    assert "RStudio: " + notify.RETRIED in sent[0]
+    assert "sign in attempt, 2 attempts" in sent[0]
+    assert "ATLAS: Sign in failed" in sent[0]
+
+
+def test_nothing_is_sent_when_every_test_passed_first_time():
+    sent = []
+
+    notify.notify_run(run(result('ATLAS', 'get page')), lambda subject, message: sent.append(message), {}, 3600,
+                      "dashboard")
+
+    assert sent == []
+
+
+def test_sns_publisher_sends_through_the_shared_client(local_clients):
+    publish = notify.sns_publisher('arn:aws:sns:us-east-1:000000000000:failures')
+    notify.notify_run(run(result('ATLAS', 'get page', 'FAILURE', 'down')), publish, {}, 3600, "dashboard")
+
+    [message] = local_clients['sns'].messages
+    assert message['Subject'] == notify.SUBJECT
+    assert message['TopicArn'].endswith(':failures')
@@ -0,0 +1,67 @@
+""" Versions:     python v. 3.x
+
+    Tests of the performance regression gate, against a history store built in a temporary directory.
+"""
+
+import history
+import regression
+
+METRIC = 'http response time (ms)'
+
+
+def sign_in(elapsed):
+    return {'tag': 'ATLAS', 'test': 'sign in attempt', 'status': 'SUCCESS', 'extra': [{METRIC: elapsed}]}
+
+
+def store(tmp_path, values):
+    path = str(tmp_path / 'results.csv.gz')
+    for i, value in enumerate(values):
+        history.record(path, 'run-' + str(i), {'us-east-1': ('', [sign_in(value)])})
+    return path
+
+
+def current(elapsed):
+    return {'us-east-1': ('test_output_us-east-1.json', [sign_in(elapsed)])}
+
+
+def test_measurements_with_fewer_than_min_runs_are_not_gated(tmp_path):
+    base = regression.baseline(store(tmp_path, [100, 100]), min_runs=3, metrics=[METRIC])
+    checks = regression.gate(current(5000), base, metrics=[METRIC])
+
+    assert base == {}
+    assert checks == {'us-east-1': []}
+    assert regression.verdict(checks['us-east-1'], 'fail') == "PASS"
+
+
+def test_baseline_uses_a_percentile_of_the_most_recent_runs(tmp_path):
+    path = store(tmp_path, [9000, 100, 200, 300, 400])
+    base = regression.baseline(path, last=4, pct=50, metrics=[METRIC])
+
+    assert base[('us-east-1', 'ATLAS', 'sign in attempt', METRIC)] == (200, 4)
+
+
+def test_a_slowdown_past_threshold_and_min_delta_breaches_the_gate(tmp_path):
+    base = regression.baseline(store(tmp_path, [400, 400, 400]), metrics=[METRIC])
+    checks = regression.gate(current(700), base, threshold=1.5, min_delta=100, metrics=[METRIC])['us-east-1']
+
+    assert len(checks) == 1 and checks[0]['breached']
+    assert checks[0]['delta'] == 300
+    assert regression.verdict(checks, 'warn') == "WARN"
+    assert regression.verdict(checks, 'fail') == "FAIL"
+
+
+def test_a_slowdown_under_min_delta_is_noise(tmp_path):
+    base = regression.baseline(store(tmp_path, [40, 40, 40]), metrics=[METRIC])
+    checks = regression.gate(current(120), base, threshold=1.5, min_delta=100, metrics=[METRIC])['us-east-1']
+
+    assert not checks[0]['breached']
+    assert regression.verdict(checks, 'fail') == "PASS"
+
+
+def test_breached_checks_are_reported_as_failed_tests(tmp_path):
+    base = regression.baseline(store(tmp_path, [400, 400, 400]), metrics=[METRIC])
+    checks = regression.gate(current(900), base, metrics=[METRIC])['us-east-1']
+    failures = regression.as_failures(checks)
+
+    assert [(f['tag'], f['test'], f['status']) for f in failures] == [('ATLAS', 'sign in attempt', 'FAILURE')]
+    assert failures[0]['message'] == 'Performance regression in ' + METRIC
@@ -0,0 +1,146 @@
+""" Versions:     python v. 3.x
+
+    Tests of the sub-test scheduler: skipping downstream of failures, and retries with backoff.
+"""
+
+import json
+import pytest
+import scheduler
+
+
+def policy(**fields):
+    return dict(scheduler.DEFAULT_POLICY, **fields)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of sleeping, advancing a fake clock by each"""
+    delays = []
+    clock = [0.0]
+
+    def sleep(delay):
+        delays.append(delay)
+        clock[0] += delay
+
+    monkeypatch.setattr(scheduler.time, 'sleep', sleep)
+    monkeypatch.setattr(scheduler.time, 'monotonic', lambda: clock[0])
+    return delays
+
+
+def test_run_graph_skips_every_node_downstream_of_a_failure():
+    ran = []
+    skipped = []
+
+    def node(name, ok, deps=()):
+        return scheduler.new_node(name, lambda: ran.append(name) or ok, deps,
+                                  lambda dep: skipped.append((name, dep)))
+
+    status = scheduler.run_graph([node("sign in", False),
+                                  node("get page", True),
+                                  node("create cohort", True, ["sign in"]),
+                                  node("delete cohort", True, ["create cohort", "get page"])])
+
+    assert status == {"sign in": 'FAILURE', "get page": 'SUCCESS', "create cohort": 'SKIPPED',
+                      "delete cohort": 'SKIPPED'}
+    assert sorted(ran) == ["get page", "sign in"]
+    assert ("create cohort", "sign in") in skipped
+    assert ("delete cohort", "create cohort") in skipped
+
+
+def test_run_graph_counts_an_exception_as_failure():
+    def broken():
+        raise RuntimeError("browser died")
+
+    status = scheduler.run_graph([scheduler.new_node("sign in", broken),
+                                  scheduler.new_node("get page", lambda: True, ["sign in"])])
+
+    assert status == {"sign in": 'FAILURE', "get page": 'SKIPPED'}
+
+
+def test_run_graph_rejects_unknown_dependencies_and_cycles():
+    with pytest.raises(ValueError, match="unknown node"):
+        scheduler.run_graph([scheduler.new_node("a", lambda: True, ["missing"])])
+    with pytest.raises(ValueError, match="cycle"):
+        scheduler.run_graph([scheduler.new_node("a", lambda: True, ["b"]),
+                             scheduler.new_node("b", lambda: True, ["a"])])
+
+
+def test_retry_backs_off_exponentially_up_to_the_cap(sleeps):
+    outcomes = iter([False, False, False, True])
+
+    assert scheduler.retry(lambda: next(outcomes), policy(attempts=4, base=1, cap=3, jitter=False))
+    assert sleeps == [1, 2, 3]
+
+
+def test_retry_jitter_stays_within_the_backoff(sleeps):
+    assert not scheduler.retry(lambda: False, policy(attempts=4, base=2, cap=10, jitter=True))
+    assert len(sleeps) == 3
+    assert all(0 <= delay <= bound for delay, bound in zip(sleeps, [2, 4, 8]))
+
+
+def test_retry_stops_once_the_retry_deadline_would_pass(sleeps):
+    calls = []
+
+    assert not scheduler.retry(lambda: calls.append(1) and False,
+                               policy(attempts=5, base=10, jitter=False, retry_deadline=15))
+    # the first retry starts 10 s in, the second would start 30 s in
+    assert len(calls) == 2
+    assert sleeps == [10]
+
+
+def test_retry_treats_an_exception_as_a_failed_attempt(sleeps):
+    outcomes = iter([RuntimeError("stale element"), True])
+
+    def attempt():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert scheduler.retry(attempt, policy(attempts=2, base=0))
+
+
+def test_retry_raises_when_the_last_attempt_raises(sleeps):
+    outcomes = iter([False, RuntimeError("browser died")])
+
+    def attempt():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with pytest.raises(RuntimeError, match="browser died"):
+        scheduler.retry(attempt, policy(attempts=2, base=0))
+
+
+def test_retry_returns_false_when_the_last_attempt_fails_without_raising(sleeps):
+    outcomes = iter([RuntimeError("browser died"), False])
+
+    def attempt():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert scheduler.retry(attempt, policy(attempts=2, base=0)) is False
+
+
+def test_policies_override_default_then_sub_test_then_tag(tmp_path):
+    path = tmp_path / "policies.json"
+    path.write_text(json.dumps({"default": {"attempts": 2},
+                                "sign in attempt": {"attempts": 3, "base": 5},
+                                "ATLAS sign in attempt": {"base": 0}}))
+    policies = scheduler.load_policies(str(path))
+
+    assert scheduler.policy_for(policies, "RStudio", "get page")['attempts'] == 2
+    assert scheduler.policy_for(policies, "RStudio", "sign in attempt")['base'] == 5
+    assert scheduler.policy_for(policies, "ATLAS", "sign in attempt")['base'] == 0
+    assert scheduler.policy_for(policies, "ATLAS", "sign in attempt")['attempts'] == 3
+
+
+def test_policies_reject_the_old_timeout_field(tmp_path):
+    path = tmp_path / "policies.json"
+    path.write_text(json.dumps({"default": {"timeout": 60}}))
+
+    with pytest.raises(ValueError, match="retry_deadline"):
+        scheduler.load_policies(str(path))
@@ -0,0 +1,102 @@
+""" Versions:     python v. 3.x
+
+    Tests of sharding: region assignment, and merging the results and dashboards of every shard.
+"""
+
+import json
+import os
+import pytest
+import yaml
+import shard
+
+REGIONS = ['us-east-1', 'us-east-2', 'us-west-1', 'us-west-2', 'eu-west-1', 'eu-central-1', 'ap-southeast-2']
+
+PAGE = ('<html><body><table class="x"><thread><tr><th>Test</th></tr></thread>{rows}</table></body></html>')
+ROW = '<tr><td>scenario</td><td>{region}</td><td>stack</td><td>CREATE_COMPLETE</td><td></td></tr>'
+
+
+def test_assign_balances_regions_across_shards():
+    assignment = shard.assign(REGIONS, 3)
+
+    assert set(assignment) == set(REGIONS)
+    counts = [list(assignment.values()).count(n) for n in (1, 2, 3)]
+    assert max(counts) - min(counts) <= 1
+
+
+def test_assign_does_not_depend_on_region_order():
+    assert shard.assign(REGIONS, 3) == shard.assign(list(reversed(REGIONS)), 3)
+
+
+def test_shard_regions_cover_every_region_once_in_config_order():
+    shards = [shard.shard_regions(REGIONS, n, 3) for n in (1, 2, 3)]
+
+    assert sorted(sum(shards, [])) == sorted(REGIONS)
+    for regions in shards:
+        assert regions == [region for region in REGIONS if region in regions]
+
+
+def test_units_expand_regions_by_product():
+    assert shard.units(['us-east-1'], 'redcap') == [('us-east-1', 'REDCap')]
+    assert len(shard.units(REGIONS, 'ohdsi')) == len(REGIONS) * 3
+
+
+def test_merge_dashboards_adds_the_rows_of_every_page_to_the_first():
+    pages = [PAGE.format(rows=ROW.format(region=region)) for region in ('us-east-1', 'us-west-2')]
+    merged = shard.merge_dashboards(pages)
+
+    assert merged.count('<table') == 1
+    assert merged.index('us-east-1') < merged.index('us-west-2') < merged.index('</table>')
+
+
+def test_merge_dashboards_without_a_header_copies_only_the_rows():
+    headless = '<html><table class="x">' + ROW.format(region='us-west-2') + '</table></html>'
+    merged = shard.merge_dashboards([PAGE.format(rows=ROW.format(region='us-east-1')), headless])
+
+    assert merged.count('<table') == 1
+    # the end of the opening table tag is not copied along with the rows
+    assert '</tr><tr><td>scenario</td><td>us-west-2' in merged
+    assert merged.index('us-west-2') < merged.index('</table>')
+
+
+def write_shard(folder, region, status):
+    os.makedirs(os.path.join(folder, 'taskcat_outputs'))
+    with open(os.path.join(folder, 'test_output_' + region + '.json'), 'w') as f:
+        json.dump({"Page Access Info": [{'tag': 'ATLAS', 'test': 'get page', 'status': status}]}, f)
+    with open(os.path.join(folder, 'taskcat_outputs', 'index.html'), 'w') as f:
+        f.write(PAGE.format(rows=ROW.format(region=region)))
+    with open(os.path.join(folder, 'taskcat_outputs', region + '.txt'), 'w') as f:
+        f.write(region)
+
+
+def test_merge_combines_results_and_counts_failures(tmp_path):
+    write_shard(str(tmp_path / '1'), 'us-east-1', 'SUCCESS')
+    write_shard(str(tmp_path / '2'), 'us-west-2', 'FAILURE')
+    out = str(tmp_path / 'out')
+
+    result = shard.merge([str(tmp_path / '1'), str(tmp_path / '2')], out)
+
+    assert result == {'regions': ['us-east-1', 'us-west-2'], 'tests': 2, 'failures': 1}
+    assert os.path.exists(os.path.join(out, 'test_output_us-west-2.json'))
+    assert os.path.exists(os.path.join(out, 'taskcat_outputs', 'us-east-1.txt'))
+    with open(os.path.join(out, shard.DASHBOARD)) as f:
+        page = f.read()
+    assert 'us-east-1' in page and 'us-west-2' in page
+
+
+def test_merge_rejects_a_region_tested_by_two_shards(tmp_path):
+    write_shard(str(tmp_path / '1'), 'us-east-1', 'SUCCESS')
+    write_shard(str(tmp_path / '2'), 'us-east-1', 'SUCCESS')
+
+    with pytest.raises(ValueError, match="found in both"):
+        shard.merge([str(tmp_path / '1'), str(tmp_path / '2')], str(tmp_path / 'out'))
+
+
+def test_project_regions_reads_config_with_the_safe_loader(tmp_path):
+    config = tmp_path / '.taskcat.yml'
+    config.write_text("project:\n  regions:\n  - us-east-1\n  - us-west-2\n")
+    unsafe = tmp_path / 'unsafe.yml'
+    unsafe.write_text("project: !!python/object/apply:os.getcwd []\n")
+
+    assert shard.project_regions(str(config)) == ['us-east-1', 'us-west-2']
+    with pytest.raises(yaml.YAMLError):
+        shard.project_regions(str(unsafe))
@@ -0,0 +1,67 @@
+""" Versions:     python v. 3.x
+
+    Tests of how tests.py records sub-tests run under their retry policy.
+"""
+
+import pytest
+
+pytest.importorskip('boto3')
+pytest.importorskip('selenium')
+import result_log as rl  # noqa: E402
+import scheduler  # noqa: E402
+import test_objects as tob  # noqa: E402
+import tests  # noqa: E402
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler.time, 'sleep', lambda delay: None)
+    state = tests.new_run('endpoint', 'us-east-1', 'user', 'passw', 'bucket',
+                          policies={'default': {'attempts': 3, 'base': 0}})
+    state['log'] = rl.new_log(str(tmp_path / 'test_output_us-east-1.jsonl'))
+    return state
+
+
+def recorded(run):
+    rl.close(run['log'])
+    return list(rl.read(run['log']['path']))
+
+
+def attempts(*outcomes):
+    """Attempt returning or raising each outcome in turn"""
+    outcomes = iter(outcomes)
+
+    def attempt(test):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome:
+            tob.success(test)
+        else:
+            tob.fail(test, 'Sign in failed')
+        return outcome
+
+    return attempt
+
+
+def test_a_pass_on_retry_records_the_attempts_made(run):
+    ok = tests.attempted(run, tob.new_test('ATLAS', 'sign in attempt'), attempts(False, True))
+
+    assert ok and not run['failure']
+    [test] = recorded(run)
+    assert (test['status'], test['attempts']) == ('SUCCESS', 2)
+
+
+def test_a_first_time_pass_records_one_attempt(run):
+    tests.attempted(run, tob.new_test('ATLAS', 'sign in attempt'), attempts(True))
+
+    assert recorded(run)[0]['attempts'] == 1
+
+
+def test_an_exception_on_the_last_attempt_is_recorded_as_the_failure(run):
+    ok = tests.attempted(run, tob.new_test('ATLAS', 'sign in attempt'),
+                         attempts(False, False, RuntimeError("chrome not reachable\ntrace")))
+
+    assert not ok and run['failure']
+    [test] = recorded(run)
+    assert (test['status'], test['message'], test['attempts']) == ('FAILURE', 'Error: chrome not reachable', 3)
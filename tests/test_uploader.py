@@ -0,0 +1,94 @@
+""" Versions:     python v. 3.x
+
+    Tests of the incremental uploader: local ETags matching those S3 gives single-part and multipart uploads, so
+    unchanged files are skipped, against the local_aws S3 stand-in.
+"""
+
+import io
+import os
+import pytest
+
+pytest.importorskip('boto3')
+import local_aws  # noqa: E402
+import uploader  # noqa: E402
+from boto3.s3.transfer import TransferConfig  # noqa: E402
+
+PART = 1024
+
+
+@pytest.fixture
+def s3():
+    return local_aws.LocalS3(latency=0, setup=0)
+
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    """Upload anything over PART bytes in parts, so multipart uploads stay small"""
+    monkeypatch.setattr(uploader, 'PART_SIZE', PART)
+
+
+def config():
+    return TransferConfig(multipart_threshold=PART, multipart_chunksize=PART)
+
+
+@pytest.mark.parametrize('size', [0, 1, PART - 1, PART, PART + 1, 3 * PART])
+def test_local_etag_matches_the_etag_of_the_uploaded_object(s3, size):
+    body = os.urandom(size)
+    s3.upload_fileobj(io.BytesIO(body), 'bucket', 'key', Config=config())
+
+    assert uploader.etag(io.BytesIO(body), PART) == s3.objects[('bucket', 'key')]['ETag']
+
+
+def test_multipart_etag_counts_parts():
+    assert uploader.etag(io.BytesIO(b'x' * (2 * PART + 1)), PART).endswith('-3"')
+    assert '-' not in uploader.etag(io.BytesIO(b'x' * (PART - 1)), PART)
+
+
+def test_compression_is_deterministic(tmp_path):
+    path = tmp_path / 'test_output_us-east-1.json'
+    path.write_text('{"Page Access Info": []}')
+
+    assert uploader.compress(str(path)) == uploader.compress(str(path))
+
+
+def write_tree(folder, size):
+    os.makedirs(os.path.join(folder, 'us-east-1'))
+    with open(os.path.join(folder, 'us-east-1', 'test_output.json'), 'w') as f:
+        f.write('{"status": "SUCCESS"}' * size)
+    with open(os.path.join(folder, 'capture.png'), 'wb') as f:
+        f.write(os.urandom(size * 20))
+
+
+def test_sync_skips_unchanged_files_single_part_and_multipart(s3, small_parts, tmp_path):
+    folder = str(tmp_path / 'out')
+    write_tree(folder, 100)
+
+    first = uploader.sync(s3, folder, 'bucket', 'results/', workers=2)
+    assert first['files'] == 2 and first['uploaded'] == 2
+    assert s3.calls.get('UploadPart')
+    assert s3.objects[('bucket', 'results/us-east-1/test_output.json')]['Extra']['ContentEncoding'] == 'gzip'
+
+    again = uploader.sync(s3, folder, 'bucket', 'results/', workers=2)
+    assert again == {'files': 2, 'uploaded': 0, 'skipped': 2, 'bytes sent': 0}
+
+
+def test_sync_uploads_only_changed_files(s3, small_parts, tmp_path):
+    folder = str(tmp_path / 'out')
+    write_tree(folder, 100)
+    uploader.sync(s3, folder, 'bucket', workers=2)
+
+    with open(os.path.join(folder, 'capture.png'), 'ab') as f:
+        f.write(b'more')
+    result = uploader.sync(s3, folder, 'bucket', workers=2)
+
+    assert result['uploaded'] == 1 and result['skipped'] == 1
+
+
+def test_raw_uploads_are_not_compressed(s3, tmp_path):
+    folder = str(tmp_path / 'out')
+    write_tree(folder, 1)
+    uploader.sync(s3, folder, 'bucket', raw=True, public=False)
+
+    obj = s3.objects[('bucket', 'us-east-1/test_output.json')]
+    assert obj['Body'] == b'{"status": "SUCCESS"}'
+    assert 'ContentEncoding' not in obj['Extra'] and 'ACL' not in obj['Extra']